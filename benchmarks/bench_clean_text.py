@@ -0,0 +1,154 @@
+"""
+Бенчмарк движка очистки текста (TextCleaner) против исходной реализации
+BookCorpusProcessor.clean_text / WebCorpusProcessor.clean_text.
+
+Запуск из корня проекта:
+    python benchmarks/bench_clean_text.py [--size-mb 8] [--repeat 3] [--file books.txt]
+
+Скрипт проверяет побайтное совпадение результатов и печатает пропускную
+способность в МБ/с для каждой конфигурации.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_processor.Services.Corpus.TextCleaner import get_book_cleaner, get_web_cleaner  # noqa: E402
+
+
+def legacy_book_clean(text, ignore_footnotes=True, ignore_links=True, custom_patterns=None):
+    """Исходная реализация BookCorpusProcessor.clean_text."""
+    patterns = [
+        r"^\s*\d+\s*$",
+        r"[^\w\s\.,!?;:()«»“”'\"\\/-]",
+        r"\s+",
+        r"^\s*$",
+        r"\t+",
+        r"\.{2,}",
+        r"<.*?>",
+    ]
+    if ignore_footnotes:
+        patterns.extend([
+            r"\[\d+\]",
+            r"\^[a-zA-Z0-9]+",
+            r"^\d+\.\s*([А-ЯЁA-Za-z\-]+\.)?.*",
+            r"^\d+\.\s*[А-ЯЁA-Za-z\-]+\.\s*\d+\s+.*",
+            r"^\d+\..*",
+        ])
+    if ignore_links:
+        patterns.extend([
+            r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+",
+            r"www\.[a-zA-Z0-9-]+\.[a-zA-Z]{2,}",
+        ])
+    if custom_patterns:
+        patterns.extend(custom_patterns)
+    patterns.append(r"\d+")
+    for pattern in patterns:
+        text = re.sub(pattern, " ", text, flags=re.MULTILINE)
+    replacements = {
+        "љ": "ҷ", "ї": "ӣ", "њ": "ҳ", "ќ": "қ", "ў": "ӯ", "ѓ": "ғ",
+        "Љ": "Ҷ", "Ї": "Ӣ", "Њ": "Ҳ", "Ќ": "Қ", "Ў": "Ӯ", "Ѓ": "Ғ",
+    }
+    for old_char, new_char in replacements.items():
+        text = text.replace(old_char, new_char)
+    return text.strip()
+
+
+def legacy_web_clean(text, special_chars, remove_extra_spaces=True, normalize_punctuation=True):
+    """Исходная реализация WebCorpusProcessor.clean_text (без разбора HTML)."""
+    patterns = [r"^\s*\d+\s*$", special_chars, r"\s+", r"^\s*$", r"\t+", r"\.{2,}"]
+    if remove_extra_spaces:
+        patterns.append(r"\s+")
+    if normalize_punctuation:
+        patterns.extend([r"\.{2,}", r",{2,}", r"!{2,}", r"\?{2,}"])
+    for pattern in patterns:
+        text = re.sub(pattern, " ", text, flags=re.MULTILINE)
+    return text.strip()
+
+
+WORDS = [
+    "китоб", "забони", "тоҷикӣ", "љањон", "ќалам", "Ўзбекистон", "книга", "текст",
+    "corpus", "language", "Ѓарб", "ӯ", "www.example.com", "https://example.org/a?b=1&c=2",
+    "[12]", "^note", "<b>", "</p>", "...", "..", ",,", "!!", "??", "«цитата»", "1.", "2022",
+    "(скобки)", "—", "№5", "#tag", "@user", "a_b", "\t", "3.14",
+]
+
+
+def make_text(size_bytes, seed=13):
+    """Генерирует синтетическую «книгу» с номерами страниц, сносками и ссылками."""
+    rnd = random.Random(seed)
+    lines = []
+    size = 0
+    while size < size_bytes:
+        roll = rnd.random()
+        if roll < 0.03:
+            line = f"  {rnd.randint(1, 999)}  "
+        elif roll < 0.06:
+            line = f"{rnd.randint(1, 99)}. И-б. {rnd.randint(1, 2000)} нест."
+        elif roll < 0.08:
+            line = ""
+        else:
+            line = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 14)))
+        lines.append(line)
+        size += len(line.encode("utf-8")) + 1
+    return "\n".join(lines)
+
+
+def measure(func, text, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=8.0, help="Размер синтетического текста, МБ")
+    parser.add_argument("--repeat", type=int, default=3, help="Число повторов (берется лучшее время)")
+    parser.add_argument("--file", help="Очищать указанный UTF-8 файл вместо синтетического текста")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = make_text(int(args.size_mb * 1024 * 1024))
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    print(f"Input: {size_mb:.2f} MB")
+
+    web_special_chars = r"[^\w\s\.,!?;:()«»“”'\"\\/-]"
+    cases = [
+        ("book (footnotes+links)",
+         lambda t: legacy_book_clean(t),
+         get_book_cleaner(True, True).clean),
+        ("book (no footnotes/links)",
+         lambda t: legacy_book_clean(t, False, False),
+         get_book_cleaner(False, False).clean),
+        ("web (ru)",
+         lambda t: legacy_web_clean(t, web_special_chars),
+         get_web_cleaner(web_special_chars).clean),
+    ]
+
+    failed = False
+    for name, legacy, compiled in cases:
+        legacy_time, legacy_result = measure(legacy, text, args.repeat)
+        compiled_time, compiled_result = measure(compiled, text, args.repeat)
+        identical = legacy_result == compiled_result
+        failed = failed or not identical
+        print(f"{name:28s} legacy {size_mb / legacy_time:8.2f} MB/s | "
+              f"compiled {size_mb / compiled_time:8.2f} MB/s | "
+              f"x{legacy_time / compiled_time:5.2f} | identical: {identical}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Бенчмарк удаления почти дубликатов (NearDuplicateFilter): пропускная
+способность на растущем числе документов и качество на размеченном наборе.
+
+Запуск из корня проекта:
+    python benchmarks/bench_dedup.py [--docs 20000] [--threshold 0.8] [--words 300]
+
+Набор генерируется с постоянным seed: исходные документы, их копии с
+небольшими правками (замена 1% слов, добавленная подпись) и «похожие, но
+разные» документы, половина текста которых взята из другого документа.
+Для каждой пары «дубликат — оставленный документ» считается точное сходство
+Жаккара по шинглам. Скрипт печатает документы в секунду для N, 2N и 4N
+документов (при почти линейной работе скорость не падает) и завершается с
+ошибкой, если полнота или точность ниже 0.95.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_processor.Services.Corpus.NearDuplicateFilter import NearDuplicateFilter  # noqa: E402
+
+
+def make_docs(count, words, seed=20240601):
+    """Документы и разметка: ключ -> ключ исходного документа для намеренных дубликатов."""
+    rnd = random.Random(seed)
+    vocab = [f"w{i}" for i in range(30000)]
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+    docs, sources = [], {}
+    originals = []
+    while len(docs) < count:
+        kind = rnd.random()
+        if originals and kind < 0.15:
+            source_key, source = rnd.choice(originals)
+            tokens = source.split()
+            for i in rnd.sample(range(len(tokens)), len(tokens) // 100):
+                tokens[i] = rnd.choice(vocab)
+            key = f"dup-{len(docs)}"
+            docs.append((key, " ".join(tokens) + " Источник: агентство новостей."))
+            sources[key] = source_key
+        elif originals and kind < 0.25:
+            _, source = rnd.choice(originals)
+            tokens = source.split()
+            half = len(tokens) // 2
+            tokens = tokens[:half] + rnd.choices(vocab, weights, k=len(tokens) - half)
+            docs.append((f"similar-{len(docs)}", " ".join(tokens)))
+        else:
+            key = f"doc-{len(docs)}"
+            text = " ".join(rnd.choices(vocab, weights, k=words))
+            docs.append((key, text))
+            originals.append((key, text))
+    return docs, sources
+
+
+def jaccard(a, b, k=5):
+    def shingles(text):
+        tokens = re.findall(r"\w+", text.lower())
+        return {tuple(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+    first, second = shingles(a), shingles(b)
+    return len(first & second) / len(first | second)
+
+
+def run(docs, threshold, index_path=None):
+    started = time.perf_counter()
+    removed = {}
+    with NearDuplicateFilter(index_path, threshold) as dedup:
+        for key, text in docs:
+            duplicate = dedup.check(key, text)
+            if duplicate is not None:
+                removed[key] = duplicate[0]
+    return time.perf_counter() - started, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000, help="Число документов в наименьшем прогоне")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Порог сходства")
+    parser.add_argument("--words", type=int, default=300, help="Слов в исходном документе")
+    args = parser.parse_args()
+
+    all_docs, sources = make_docs(args.docs * 4, args.words)
+    texts = dict(all_docs)
+    for scale in (1, 2, 4):
+        docs = all_docs[:args.docs * scale]
+        with tempfile.TemporaryDirectory() as workdir:
+            elapsed, removed = run(docs, args.threshold, os.path.join(workdir, "index.sqlite3"))
+        print(f"{len(docs):7d} docs: {elapsed:6.1f} s, {len(docs) / elapsed:7.0f} docs/s, removed {len(removed)}")
+
+    # Качество на последнем (самом большом) прогоне
+    keys = {key for key, _ in docs}
+    expected = {key for key in sources if key in keys and jaccard(texts[key], texts[sources[key]]) >= args.threshold}
+    recall = len(expected & set(removed)) / len(expected) if expected else 1.0
+    correct = sum(jaccard(texts[key], texts[kept]) >= args.threshold - 0.05 for key, kept in removed.items())
+    precision = correct / len(removed) if removed else 1.0
+    print(f"recall {recall:.3f} ({len(expected)} planted duplicates) | precision {precision:.3f}")
+    return 0 if recall >= 0.95 and precision >= 0.95 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Бенчмарк извлечения контента веб-страниц: исходная реализация
+(trafilatura + BeautifulSoup для заголовка и автора + BeautifulSoup в каждом
+вызове clean_text) против однократного разбора WebCorpusProcessor.parse_web_content.
+
+Запуск из корня проекта:
+    python benchmarks/bench_web_extract.py [--pages-dir saved_pages/] [--count 60] [--repeat 3]
+
+Без --pages-dir используется фиксированный (генерируется с постоянным seed)
+набор страниц новостного вида: навигация, скрипты, статья, списки, реклама, подвал.
+Скрипт проверяет совпадение записей и печатает число страниц в секунду.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+from trafilatura import extract  # noqa: E402
+
+from text_processor.Services.Corpus.TextCleaner import get_web_cleaner  # noqa: E402
+from text_processor.Services.Corpus.WebCorpusProcessor import WebCorpusProcessor  # noqa: E402
+
+WORDS = {
+    "ru": "город новости человек время работа страна жизнь вопрос сторона дело решение "
+          "правительство развитие проект система результат данные".split(),
+    "tg": "шаҳр хабар одам вақт кор кишвар ҳаёт савол ҷониб қарор ҳукумат рушд "
+          "лоиҳа низом натиҷа маълумот".split(),
+    "en": "city news people time work country life question side case decision "
+          "government development project system result data".split(),
+}
+
+
+def make_sentence(rnd, words):
+    sentence = " ".join(rnd.choice(words) for _ in range(rnd.randint(6, 18)))
+    extras = ["", "", "", " &amp; ", " &nbsp;", " «цитата»", " (2024)", ", 15 %", " <b>важно</b>",
+              ' <a href="/x">ссылка</a>', " &lt;тег&gt;", " 3 &gt; 2"]
+    return sentence.capitalize() + rnd.choice(extras) + rnd.choice([".", "!", "?", "..."])
+
+
+def make_page(rnd, n):
+    lang = rnd.choice(list(WORDS))
+    words = WORDS[lang]
+    head = [f'<meta charset="utf-8"><meta name="viewport" content="width=device-width">']
+    title_kind = rnd.random()
+    if title_kind < 0.8:
+        title = " ".join(rnd.choice(words) for _ in range(rnd.randint(3, 8))).capitalize()
+        head.append(f"<title>  {title} — Сайт {n} </title>")
+    elif title_kind < 0.9:
+        head.append(f"<TITLE>News &amp; Views {n}</TITLE>")
+    authors = [("author", f"Автор {n}"), ("dc.creator", f"Creator {n}"), ("Author", "Case"),
+               ("dcterms.creator", f"DC {n}")]
+    for name, value in rnd.sample(authors, rnd.randint(0, 3)):
+        content = f' content="  {value}  "' if rnd.random() < 0.85 else ""
+        head.append(f'<meta name="{name}"{content}>')
+    head.append("<script>var x = '<p>not text</p>'; window.dataLayer = [];</script>")
+    head.append("<style>body { font: 12px } .a > .b { color: red }</style>")
+
+    nav = "".join(f'<li><a href="/s{i}">{rnd.choice(words)}</a></li>' for i in range(rnd.randint(5, 15)))
+    paragraphs = []
+    for _ in range(rnd.randint(4, 25)):
+        paragraphs.append("<p>" + " ".join(make_sentence(rnd, words) for _ in range(rnd.randint(2, 6))) + "</p>")
+        if rnd.random() < 0.1:
+            paragraphs.append("<!-- реклама --><div class=\"ad\">Реклама</div>")
+        if rnd.random() < 0.1:
+            paragraphs.append("<ul>" + "".join(f"<li>{make_sentence(rnd, words)}</li>" for _ in range(3)) + "</ul>")
+    footer = f"<footer><p>© 2024 Сайт {n}. Все права защищены.</p></footer>"
+    return (f"<!DOCTYPE html><html lang=\"{lang}\"><head>{''.join(head)}</head><body>"
+            f"<header><nav><ul>{nav}</ul></nav></header>"
+            f"<main><article><h1>{make_sentence(rnd, words)}</h1>{''.join(paragraphs)}</article>"
+            f"<aside>{make_sentence(rnd, words)}</aside></main>{footer}</body></html>")
+
+
+def legacy_parse(processor, url, html):
+    """Исходная реализация extract_web_content после загрузки страницы."""
+    main_content = extract(html) or ""
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.title.string.strip() if soup.title else "No Title"
+    author = "Unknown Author"
+    for meta_name in ['author', 'dc.creator', 'dcterms.creator']:
+        author_tag = soup.find("meta", attrs={"name": meta_name})
+        if author_tag and "content" in author_tag.attrs:
+            author = author_tag["content"].strip()
+            break
+
+    lang_patterns = processor.language_patterns.get(processor.language, processor.language_patterns['en'])
+    cleaner = get_web_cleaner(lang_patterns['special_chars'], processor.remove_extra_spaces,
+                              processor.normalize_punctuation)
+
+    def clean_text(text):
+        # Исходный clean_text: разбор BeautifulSoup при каждом вызове
+        return cleaner.clean(BeautifulSoup(text, 'html.parser').get_text(separator=" "))
+
+    return {"title": clean_text(title), "author": clean_text(author), "content": clean_text(main_content)}
+
+
+def guarded(parse, *args):
+    try:
+        return parse(*args)
+    except Exception as e:
+        return {"error": type(e).__name__}
+
+
+def measure(parse, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [guarded(parse, url, html) for url, html in pages]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages-dir", help="Папка с сохраненными HTML-страницами (*.html, *.htm)")
+    parser.add_argument("--count", type=int, default=60, help="Число генерируемых страниц")
+    parser.add_argument("--repeat", type=int, default=3, help="Число повторов (берется лучшее время)")
+    args = parser.parse_args()
+    # trafilatura пишет в лог о пустых страницах
+    logging.disable(logging.ERROR)
+
+    if args.pages_dir:
+        pages = []
+        for name in sorted(os.listdir(args.pages_dir)):
+            if name.lower().endswith((".html", ".htm")):
+                with open(os.path.join(args.pages_dir, name), "r", encoding="utf-8", errors="replace") as f:
+                    pages.append((name, f.read()))
+    else:
+        rnd = random.Random(20240601)
+        pages = [(f"page-{n}", make_page(rnd, n)) for n in range(args.count)]
+    size_mb = sum(len(html.encode("utf-8")) for _, html in pages) / (1024 * 1024)
+    print(f"Pages: {len(pages)}, {size_mb:.2f} MB")
+
+    failed = False
+    for language in ("ru", "en"):
+        processor = WebCorpusProcessor(language=language)
+        legacy_time, legacy = measure(lambda url, html: legacy_parse(processor, url, html), pages, args.repeat)
+        single_time, single = measure(processor.parse_web_content, pages, args.repeat)
+        identical = legacy == single
+        failed = failed or not identical
+        print(f"{language}: legacy {len(pages) / legacy_time:7.1f} pages/s | "
+              f"single parse {len(pages) / single_time:7.1f} pages/s | "
+              f"x{legacy_time / single_time:5.2f} | identical: {identical}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Бенчмарк параллельной загрузки страниц (WebFetcher) против последовательной
+загрузки WebCorpusProcessor на локальном HTTP-сервере-заглушке.
+
+Запуск из корня проекта:
+    python benchmarks/bench_web_fetch.py [--pages 200] [--latency 0.05] [--concurrency 32]
+
+Сервер отдает одинаковые HTML-страницы с заданной задержкой и считает
+одновременные запросы к каждому хосту (127.0.0.1 и localhost). Скрипт проверяет:
+- совпадение корпуса при последовательной обработке, параллельной загрузке и
+  конвейере с пулом процессов извлечения (печатаются счетчики стадий);
+- соблюдение общего ограничения и ограничения на хост;
+- повтор после ответа 503 и обрыв слишком большого ответа;
+- HTTP-кэш: повторный запуск проверяет страницы условным GET (сервер отвечает
+  304 по ETag) и берет извлеченные записи из кэша, а в пределах ttl обходится
+  без запросов; корпус совпадает с загрузкой без кэша.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_processor.Services.Corpus.WebCorpusProcessor import WebCorpusProcessor  # noqa: E402
+from text_processor.Services.Corpus.WebFetcher import BodyTooLargeError, WebFetcher  # noqa: E402
+
+PAGE = """<html><head><title>Страница {n}</title><meta name="author" content="Автор {n}"></head>
+<body><article><h1>Заголовок {n}</h1>
+<p>Это основной текст страницы номер {n}. Он достаточно длинный, чтобы trafilatura
+сочла его содержательным: в нем несколько предложений, знаки препинания и числа 12, 345.</p>
+<p>Второй абзац страницы {n} продолжает рассказ и добавляет еще немного текста для извлечения.</p>
+</article></body></html>"""
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.active = Counter()
+        self.max_active = Counter()
+        self.max_total = 0
+        self.attempts = Counter()
+        self.connections = 0
+        self.not_modified = 0
+
+    def reset(self):
+        with self.lock:
+            self.max_active.clear()
+            self.max_total = 0
+            self.attempts.clear()
+            self.connections = 0
+            self.not_modified = 0
+
+    def handle_error(self, request, client_address):
+        # Клиент обрывает слишком большой ответ — это ожидаемо
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        host = self.headers.get("Host", "").split(":")[0]
+        with server.lock:
+            server.active[host] += 1
+            server.max_active[host] = max(server.max_active[host], server.active[host])
+            server.max_total = max(server.max_total, sum(server.active.values()))
+            server.attempts[self.path] += 1
+            attempt = server.attempts[self.path]
+        try:
+            time.sleep(server.latency)
+            if self.path.startswith("/flaky") and attempt == 1:
+                self._send(503, b"busy")
+            elif self.path.startswith("/huge"):
+                self._send(200, b"x" * (2 * 1024 * 1024))
+            elif self.path.startswith("/missing"):
+                self._send(404, b"not found")
+            else:
+                n = self.path.rsplit("/", 1)[-1]
+                etag = f'"page-{n}"'
+                if self.headers.get("If-None-Match") == etag:
+                    with server.lock:
+                        server.not_modified += 1
+                    self._send(304, b"", etag=etag)
+                else:
+                    self._send(200, PAGE.format(n=n).encode("utf-8"), "text/html; charset=utf-8", etag)
+        finally:
+            with server.lock:
+                server.active[host] -= 1
+
+    def _send(self, status: int, body: bytes, content_type: str = "text/plain", etag: str = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run_corpus(urls, workdir, **kwargs):
+    processor = WebCorpusProcessor(output_base="bench", output_format="txt", rootPath=workdir, **kwargs)
+    started = time.perf_counter()
+    path = processor.process_all_sources([{"type": "web", "url": url} for url in urls])
+    elapsed = time.perf_counter() - started
+    with open(path, "rb") as f:
+        data = f.read()
+    os.remove(path)
+    return elapsed, data, processor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="Число страниц")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа сервера, с")
+    parser.add_argument("--concurrency", type=int, default=32, help="Общий предел одновременных запросов")
+    parser.add_argument("--per-host", type=int, default=8, help="Предел одновременных запросов к хосту")
+    parser.add_argument("--extract-workers", type=int, default=2, help="Процессы извлечения для конвейера")
+    args = parser.parse_args()
+
+    server = StandInServer(args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    hosts = [f"http://127.0.0.1:{port}", f"http://localhost:{port}"]
+    urls = [f"{hosts[n % 2]}/page/{n}" for n in range(args.pages)]
+
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        sequential_time, sequential, _ = run_corpus(urls, workdir)
+        server.reset()
+        parallel_time, parallel, _ = run_corpus(urls, workdir, fetch_concurrency=args.concurrency,
+                                                per_host_limit=args.per_host)
+        connections = server.connections
+        limits = (server.max_total, dict(server.max_active))
+        pipeline_time, pipeline, processor = run_corpus(urls, workdir, fetch_concurrency=args.concurrency,
+                                                    per_host_limit=args.per_host,
+                                                    extract_workers=args.extract_workers)
+        stats = processor.pipeline_stats
+
+        cache_dir = os.path.join(workdir, "cache")
+        cache_runs = []
+        for ttl in (0, 0, 3600):
+            server.reset()
+            elapsed, data, processor = run_corpus(urls, workdir, fetch_concurrency=args.concurrency,
+                                                  per_host_limit=args.per_host, cache_dir=cache_dir,
+                                                  cache_ttl=ttl)
+            cache_runs.append((elapsed, data, processor.http_cache.stats(),
+                               processor.extraction_cache.stats(), sum(server.attempts.values()),
+                               server.not_modified))
+    identical = sequential == parallel == pipeline
+    failed = failed or not identical
+    print(f"{args.pages} pages, latency {args.latency * 1000:.0f} ms")
+    print(f"sequential {sequential_time:7.2f} s | async {parallel_time:7.2f} s | "
+          f"x{sequential_time / parallel_time:5.1f} | "
+          f"async + {args.extract_workers} extract processes {pipeline_time:7.2f} s | identical: {identical}")
+    for row in stats.report():
+        utilization = "-" if row["utilization"] is None else f"{row['utilization']:.0%}"
+        print(f"  {row['stage']:8s} {row['items_per_sec']:8.1f} items/s | busy {utilization:>4s} | "
+              f"queue avg {row['queue_depth_avg']:5.1f} max {row['queue_depth_max']}")
+
+    print(f"async connections: {connections} for {args.pages} requests")
+
+    max_total, max_active = limits
+    limits_ok = (max_total <= args.concurrency
+                 and all(count <= args.per_host for count in max_active.values()))
+    failed = failed or not limits_ok
+    print(f"max concurrent: total {max_total} (limit {args.concurrency}), "
+          f"per host {max_active} (limit {args.per_host}) | ok: {limits_ok}")
+
+    # Прогоны кэша: первый загружает, второй проверяет (304), третий — без запросов
+    (cold_time, cold, cold_http, _, cold_requests, _), (warm_time, warm, warm_http, warm_extract,
+                                                        warm_requests, warm_304), \
+        (fresh_time, fresh, fresh_http, _, fresh_requests, _) = cache_runs
+    cache_ok = (cold == warm == fresh == sequential
+                and cold_http["misses"] == args.pages and cold_requests == args.pages
+                and warm_http["revalidated"] == args.pages and warm_304 == args.pages
+                and warm_extract["hits"] == args.pages
+                and fresh_http["fresh_hits"] == args.pages and fresh_requests == 0)
+    failed = failed or not cache_ok
+    print(f"cache: cold {cold_time:5.2f} s | revalidate {warm_time:5.2f} s "
+          f"({warm_304} x 304, hit ratio {warm_http['hit_ratio']:.0%}, "
+          f"{warm_http['bytes_saved'] / 1024:.0f} KB saved, {warm_extract['hits']} extractions reused) | "
+          f"within ttl {fresh_time:5.2f} s ({fresh_requests} requests) | ok: {cache_ok}")
+
+    server.reset()
+    with WebFetcher(concurrency=4, per_host=2, retries=2, backoff=0.01,
+                    max_body_size=1024 * 1024) as fetcher:
+        checks = [f"{hosts[0]}/flaky/1", f"{hosts[0]}/huge/1", f"{hosts[0]}/missing/1"]
+        results = {result["url"]: result for _, result in fetcher.iter_fetch(checks)}
+    flaky, huge, missing = (results[url] for url in checks)
+    behaviour_ok = (flaky["error"] is None and server.attempts["/flaky/1"] == 2
+                    and isinstance(huge["error"], BodyTooLargeError)
+                    and missing["status"] == 404 and server.attempts["/missing/1"] == 1)
+    failed = failed or not behaviour_ok
+    print(f"retry after 503: {flaky['error'] is None} ({server.attempts['/flaky/1']} attempts) | "
+          f"body cap: {type(huge['error']).__name__} | 404 not retried: {server.attempts['/missing/1'] == 1}")
+
+    server.shutdown()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
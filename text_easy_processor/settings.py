@@ -1,4 +1,5 @@
 from pathlib import Path
+import multiprocessing
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -127,4 +128,67 @@ TEXT_CLEANER_LANGUAGE = 'english'
 TEXT_CLEANER_USE_HUGGINGFACE = True
 TEXT_CLEANER_USE_GRAMMAR_CORRECTION = False
 TEXT_CLEANER_MIN_TEXT_LENGTH = 3
-TEXT_CLEANER_GRAMMAR_MODEL_SIZE = 'large'
\ No newline at end of file
+TEXT_CLEANER_GRAMMAR_MODEL_SIZE = 'large'
+
+# Обработка корпусов книг: число процессов и таймаут на один файл (в секундах)
+CORPUS_WORKERS = os.cpu_count() or 1
+CORPUS_FILE_TIMEOUT = 600
+
+# Кэш извлеченного текста книг (общий для всех загрузок) и его максимальный размер в байтах
+CORPUS_CACHE_DIR = os.path.join(MEDIA_ROOT, 'extraction_cache')
+CORPUS_CACHE_MAX_SIZE = 5 * 1024 ** 3
+
+# Загрузка веб-страниц: общий предел одновременных запросов и предел на один хост
+WEB_FETCH_CONCURRENCY = 32
+WEB_FETCH_PER_HOST = 4
+
+# Конвейер веб-корпуса: очередь загруженных страниц, число процессов извлечения
+# текста и таймаут извлечения одной страницы (в секундах)
+WEB_FETCH_QUEUE_SIZE = 64
+WEB_EXTRACT_WORKERS = os.cpu_count() or 1
+WEB_EXTRACT_TIMEOUT = 120
+
+# Кэш HTTP-ответов и извлеченных веб-страниц (общий для всех запусков): максимальный
+# размер каждого из кэшей в байтах и время, в течение которого ответ используется
+# без проверки на сервере (в секундах)
+WEB_CACHE_DIR = os.path.join(MEDIA_ROOT, 'web_cache')
+WEB_CACHE_MAX_SIZE = 2 * 1024 ** 3
+WEB_CACHE_TTL = 6 * 3600
+
+# Обход сайтов: папка состояния (очередь, множество встреченных адресов и журнал
+# обработанных страниц для продолжения прерванного обхода; у каждой задачи своя
+# подпапка), глубина и бюджет страниц по умолчанию и ожидаемое
+# число адресов (размер фильтра Блума: около 1.2 байта на адрес)
+WEB_CRAWL_STATE_DIR = os.path.join(MEDIA_ROOT, 'crawl_state')
+WEB_CRAWL_MAX_DEPTH = 2
+WEB_CRAWL_MAX_PAGES = 1000
+WEB_CRAWL_SEEN_CAPACITY = 10_000_000
+
+# Индекс MinHash-сигнатур для удаления почти дубликатов (общий для корпусов книг и
+# веб-страниц: дубликаты отсеиваются и среди ранее собранных корпусов)
+CORPUS_DEDUP_INDEX = os.path.join(MEDIA_ROOT, 'dedup_index.sqlite3')
+
+# Фоновые задачи построения корпусов: число одновременно выполняемых задач, как часто
+# свободный поток проверяет очередь (в секундах), через сколько секунд без обновления
+# задача считается прерванной (и берется в работу снова) и сколько раз ее повторять
+CORPUS_JOB_WORKERS = 1
+CORPUS_JOB_POLL_INTERVAL = 5
+CORPUS_JOB_STALE_AFTER = 120
+CORPUS_JOB_MAX_ATTEMPTS = 3
+
+# Способ запуска процессов пулов, которые создают фоновые задачи. Задачи выполняются
+# в потоках сервера, а fork копирует процесс вместе с блокировками, захваченными
+# другими потоками (журнал, соединения с базой), поэтому процессы запускаются
+# через forkserver (где его нет — через spawn)
+CORPUS_JOB_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Папка результатов задач веб-корпусов (у каждой задачи своя подпапка)
+CORPUS_JOB_DIR = os.path.join(MEDIA_ROOT, 'jobs')
+
+# Возобновляемая загрузка книг частями: папка загрузок (у каждой загрузки своя подпапка),
+# через сколько секунд без новых данных загрузка считается брошенной и сколько задач
+# загрузки выполняется одновременно (отдельно от CORPUS_JOB_WORKERS: задача загрузки
+# ждет данных клиента и не должна задерживать остальные задачи)
+CORPUS_UPLOAD_DIR = os.path.join(MEDIA_ROOT, 'uploaded_corpus')
+CORPUS_UPLOAD_IDLE_TIMEOUT = 3600
+CORPUS_UPLOAD_JOB_WORKERS = 4
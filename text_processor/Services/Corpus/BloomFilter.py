@@ -0,0 +1,97 @@
+import hashlib
+import math
+import os
+import struct
+import uuid
+from typing import Optional
+
+# Заголовок файла: сигнатура, число бит, число хеш-функций, емкость, число добавленных элементов
+_HEADER = struct.Struct("<4sQIQQ")
+_MAGIC = b"BLM1"
+
+
+class BloomFilter:
+    """
+    Компактное множество строк с ложноположительными ответами: «нет» всегда
+    точно, «да» ошибочно с вероятностью около error_rate, пока добавлено не
+    больше capacity элементов. Занимает около 1.2 байта на элемент при 1%
+    ошибок (10 млн URL — около 12 МБ) независимо от длины строк.
+
+    Позиции бит вычисляются двойным хешированием одного BLAKE2b-дайджеста.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        """
+        :param capacity: Ожидаемое число элементов
+        :param error_rate: Допустимая доля ложноположительных ответов при capacity элементах
+        """
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        # Нечетный шаг обходит все позиции
+        h2 |= 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> bool:
+        """Добавляет элемент; возвращает True, если его (вероятно) еще не было."""
+        added = False
+        bits = self._bits
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self) -> int:
+        """Число добавленных элементов (без учета ложных совпадений при добавлении)."""
+        return self.count
+
+    def save(self, path: str):
+        """Сохраняет фильтр в файл (атомарно)."""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, self.num_bits, self.num_hashes, self.capacity, self.count))
+                f.write(self._bits)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BloomFilter"]:
+        """Загружает фильтр из файла; None, если файла нет или он поврежден."""
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                bits = f.read()
+        except FileNotFoundError:
+            return None
+        if len(header) != _HEADER.size:
+            return None
+        magic, num_bits, num_hashes, capacity, count = _HEADER.unpack(header)
+        if magic != _MAGIC or len(bits) != (num_bits + 7) // 8:
+            return None
+        bloom = cls.__new__(cls)
+        bloom.capacity = capacity
+        bloom.error_rate = math.exp(-num_bits / capacity * math.log(2) ** 2)
+        bloom.num_bits = num_bits
+        bloom.num_hashes = num_hashes
+        bloom.count = count
+        bloom._bits = bytearray(bits)
+        return bloom
@@ -0,0 +1,262 @@
+import hashlib
+import io
+import logging
+import os
+import tarfile
+import tempfile
+import zipfile
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # архивы .tar.zst читаются, только если установлен пакет zstandard
+    zstandard = None
+
+# Расширения архивов книг и режим чтения: 'zip' и 'tar' — с произвольным доступом к
+# членам, остальные — потоком (сжатый tar читается только подряд)
+ARCHIVE_FORMATS = {
+    ".zip": "zip",
+    ".tar": "tar",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.bz2": "bz2",
+    ".tar.xz": "xz",
+    ".tar.zst": "zst",
+    ".tar.zstd": "zst",
+}
+ARCHIVE_EXTENSIONS = tuple(ARCHIVE_FORMATS)
+
+# Сколько открытых zip-архивов (с разобранным каталогом) держит один процесс
+ZIP_CACHE_SIZE = 4
+
+
+def archive_format(path: Union[str, os.PathLike]) -> Optional[str]:
+    """Режим чтения архива по расширению; None — не архив."""
+    name = os.fspath(path).lower()
+    for extension, mode in ARCHIVE_FORMATS.items():
+        if name.endswith(extension):
+            return mode
+    return None
+
+
+class ArchiveMember(os.PathLike):
+    """
+    Файл книги внутри архива.
+
+    Подставляется вместо пути к файлу: os.path.basename и os.path.splitext
+    работают с путем вида "<архив>!/<член>", а содержимое читается из архива
+    в память (см. book_input, open_text), без временных файлов. Член zip или
+    несжатого tar передается в рабочий процесс без данных (рабочий процесс
+    сам читает его из архива); член сжатого tar, который можно прочитать
+    только подряд, передается вместе с данными или, если его получат
+    несколько задач, через временный файл (см. spool). Данные и их хэш
+    читаются и вычисляются один раз на процесс.
+    """
+
+    def __init__(self, archive: str, name: str, size: int,
+                 offset: Optional[int] = None, data: Optional[bytes] = None):
+        """
+        :param archive: Путь к архиву
+        :param name: Имя члена в архиве
+        :param size: Размер члена в байтах
+        :param offset: Смещение данных члена в несжатом tar
+        :param data: Содержимое члена (для архивов, читаемых потоком)
+        """
+        self.archive = archive
+        self.name = name
+        self.size = size
+        self.offset = offset
+        self._data = data
+        self._streamed = data is not None
+        self._spool: Optional[str] = None
+        self._digest: Optional[str] = None
+
+    def __fspath__(self) -> str:
+        return f"{self.archive}!/{self.name}"
+
+    def __str__(self) -> str:
+        return self.__fspath__()
+
+    def __repr__(self) -> str:
+        return f"ArchiveMember({self.__fspath__()!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ArchiveMember) and os.fspath(self) == os.fspath(other)
+
+    def __hash__(self) -> int:
+        return hash(os.fspath(self))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if not self._streamed or self._spool is not None:
+            # Член с произвольным доступом или записанный во временный файл
+            # рабочий процесс прочитает сам
+            state["_data"] = None
+        return state
+
+    @property
+    def loaded(self) -> bool:
+        """Данные члена уже в памяти текущего процесса."""
+        return self._data is not None
+
+    def read(self) -> bytes:
+        """Содержимое члена (читается один раз)."""
+        if self._data is None:
+            if self._spool is not None:
+                with open(self._spool, "rb") as f:
+                    self._data = f.read()
+            elif self.offset is not None:
+                with open(self.archive, "rb") as f:
+                    f.seek(self.offset)
+                    self._data = f.read(self.size)
+            else:
+                self._data = _open_zip(self.archive).read(self.name)
+        return self._data
+
+    def spool(self) -> str:
+        """
+        Записывает данные члена во временный файл: после этого член
+        передается в рабочие процессы без данных, и каждый читает их из
+        файла. Файл удаляет release.
+
+        :return: Путь к временному файлу
+        """
+        if self._spool is None:
+            fd, path = tempfile.mkstemp(suffix=os.path.splitext(self.name)[1])
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.read())
+            self._spool = path
+        return self._spool
+
+    def release(self):
+        """Удаляет временный файл, созданный spool (данные остаются в памяти)."""
+        if self._spool is None:
+            return
+        try:
+            os.remove(self._spool)
+        except OSError as e:
+            logging.warning(f"Could not remove spooled archive member {self._spool}: {e}")
+        self._spool = None
+
+    def digest(self) -> str:
+        """SHA-256 содержимого (как ExtractionCache.file_digest для файла)."""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.read()).hexdigest()
+        return self._digest
+
+
+class BookArchive:
+    """
+    Перебор файлов книг в архиве zip, tar, tar.gz, tar.bz2, tar.xz или
+    tar.zst без распаковки на диск. Члены выдаются лениво, в порядке архива;
+    члены с неподходящими расширениями пропускаются без чтения данных.
+    """
+
+    def __init__(self, path: str, extensions: Optional[Tuple[str, ...]] = None):
+        """
+        :param path: Путь к архиву
+        :param extensions: Расширения нужных файлов (без учета регистра; None — все файлы)
+        """
+        self.path = path
+        self.mode = archive_format(path)
+        if self.mode is None:
+            raise ValueError(f"Unsupported archive: {path}")
+        if self.mode == "zst" and zstandard is None:
+            raise ValueError("Reading .tar.zst archives requires the zstandard package")
+        self.extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+
+    @property
+    def random_access(self) -> bool:
+        """Можно ли перечислить члены, не читая архив целиком."""
+        return self.mode in ("zip", "tar")
+
+    def _wanted(self, name: str) -> bool:
+        return self.extensions is None or name.lower().endswith(self.extensions)
+
+    def count(self) -> int:
+        """Число нужных файлов (0 для архивов, читаемых потоком: без полного чтения оно неизвестно)."""
+        if self.mode == "zip":
+            return sum(1 for info in _open_zip(self.path).infolist()
+                       if not info.is_dir() and self._wanted(info.filename))
+        if self.mode == "tar":
+            with tarfile.open(self.path, "r:") as tar:
+                return sum(1 for info in tar if info.isfile() and self._wanted(info.name))
+        return 0
+
+    def __iter__(self) -> Iterator[ArchiveMember]:
+        if self.mode == "zip":
+            for info in _open_zip(self.path).infolist():
+                if not info.is_dir() and self._wanted(info.filename):
+                    yield ArchiveMember(self.path, info.filename, info.file_size)
+        elif self.mode == "tar":
+            with tarfile.open(self.path, "r:") as tar:
+                for info in tar:
+                    if info.isfile() and self._wanted(info.name):
+                        yield ArchiveMember(self.path, info.name, info.size, offset=info.offset_data)
+        else:
+            yield from self._iter_stream()
+
+    def _iter_stream(self) -> Iterator[ArchiveMember]:
+        """Члены сжатого tar: архив распаковывается потоком, данные читаются по одному члену."""
+        with open(self.path, "rb") as raw:
+            if self.mode == "zst":
+                fileobj = zstandard.ZstdDecompressor().stream_reader(raw)
+                mode = "r|"
+            else:
+                fileobj = raw
+                mode = f"r|{self.mode}"
+            with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+                for info in tar:
+                    if info.isfile() and self._wanted(info.name):
+                        data = tar.extractfile(info).read()
+                        yield ArchiveMember(self.path, info.name, info.size, data=data)
+
+
+def iter_books(paths: Iterable[Union[str, ArchiveMember]],
+               extensions: Optional[Tuple[str, ...]] = None) -> Iterator[Union[str, ArchiveMember]]:
+    """Пути файлов, где архивы заменены их членами с нужными расширениями."""
+    for path in paths:
+        if isinstance(path, str) and archive_format(path) is not None:
+            try:
+                yield from BookArchive(path, extensions)
+            except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as e:
+                logging.error(f"Error reading archive {path}: {e}")
+        else:
+            yield path
+
+
+def book_input(source: Union[str, ArchiveMember]):
+    """Путь к файлу или, для члена архива, его содержимое в памяти (для PdfReader, ZipFile и т.п.)."""
+    if isinstance(source, ArchiveMember):
+        return io.BytesIO(source.read())
+    return source
+
+
+def open_text(source: Union[str, ArchiveMember], encoding: str = "utf-8"):
+    """Открывает файл или член архива как текст."""
+    if isinstance(source, ArchiveMember):
+        return io.TextIOWrapper(io.BytesIO(source.read()), encoding=encoding)
+    return open(source, "r", encoding=encoding)
+
+
+# Открытые zip-архивы процесса: каталог большого архива разбирается один раз
+_zip_cache: "OrderedDict[str, zipfile.ZipFile]" = OrderedDict()
+
+if hasattr(os, "register_at_fork"):
+    # Дочерний процесс пула не должен читать через унаследованный дескриптор:
+    # позиция в файле общая с родительским процессом
+    os.register_at_fork(after_in_child=_zip_cache.clear)
+
+
+def _open_zip(path: str) -> zipfile.ZipFile:
+    stat = os.stat(path)
+    # Перезаписанный архив открывается заново
+    key = f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    zipf = _zip_cache.pop(key, None)
+    if zipf is None:
+        zipf = zipfile.ZipFile(path)
+        while len(_zip_cache) >= ZIP_CACHE_SIZE:
+            _zip_cache.popitem(last=False)[1].close()
+    _zip_cache[key] = zipf
+    return zipf
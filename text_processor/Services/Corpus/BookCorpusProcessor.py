@@ -1,17 +1,34 @@
 import os
-import re
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections import deque
 from docx import Document
 import logging
-from typing import List, Dict, Optional, Tuple
-import nltk
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 from langdetect import detect
-import json
 import xml.etree.ElementTree as ET
+from contextlib import ExitStack
+from functools import partial
 from PyPDF2 import PdfReader
 from bs4 import BeautifulSoup
-from ebooklib import epub
-from concurrent.futures import ThreadPoolExecutor
-import zipfile
+from text_processor.Services.Corpus.TextCleaner import get_book_cleaner
+from text_processor.Services.Corpus.BookArchive import ArchiveMember, BookArchive, book_input, open_text
+from text_processor.Services.Corpus.DocxReader import DocxReader
+from text_processor.Services.Corpus.EpubReader import EpubReader
+from text_processor.Services.Corpus.ExtractionCache import ExtractionCache
+from text_processor.Services.Corpus.FileScanner import FileScanner
+from text_processor.Services.Corpus.NearDuplicateFilter import NearDuplicateFilter
+from text_processor.Services.Corpus.ProcessPool import OrderedProcessPool, TaskTimeoutError
+from text_processor.Services.Corpus.SentenceSplitter import get_sentence_splitter
+from text_processor.Services.Corpus.TokenExporter import TokenExporter
+from text_processor.Services.Corpus.CorpusIndex import index_path_for
+from text_processor.Services.Corpus.CorpusStats import CorpusStats
+from text_processor.Services.Corpus.CorpusWriters import (
+    CorpusWriter, TxtCorpusWriter, JsonCorpusWriter, JsonLinesCorpusWriter, XmlCorpusWriter,
+    ZipCorpusWriter, ShardedCorpusWriter
+)
 
 # Настройка логирования с UTF-8
 logging.basicConfig(
@@ -20,7 +37,14 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
+# Сколько символов потоково извлеченного текста книги держится в памяти,
+# пока файл не прочитан целиком (остальное — во временном файле)
+SPOOL_MEMORY_SIZE = 16 * 1024 * 1024
+
 class BookCorpusProcessor:
+    # Расширения файлов, из которых извлекается текст (см. get_file_reader)
+    supported_formats = (".docx", ".txt", ".pdf", ".html", ".epub")
+
     def __init__(self,
                  books_folder: str,
                  output_base: str = "Corpus_Books",
@@ -28,7 +52,31 @@ class BookCorpusProcessor:
                  language: str = "ru",
                  skip_pages: Tuple[int, int] = (3, 3),
                  ignore_footnotes: bool = True,
-                 ignore_links: bool = True):
+                 ignore_links: bool = True,
+                 workers: int = 1,
+                 file_timeout: Optional[float] = None,
+                 start_method: Optional[str] = None,
+                 zip_compresslevel: int = 6,
+                 cache_dir: Optional[str] = None,
+                 cache_max_size: int = 2 * 1024 ** 3,
+                 pdf_pages_per_task: int = 200,
+                 sentence_per_line: bool = False,
+                 dedup_threshold: Optional[float] = None,
+                 dedup_index_path: Optional[str] = None,
+                 shard_max_bytes: Optional[int] = None,
+                 shard_max_documents: Optional[int] = None,
+                 write_index: bool = True,
+                 export_tokens: bool = False,
+                 token_vocab_size: int = 50000,
+                 token_vocab_path: Optional[str] = None,
+                 collect_stats: bool = True,
+                 stats_top_k: int = 100,
+                 recursive: bool = True,
+                 include: Optional[List[str]] = None,
+                 exclude: Optional[List[str]] = None,
+                 min_file_size: int = 0,
+                 max_file_size: Optional[int] = None,
+                 strict_filenames: bool = True):
         """
         Инициализация класса.
 
@@ -39,6 +87,45 @@ class BookCorpusProcessor:
         :param skip_pages: Сколько страниц пропустить в начале и конце (start, end)
         :param ignore_footnotes: Игнорировать сноски
         :param ignore_links: Игнорировать ссылки
+        :param workers: Число процессов для извлечения текста (1 — последовательно в текущем
+                        процессе, 0 или None — по числу ядер)
+        :param file_timeout: Максимальное время обработки одного файла (или диапазона
+                             страниц PDF) в секундах (только при workers != 1)
+        :param start_method: Способ запуска процессов пула (см. OrderedProcessPool)
+        :param zip_compresslevel: Уровень сжатия zip-архива 1-9 (0 — без сжатия)
+        :param cache_dir: Папка кэша извлеченного текста (None — без кэша)
+        :param cache_max_size: Максимальный размер кэша в байтах
+        :param pdf_pages_per_task: Сколько страниц PDF извлекает одна задача пула; более
+                                   длинные PDF делятся между процессами (0 — не делить)
+        :param sentence_per_line: Выводить текст по одному предложению в строке
+        :param dedup_threshold: Порог сходства (0-1), начиная с которого книга считается почти
+                                дубликатом уже записанной и не попадает в корпус
+                                (None — без удаления дубликатов)
+        :param dedup_index_path: Файл индекса сигнатур для удаления дубликатов и среди
+                                 прежних корпусов (None — только внутри корпуса)
+        :param shard_max_bytes: Писать корпус шардами: новый файл после стольких байт
+        :param shard_max_documents: Писать корпус шардами: новый файл после стольких книг
+                                    (шарды и manifest.json — в папке <books_folder>/<output_base>;
+                                    для формата 'zip' не применяется)
+        :param write_index: Писать рядом с корпусом индекс смещений <корпус>.idx для
+                            произвольного доступа по номеру, названию и автору
+                            (см. CorpusIndex.CorpusReader; для формата 'zip' не пишется)
+        :param export_tokens: После записи корпуса экспортировать номера токенов в
+                              <output_base>.tokens.u32 и границы книг в <output_base>.offsets.u64
+                              (см. TokenExporter; нужен индекс корпуса)
+        :param token_vocab_size: Размер словаря экспорта токенов
+        :param token_vocab_path: Готовый словарь экспорта токенов (если файла нет,
+                                 построенный словарь сохраняется по этому пути)
+        :param collect_stats: Собирать статистику корпуса при записи и сохранять ее в
+                              <output_base>.stats.json (см. CorpusStats)
+        :param stats_top_k: Сколько самых частых слов и биграмм попадает в статистику
+        :param recursive: Искать книги и во вложенных папках books_folder
+        :param include: Шаблоны glob нужных файлов (см. FileScanner; None — все книги)
+        :param exclude: Шаблоны glob пропускаемых файлов и папок
+        :param min_file_size: Минимальный размер файла книги в байтах
+        :param max_file_size: Максимальный размер файла книги в байтах (None — без ограничения)
+        :param strict_filenames: Пропускать файлы с именем не вида "Название_Автор"
+                                 (иначе автор таких книг — "Unknown")
         """
         self.books_folder = books_folder
         self.output_base = output_base
@@ -47,8 +134,41 @@ class BookCorpusProcessor:
         self.skip_pages = skip_pages
         self.ignore_footnotes = ignore_footnotes
         self.ignore_links = ignore_links
+        self.workers = workers
+        self.file_timeout = file_timeout
+        self.start_method = start_method
+        self.zip_compresslevel = zip_compresslevel
+        self.cache_dir = cache_dir
+        self.cache_max_size = cache_max_size
+        self.cache = ExtractionCache(cache_dir, cache_max_size) if cache_dir else None
+        self.pdf_pages_per_task = pdf_pages_per_task
+        self.failed_pages = 0
+        self.sentence_per_line = sentence_per_line
+        self.dedup_threshold = dedup_threshold
+        self.dedup_index_path = dedup_index_path
+        self.dedup_report: Optional[Dict] = None
+        self.shard_max_bytes = shard_max_bytes
+        self.shard_max_documents = shard_max_documents
+        self.write_index = write_index
+        self.export_tokens = export_tokens
+        self.token_vocab_size = token_vocab_size
+        self.token_vocab_path = token_vocab_path
+        self.token_export: Optional[Dict] = None
+        self.collect_stats = collect_stats
+        self.stats_top_k = stats_top_k
+        self.stats_report: Optional[Dict] = None
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.min_file_size = min_file_size
+        self.max_file_size = max_file_size
+        self.strict_filenames = strict_filenames
         self.processed_books = []
         self.progress = 0
+        # Число найденных и завершенных файлов (для отображения хода обработки)
+        self.files_total = 0
+        self.files_done = 0
+        self.language_code = language
         self.language = self._map_language_code(language)
 
     def _map_language_code(self, language_code: str) -> str:
@@ -65,61 +185,22 @@ class BookCorpusProcessor:
         """
         Очищает текст с учетом настроек для сносок, ссылок и цифр.
         Также выполняет замену символов љ, ї, њ, Ќ, ў, ѓ на ҷ, ӣ, ҳ, қ, ӯ, ғ соответственно.
+        Паттерны компилируются один раз на конфигурацию (см. TextCleaner).
         """
-        patterns = [
-            r"^\s*\d+\s*$",  # Номера страниц
-            r"[^\w\s\.,!?;:()«»“”'\"\\/-]",  # Спецсимволы (сохраняем таджикские буквы)
-            r"\s+",  # Множественные пробелы
-            r"^\s*$",  # Пустые строки
-            r"\t+",  # Табуляции
-            r"\.{2,}",  # Многоточия
-            r"<.*?>",  # HTML-теги
-        ]
-        # Добавляем паттерны для сносок и ссылок если нужно
-        if self.ignore_footnotes:
-            patterns.extend([
-                r"\[\d+\]",  # Сноски типа [1], [2]
-                r"\^[a-zA-Z0-9]+",  # Сноски типа ^1, ^footnote
-                r"^\d+\.\s*([А-ЯЁA-Za-z\-]+\.)?.*",  # Сноски вида "1. И-Зи кирдори бад бо љањон."
-                r"^\d+\.\s*[А-ЯЁA-Za-z\-]+\.\s*\d+\s+.*",  # Сноски вида "6. И-б. 1331 нест."
-                r"^\d+\..*",  # Удаляет любые строки, начинающиеся с цифры и точки
-            ])
-        if self.ignore_links:
-            patterns.extend([
-                r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+",  # URL
-                r"www\.[a-zA-Z0-9-]+\.[a-zA-Z]{2,}",  # URL без http
-            ])
-        if custom_patterns:
-            patterns.extend(custom_patterns)
-        
-        # Удаляем все цифры
-        patterns.append(r"\d+")  # Находит все цифры
-        
-        for pattern in patterns:
-            text = re.sub(pattern, " ", text, flags=re.MULTILINE)
-
-        # Замена символов (строчные и заглавные)
-        replacements = {
-            "љ": "ҷ",
-            "ї": "ӣ",
-            "њ": "ҳ",
-            "ќ": "қ",
-            "ў": "ӯ",
-            "ѓ": "ғ",
-            "Љ": "Ҷ",
-            "Ї": "Ӣ",
-            "Њ": "Ҳ",
-            "Ќ": "Қ",
-            "Ў": "Ӯ",
-            "Ѓ": "Ғ"
-        }
-        for old_char, new_char in replacements.items():
-            text = text.replace(old_char, new_char)
+        cleaner = get_book_cleaner(self.ignore_footnotes, self.ignore_links,
+                                   tuple(custom_patterns or ()))
+        return cleaner.clean(text)
 
-        return text.strip()
+    def clean_text_chunks(self, chunks: Iterable[str],
+                          custom_patterns: Optional[List[str]] = None) -> Iterator[str]:
+        """
+        Очищает текст, переданный фрагментами, и выдает очищенные фрагменты.
+        Результат совпадает с clean_text для склеенного текста.
+        """
+        cleaner = get_book_cleaner(self.ignore_footnotes, self.ignore_links,
+                                   tuple(custom_patterns or ()))
+        return cleaner.clean_chunks(chunks)
 
-        
-        
     def extract_metadata(self, filename: str) -> Dict[str, str]:
         """Извлекает метаданные из имени файла."""
         base_name = os.path.splitext(filename)[0]
@@ -130,256 +211,845 @@ class BookCorpusProcessor:
             return {"title": title.strip(), "author": author.strip()}
         return {"title": base_name.strip(), "author": "Unknown"}
 
-    def process_docx_file(self, file_path: str) -> str:
-        """Обрабатывает DOCX файл с учетом пропуска страниц."""
-        try:
-            doc = Document(file_path)
-            paragraphs = [p.text for p in doc.paragraphs]
+    def make_record(self, file_path: str, text: str) -> Dict[str, str]:
+        """Собирает запись книги: метаданные из имени файла и очищенный текст."""
+        metadata = self.extract_metadata(os.path.basename(file_path))
+        return {
+            "title": metadata["title"],
+            "author": metadata["author"],
+            "language": self.language,
+            "text": text
+        }
 
-            # Пропускаем первые N "страниц" (здесь - абзацы)
-            if self.skip_pages[0] > 0:
-                paragraphs = paragraphs[self.skip_pages[0]:]
+    def format_book(self, record: Dict[str, str]) -> str:
+        """Форматирует запись книги для текстового корпуса."""
+        metadata_str = f"# Title: {record['title']}\n# Author: {record['author']}\n# Language: {record['language']}\n# -----\n"
+        return metadata_str + record["text"] + "\n\n"
 
-            # Пропускаем последние M "страниц"
-            if self.skip_pages[1] > 0:
-                paragraphs = paragraphs[:-self.skip_pages[1]] if self.skip_pages[1] > 0 else paragraphs
+    def book_element(self, record: Dict[str, str]) -> ET.Element:
+        """Создает XML-элемент книги."""
+        book_elem = ET.Element("book")
+        ET.SubElement(book_elem, "title").text = record["title"]
+        ET.SubElement(book_elem, "author").text = record["author"]
+        ET.SubElement(book_elem, "language").text = record["language"]
+        ET.SubElement(book_elem, "text").text = record["text"]
+        return book_elem
 
-            raw_text = "\n".join(paragraphs)
+    def _process_with(self, reader, file_type: str, file_path: str) -> Optional[Dict[str, str]]:
+        """Извлекает и очищает текст файла; при ошибке возвращает None."""
+        try:
+            raw_text = reader(file_path)
             cleaned_text = self.clean_text(raw_text)
-            metadata = self.extract_metadata(os.path.basename(file_path))
-            metadata_str = f"# Title: {metadata['title']}\n# Author: {metadata['author']}\n# Language: {self.language}\n# -----\n"
-            return metadata_str + cleaned_text + "\n\n"
         except Exception as e:
-            logging.error(f"Error processing DOCX {file_path}: {e}")
-            return ""
+            logging.error(f"Error processing {file_type} {file_path}: {e}")
+            return None
+        return self.make_record(file_path, cleaned_text)
 
-    def process_txt_file(self, file_path: str) -> str:
-        """Обрабатывает TXT файл с учетом пропуска страниц."""
+    def _stream_with(self, reader, file_type: str, file_path: str,
+                     cache_key: Optional[str] = None) -> Optional[Dict]:
+        """
+        Как _process_with, но текст извлекается и очищается фрагментами и
+        копится во временном файле (в памяти до SPOOL_MEMORY_SIZE), а текст
+        записи — итератор по нему. Запись выдается, только если файл прочитан
+        целиком: при ошибке посреди файла книга пропускается (как при
+        обработке в пуле), а в кэш (cache_key) ничего не сохраняется.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE, mode="w+", encoding="utf-8")
         try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                lines = file.readlines()
+            chunks = self.clean_text_chunks(reader(file_path))
+            if cache_key is not None:
+                chunks = self.cache.put_chunks(cache_key, chunks)
+            for chunk in chunks:
+                spool.write(chunk)
+        except Exception as e:
+            spool.close()
+            logging.error(f"Error processing {file_type} {file_path}: {e}")
+            return None
+        spool.seek(0)
+        return self.make_record(file_path, _replay_spool(spool))
 
-            # Пропускаем первые N строк как "страницы"
-            if self.skip_pages[0] > 0:
-                lines = lines[self.skip_pages[0]:]
+    def iter_docx_paragraphs(self, file_path: str) -> Iterator[str]:
+        """
+        Лениво выдает абзацы DOCX с учетом пропуска страниц (здесь — абзацев).
+        Абзацы читаются потоково (см. DocxReader); если пакет не удается
+        открыть, используется python-docx. Ошибка разбора посреди документа
+        передается вызывающему: недочитанная книга пропускается, а не
+        попадает в корпус и кэш (см. _stream_with).
+        """
+        try:
+            paragraphs = DocxReader(book_input(file_path)).iter_paragraphs()
+        except Exception as e:
+            logging.warning(f"Falling back to python-docx for {file_path}: {e}")
+            paragraphs = (p.text for p in Document(book_input(file_path)).paragraphs)
+        return _skip_edges(paragraphs, *self.skip_pages)
 
-            # Пропускаем последние M строк
-            if self.skip_pages[1] > 0:
-                lines = lines[:-self.skip_pages[1]] if self.skip_pages[1] > 0 else lines
+    def stream_docx_text(self, file_path: str) -> Iterator[str]:
+        """Извлекает текст DOCX по абзацам; абзацы разделяются переводом строки."""
+        return _join_lines(self.iter_docx_paragraphs(file_path))
 
-            raw_text = "".join(lines)
-            cleaned_text = self.clean_text(raw_text)
-            metadata = self.extract_metadata(os.path.basename(file_path))
-            metadata_str = f"# Title: {metadata['title']}\n# Author: {metadata['author']}\n# Language: {self.language}\n# -----\n"
-            return metadata_str + cleaned_text + "\n\n"
-        except Exception as e:
-            logging.error(f"Error processing TXT {file_path}: {e}")
-            return ""
+    def read_docx_text(self, file_path: str) -> str:
+        """Извлекает текст DOCX файла с учетом пропуска страниц."""
+        return "".join(self.stream_docx_text(file_path))
 
-    def process_pdf_file(self, file_path: str) -> str:
-        """Обрабатывает PDF файл с пропуском страниц."""
-        try:
-            reader = PdfReader(file_path)
-            total_pages = len(reader.pages)
+    def stream_txt_text(self, file_path: str, chunk_size: int = 1024 * 1024) -> Iterator[str]:
+        """
+        Читает TXT файл фрагментами по chunk_size символов с учетом пропуска
+        страниц (здесь — строк). Последние строки придерживаются в буфере,
+        поэтому память не зависит от размера файла.
+        """
+        file = open_text(file_path)
+        return _skip_text_lines(file, chunk_size, *self.skip_pages)
 
-            # Определяем диапазон страниц для обработки
-            start_page = min(self.skip_pages[0], total_pages - 1)
-            end_page = max(total_pages - self.skip_pages[1], start_page + 1)
+    def read_txt_text(self, file_path: str) -> str:
+        """Извлекает текст TXT файла с учетом пропуска страниц."""
+        return "".join(self.stream_txt_text(file_path))
 
-            raw_text = "\n".join(
-                reader.pages[i].extract_text()
-                for i in range(start_page, end_page))
+    def pdf_page_range(self, total_pages: int) -> Tuple[int, int]:
+        """Диапазон страниц PDF [start, end) с учетом пропуска страниц."""
+        start_page = min(self.skip_pages[0], total_pages - 1)
+        end_page = max(total_pages - self.skip_pages[1], start_page + 1)
+        return start_page, end_page
 
-            cleaned_text = self.clean_text(raw_text)
-            metadata = self.extract_metadata(os.path.basename(file_path))
-            metadata_str = f"# Title: {metadata['title']}\n# Author: {metadata['author']}\n# Language: {self.language}\n# -----\n"
-            return metadata_str + cleaned_text + "\n\n"
-        except Exception as e:
-            logging.error(f"Error processing PDF {file_path}: {e}")
-            return ""
+    def iter_pdf_pages(self, file_path: str, start: Optional[int] = None,
+                       end: Optional[int] = None) -> Iterator[str]:
+        """
+        Лениво извлекает текст страниц PDF [start, end) (по умолчанию — с учетом
+        пропуска страниц). Файл открывается сразу, страницы читаются по одной;
+        страница, текст которой не удалось извлечь, пропускается и учитывается
+        в self.failed_pages.
+        """
+        reader = PdfReader(book_input(file_path))
+        if start is None:
+            start, end = self.pdf_page_range(len(reader.pages))
+        return self._extract_pdf_pages(reader, file_path, start, end)
 
-    def process_html_file(self, file_path: str) -> str:
-        """Обрабатывает HTML файл."""
-        try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                soup = BeautifulSoup(file.read(), 'html.parser')
+    def _extract_pdf_pages(self, reader: PdfReader, file_path: str, start: int, end: int) -> Iterator[str]:
+        for i in range(start, end):
+            try:
+                text = reader.pages[i].extract_text() or ""
+            except Exception as e:
+                self.failed_pages += 1
+                logging.warning(f"Skipping unreadable page {i + 1} of {file_path}: {e}")
+                continue
+            finally:
+                # Разобранные объекты (шрифты, потоки содержимого) кэшируются
+                # читателем; сбрасываем их, чтобы память не росла с числом страниц
+                resolved = getattr(reader, "resolved_objects", None)
+                if resolved is not None:
+                    resolved.clear()
+            yield text
 
-            # Удаляем скрипты, стили, сноски и ссылки если нужно
-            for element in soup(["script", "style"] +
-                              (["sup"] if self.ignore_footnotes else []) +
-                              (["a"] if self.ignore_links else [])):
-                element.decompose()
+    def stream_pdf_text(self, file_path: str) -> Iterator[str]:
+        """Извлекает текст PDF постранично; страницы разделяются переводом строки."""
+        return _join_lines(self.iter_pdf_pages(file_path))
 
-            raw_text = soup.get_text(separator="\n")
-            cleaned_text = self.clean_text(raw_text)
-            metadata = self.extract_metadata(os.path.basename(file_path))
-            metadata_str = f"# Title: {metadata['title']}\n# Author: {metadata['author']}\n# Language: {self.language}\n# -----\n"
-            return metadata_str + cleaned_text + "\n\n"
-        except Exception as e:
-            logging.error(f"Error processing HTML {file_path}: {e}")
-            return ""
+    def read_pdf_text(self, file_path: str) -> str:
+        """Извлекает текст PDF файла с пропуском страниц."""
+        return "".join(self.stream_pdf_text(file_path))
 
-    def process_epub_file(self, file_path: str) -> str:
-        """Обрабатывает EPUB файл."""
-        try:
-            book = epub.read_epub(file_path)
-            raw_text = ""
-            for item in book.get_items_of_type(epub.ITEM_DOCUMENT):
-                text = item.content.decode("utf-8")
+    def read_html_text(self, file_path: str) -> str:
+        """Извлекает текст HTML файла."""
+        with open_text(file_path) as file:
+            soup = BeautifulSoup(file.read(), 'html.parser')
 
-                # Удаляем сноски и ссылки если нужно
-                if self.ignore_footnotes:
-                    text = re.sub(r"<epub:footnote.*?</epub:footnote>", "", text, flags=re.DOTALL)
-                if self.ignore_links:
-                    text = re.sub(r"<a href=.*?</a>", "", text, flags=re.DOTALL)
+        # Удаляем скрипты, стили, сноски и ссылки если нужно
+        for element in soup(["script", "style"] +
+                          (["sup"] if self.ignore_footnotes else []) +
+                          (["a"] if self.ignore_links else [])):
+            element.decompose()
 
-                raw_text += text
+        return soup.get_text(separator="\n")
 
-            cleaned_text = self.clean_text(raw_text)
-            metadata = self.extract_metadata(os.path.basename(file_path))
-            metadata_str = f"# Title: {metadata['title']}\n# Author: {metadata['author']}\n# Language: {self.language}\n# -----\n"
-            return metadata_str + cleaned_text + "\n\n"
-        except Exception as e:
-            logging.error(f"Error processing EPUB {file_path}: {e}")
-            return ""
+    def stream_epub_text(self, file_path: str) -> Iterator[str]:
+        """
+        Извлекает текст EPUB по документам в порядке spine прямо из контейнера
+        (см. EpubReader); сноски и ссылки удаляются при разборе.
+        """
+        return EpubReader(book_input(file_path), self.ignore_footnotes, self.ignore_links).iter_text()
+
+    def read_epub_text(self, file_path: str) -> str:
+        """Извлекает текст EPUB файла."""
+        return "".join(self.stream_epub_text(file_path))
+
+    def process_docx_file(self, file_path: str) -> str:
+        """Обрабатывает DOCX файл с учетом пропуска страниц."""
+        record = self._process_with(self.read_docx_text, "DOCX", file_path)
+        return self.format_book(record) if record else ""
+
+    def process_txt_file(self, file_path: str) -> str:
+        """Обрабатывает TXT файл с учетом пропуска страниц."""
+        record = self._process_with(self.read_txt_text, "TXT", file_path)
+        return self.format_book(record) if record else ""
+
+    def process_pdf_file(self, file_path: str) -> str:
+        """Обрабатывает PDF файл с пропуском страниц."""
+        record = self._process_with(self.read_pdf_text, "PDF", file_path)
+        return self.format_book(record) if record else ""
+
+    def process_html_file(self, file_path: str) -> str:
+        """Обрабатывает HTML файл."""
+        record = self._process_with(self.read_html_text, "HTML", file_path)
+        return self.format_book(record) if record else ""
+
+    def process_epub_file(self, file_path: str) -> str:
+        """Обрабатывает EPUB файл."""
+        record = self._process_with(self.read_epub_text, "EPUB", file_path)
+        return self.format_book(record) if record else ""
 
     def validate_filename(self, filename: str) -> bool:
         """Проверяет имя файла."""
         return "_" in filename and len(filename.split("_")) >= 2
 
+    def _valid_files(self, file_paths: Iterable[str]) -> Iterator[str]:
+        """Пропускает файлы неподдерживаемых форматов и с неверными именами, не дожидаясь остальных."""
+        for file_path in file_paths:
+            filename = os.path.basename(file_path)
+            if not filename.lower().endswith(self.supported_formats):
+                logging.warning(f"Skipping unsupported file: {filename}")
+            elif self.strict_filenames and not self.validate_filename(filename):
+                logging.warning(f"Skipping invalid filename: {filename}")
+            else:
+                yield file_path
+                continue
+            self._file_done()
+
     def split_into_sentences(self, text: str) -> str:
-        """Разделяет текст на предложения."""
+        """
+        Разделяет текст на предложения (по одному в строке). Модель Punkt
+        загружается один раз на процесс; для языков без модели (таджикский)
+        используется разбиение по правилам.
+        """
         try:
-            nltk.download('punkt', quiet=True)
-            sentences = nltk.sent_tokenize(text, language=self.language)
-            return "\n".join(sentences)
+            return "\n".join(get_sentence_splitter(self.language).split(text))
         except Exception as e:
             logging.warning(f"Sentence splitting error: {e}")
             return text
 
-    def process_all_books(self):
-        """Обрабатывает все книги в папке."""
+    def split_chunks_into_sentences(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Как split_into_sentences для текста, переданного фрагментами."""
+        batches = get_sentence_splitter(self.language).split_chunks(chunks)
+        return _join_lines("\n".join(batch) for batch in batches)
+
+    def _segment(self, record: Optional[Dict]) -> Optional[Dict]:
+        """Этап разбиения на предложения (если включен sentence_per_line)."""
+        if record is None or not self.sentence_per_line:
+            return record
+        text = record["text"]
+        if isinstance(text, str):
+            record["text"] = self.split_into_sentences(text)
+        else:
+            record["text"] = self.split_chunks_into_sentences(text)
+        return record
+
+    def _worker_config(self) -> Dict:
+        """Параметры для создания копии процессора в рабочем процессе."""
+        return {
+            "books_folder": self.books_folder,
+            "output_base": self.output_base,
+            "output_format": self.output_format,
+            "language": self.language_code,
+            "skip_pages": self.skip_pages,
+            "ignore_footnotes": self.ignore_footnotes,
+            "ignore_links": self.ignore_links,
+            "cache_dir": self.cache_dir,
+            "cache_max_size": self.cache_max_size,
+            "sentence_per_line": self.sentence_per_line,
+        }
+
+    def get_file_reader(self, filename: str):
+        """Возвращает функцию извлечения текста и тип файла по расширению."""
+        return {
+            ".docx": (self.read_docx_text, "DOCX"),
+            ".txt": (self.read_txt_text, "TXT"),
+            ".pdf": (self.read_pdf_text, "PDF"),
+            ".html": (self.read_html_text, "HTML"),
+            ".epub": (self.read_epub_text, "EPUB"),
+        }.get(os.path.splitext(filename)[1].lower(), (None, None))
+
+    def get_chunk_reader(self, filename: str):
+        """
+        Возвращает функцию потокового извлечения текста (итератор фрагментов)
+        и тип файла; (None, None), если формат извлекается только целиком.
+        """
+        return {
+            ".pdf": (self.stream_pdf_text, "PDF"),
+            ".epub": (self.stream_epub_text, "EPUB"),
+            ".docx": (self.stream_docx_text, "DOCX"),
+            ".txt": (self.stream_txt_text, "TXT"),
+        }.get(os.path.splitext(filename)[1].lower(), (None, None))
+
+    def cache_key(self, file_path: str, file_type: str) -> str:
+        """Ключ кэша: хэш содержимого файла и параметры извлечения и очистки."""
+        options = {
+            "type": file_type,
+            "skip_pages": list(self.skip_pages),
+            "ignore_footnotes": self.ignore_footnotes,
+            "ignore_links": self.ignore_links,
+            "language": self.language,
+        }
+        if isinstance(file_path, ArchiveMember):
+            digest = file_path.digest()
+        else:
+            digest = self.cache.file_digest(file_path)
+        return self.cache.make_key(digest, options)
+
+    def process_book(self, file_path: str, stream: bool = False) -> Optional[Dict]:
+        """
+        Обрабатывает файл любого поддерживаемого формата и возвращает запись книги.
+        Если задан кэш, текст берется из него или сохраняется в него (до
+        разбиения на предложения, которое не зависит от формата файла).
+
+        :param stream: Для форматов с потоковым извлечением вернуть текст итератором
+                       фрагментов (см. get_chunk_reader)
+        """
+        reader, file_type = self.get_file_reader(file_path)
+        if reader is None:
+            return None
+        chunk_reader = self.get_chunk_reader(file_path)[0] if stream else None
+        if chunk_reader is None:
+            process = partial(self._process_with, reader, file_type, file_path)
+        else:
+            process = partial(self._stream_with, chunk_reader, file_type, file_path)
+        if self.cache is None:
+            return self._segment(process())
+
+        try:
+            key = self.cache_key(file_path, file_type)
+        except OSError as e:
+            logging.error(f"Error processing {file_type} {file_path}: {e}")
+            return None
+        text = self.cache.get_chunks(key) if chunk_reader is not None else self.cache.get(key)
+        if text is not None:
+            return self._segment(self.make_record(file_path, text))
+
+        if chunk_reader is not None:
+            # Текст попадает в кэш, только если файл прочитан целиком
+            return self._segment(process(cache_key=key))
+        record = process()
+        if record is None:
+            return None
+        self.cache.put(key, record["text"])
+        return self._segment(record)
+
+    def _file_done(self):
+        """Отмечает завершенный (или пропущенный) файл в ходе обработки."""
+        self.files_done += 1
+        self.progress = int((self.files_done / self.files_total) * 100) if self.files_total else 0
+
+    def _iter_processed(self, file_paths: Iterable[str]):
+        """
+        Обрабатывает файлы последовательно или в пуле процессов.
+
+        Результаты выдаются в порядке file_paths (это может быть ленивый
+        итератор); self.progress обновляется по мере завершения файлов. При
+        последовательной обработке текст PDF выдается потоком фрагментов; в
+        пуле длинные PDF делятся на диапазоны страниц, которые извлекаются
+        разными процессами, а склеиваются, очищаются и разбиваются на
+        предложения потоком в текущем процессе (см. _assemble_pdf).
+
+        :return: Пары (путь к файлу, запись книги или None)
+        """
+        if self.workers == 1:
+            for file_path in file_paths:
+                record = self.process_book(file_path, stream=True)
+                self._file_done()
+                yield file_path, record
+            return
+
+        parts_done = {}
+
+        def on_done(task, error):
+            # Файл завершен, когда готовы все его задачи (части PDF
+            # завершаются в любом порядке)
+            if task[0] == "pages":
+                file_path, parts = task[1], task[4]
+                parts_done[file_path] = parts_done.get(file_path, 0) + 1
+                if parts_done[file_path] < parts:
+                    return
+                del parts_done[file_path]
+            self._file_done()
+
+        if self.sentence_per_line:
+            # Модель загружается (при необходимости скачивается) до запуска
+            # рабочих процессов, чтобы они нашли ее на диске
+            get_sentence_splitter(self.language)
+
+        pool = OrderedProcessPool(
+            workers=self.workers,
+            task_timeout=self.file_timeout,
+            initializer=_init_book_worker,
+            initargs=(self._worker_config(),),
+            start_method=self.start_method
+        )
+        spooled = []
+        results = pool.imap(_run_book_task, self._pool_tasks(file_paths, spooled), on_done)
+        try:
+            for task, result, error in results:
+                file_path = task[1]
+                if task[0] == "pages":
+                    yield file_path, self._assemble_pdf(task, result, error, results)
+                    continue
+
+                if isinstance(error, TaskTimeoutError):
+                    logging.error(f"Timeout processing {file_path}: exceeded {self.file_timeout} s")
+                elif error is not None:
+                    logging.error(f"Error processing {file_path}: {error}")
+                record, cache_hit, failed_pages = result or (None, None, 0)
+                self.failed_pages += failed_pages
+                if self.cache is not None and cache_hit is not None:
+                    # Счетчики кэша рабочих процессов собираются в родительском процессе
+                    if cache_hit:
+                        self.cache.hits += 1
+                    else:
+                        self.cache.misses += 1
+                yield file_path, record
+        finally:
+            results.close()
+            # Временные файлы членов сжатого tar, части которых не были собраны
+            for path in spooled:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _pool_tasks(self, file_paths: List[str], spooled: List[str]) -> Iterator[Tuple]:
+        """
+        Задачи пула: ("book", путь) или, для длинных PDF,
+        ("pages", путь, (start, end), номер части, число частей).
+
+        Член zip или несжатого tar текущий процесс не читает: его хэш и
+        текст вычисляет рабочий процесс, поэтому такой PDF извлекается
+        целиком одним процессом. Страницы считаются только у файлов и
+        членов, данные которых уже в памяти (сжатый tar). Член сжатого tar,
+        который делится на части, записывается во временный файл (см.
+        ArchiveMember.spool), чтобы данные не копировались в каждую задачу.
+
+        :param spooled: Сюда добавляются пути временных файлов; файл
+                        удаляется после сборки текста (см. _assemble_pdf)
+        """
+        size = self.pdf_pages_per_task
+        for file_path in file_paths:
+            ranges = []
+            unread_member = isinstance(file_path, ArchiveMember) and not file_path.loaded
+            if size and not unread_member and self.get_file_reader(file_path)[1] == "PDF" \
+                    and not self._is_cached(file_path, "PDF"):
+                try:
+                    start, end = self.pdf_page_range(len(PdfReader(book_input(file_path)).pages))
+                    ranges = [(i, min(i + size, end)) for i in range(start, end, size)]
+                except Exception:
+                    # Ошибку открытия сообщит обработка файла целиком
+                    ranges = []
+            if len(ranges) > 1:
+                if isinstance(file_path, ArchiveMember):
+                    try:
+                        spooled.append(file_path.spool())
+                    except OSError as e:
+                        logging.warning(f"Could not spool {file_path}, processing it as a whole: {e}")
+                        yield "book", file_path
+                        continue
+                for part, page_range in enumerate(ranges):
+                    yield "pages", file_path, page_range, part, len(ranges)
+            else:
+                yield "book", file_path
+
+    def _is_cached(self, file_path: str, file_type: str) -> bool:
+        if self.cache is None:
+            return False
+        try:
+            return self.cache.contains(self.cache_key(file_path, file_type))
+        except OSError:
+            return False
+
+    def _assemble_pdf(self, task: Tuple, result, error, results: Iterator) -> Dict:
+        """
+        Собирает запись PDF, страницы которого извлекаются частями в пуле.
+        Текст — итератор очищенных фрагментов; следующие части читаются из
+        results по мере записи текста, поэтому в памяти не больше частей,
+        чем допускает пул.
+
+        Очистка и разбиение на предложения выполняются здесь, в текущем
+        процессе, а не в рабочих: границы диапазонов страниц не являются
+        безопасными точками разреза ни для очистки, ни для разбиения, а в
+        кэш попадает очищенный текст документа целиком. Эта работа идет
+        параллельно с извлечением следующих частей в пуле, которое
+        обходится намного дороже.
+        """
+        file_path = task[1]
+
+        def pages():
+            part_task, part_result, part_error = task, result, error
+            while True:
+                (start, end), part, parts = part_task[2:]
+                if part_error is not None:
+                    self.failed_pages += end - start
+                    if isinstance(part_error, TaskTimeoutError):
+                        reason = f"exceeded {self.file_timeout} s"
+                    else:
+                        reason = str(part_error)
+                    logging.error(f"Error processing pages {start + 1}-{end} of {file_path}: {reason}")
+                else:
+                    part_pages, failed_pages = part_result
+                    self.failed_pages += failed_pages
+                    yield from part_pages
+                if part == parts - 1:
+                    break
+                part_task, part_result, part_error = next(results)
+            if isinstance(file_path, ArchiveMember):
+                file_path.release()
+
+        raw_pages = pages()
+        text = self.clean_text_chunks(_join_lines(raw_pages))
+        if self.cache is not None:
+            try:
+                text = self.cache.put_chunks(self.cache_key(file_path, "PDF"), text)
+                self.cache.misses += 1
+            except OSError as e:
+                logging.warning(f"Extraction cache skipped for {file_path}: {e}")
+        return self._segment(self.make_record(file_path, _drain_after(text, raw_pages)))
+
+    def create_writer(self, output_format: str, stream) -> CorpusWriter:
+        """Создает потоковый писатель корпуса книг для формата."""
+        if output_format == 'txt':
+            return TxtCorpusWriter(stream, render=self.format_book, separator="\n")
+        if output_format == 'json':
+            return JsonCorpusWriter(stream, indent=2)
+        if output_format == 'jsonl':
+            return JsonLinesCorpusWriter(stream)
+        if output_format == 'xml':
+            return XmlCorpusWriter(stream, root_tag="books", build=self.book_element)
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+    @staticmethod
+    def index_fields(record: Dict) -> Dict[str, str]:
+        """Поля книги для поиска по индексу корпуса."""
+        return {"title": record["title"], "author": record["author"]}
+
+    @property
+    def sharded(self) -> bool:
+        """Корпус пишется шардами (см. ShardedCorpusWriter)."""
+        return bool(self.shard_max_bytes or self.shard_max_documents) and self.output_format != 'zip'
+
+    def output_path(self) -> str:
+        """Путь к корпусу; для корпуса из шардов — к его манифесту."""
+        if self.sharded:
+            return os.path.join(self.books_folder, self.output_base, ShardedCorpusWriter.manifest_name)
+        return os.path.join(self.books_folder, f"{self.output_base}.{self.output_format}")
+
+    def open_output(self, output_path: str, stack: ExitStack):
+        """
+        Открывает выходной корпус. Для формата 'zip' все форматы (txt, json, xml)
+        пишутся за один проход прямо в члены архива.
+        """
+        if self.sharded:
+            return stack.enter_context(ShardedCorpusWriter(
+                os.path.dirname(output_path), self.output_base,
+                partial(self.create_writer, self.output_format),
+                max_bytes=self.shard_max_bytes, max_documents=self.shard_max_documents,
+                index=self.write_index, index_fields=self.index_fields))
+        if self.output_format == 'zip':
+            members = [(f"{self.output_base}.{fmt}", partial(self.create_writer, fmt))
+                       for fmt in ('txt', 'json', 'xml')]
+            return stack.enter_context(
+                ZipCorpusWriter(output_path, members, compresslevel=self.zip_compresslevel))
+        # Индекс прежнего корпуса с тем же именем ему больше не соответствует
+        if os.path.exists(index_path_for(output_path)):
+            os.remove(index_path_for(output_path))
+        stream = stack.enter_context(open(output_path, "wb"))
+        writer = self.create_writer(self.output_format, stream)
+        if self.write_index:
+            writer.enable_index(self.index_fields)
+        return writer
+
+    def is_duplicate(self, dedup: NearDuplicateFilter, file_path: str, record: Dict) -> bool:
+        """
+        Проверяет, почти совпадает ли текст книги с уже принятой книгой. Текст,
+        переданный фрагментами, копится во временном файле и снова подставляется
+        в запись.
+        """
+        filename = os.path.basename(file_path)
+        if isinstance(record["text"], str):
+            duplicate = dedup.check(filename, record["text"])
+        else:
+            duplicate, record["text"] = dedup.check_chunks(filename, record["text"])
+        if duplicate is None:
+            return False
+        kept, _, similarity = duplicate
+        logging.info(f"Skipping near-duplicate: {filename} (similarity {similarity:.2f} with {kept})")
+        return True
+
+    def save_dedup_report(self, dedup: NearDuplicateFilter):
+        """Сохраняет кластеры удаленных дубликатов в <output_base>.duplicates.json."""
+        self.dedup_report = dedup.report()
+        report_path = os.path.join(self.books_folder, f"{self.output_base}.duplicates.json")
+        dedup.save_report(report_path)
+        logging.info(f"Near-duplicates removed: {dedup.removed} of {dedup.checked} "
+                     f"({len(dedup.clusters)} clusters), report: {report_path}")
+
+    def save_stats(self, stats: CorpusStats):
+        """Сохраняет статистику корпуса в <output_base>.stats.json."""
+        stats_path = os.path.join(self.books_folder, f"{self.output_base}.stats.json")
+        self.stats_report = stats.save(stats_path)
+        logging.info(f"Corpus statistics: {stats.documents} books, {self.stats_report['tokens']} tokens, "
+                     f"~{self.stats_report['sample']['vocabulary_estimate']} distinct words "
+                     f"({stats.seconds:.1f} s), saved to: {stats_path}")
+
+    def export_token_ids(self, corpus_path: str):
+        """Экспортирует номера токенов записанного корпуса (см. TokenExporter)."""
+        if self.output_format == 'zip' or not self.write_index:
+            logging.warning("Token export needs an indexed corpus (write_index, not zip); skipped")
+            return
+        exporter = TokenExporter(self.token_vocab_size, workers=self.workers,
+                                 vocab_path=self.token_vocab_path, start_method=self.start_method)
+        self.token_export = exporter.export(corpus_path, os.path.join(self.books_folder, self.output_base))
+
+    def scanner(self) -> FileScanner:
+        """
+        Обход папки книг с фильтрами процессора. Прежние результаты (файлы
+        <output_base>.* и папка шардов <output_base>) книгами не считаются.
+        """
+        return FileScanner(extensions=self.supported_formats,
+                           include=self.include,
+                           exclude=list(self.exclude or []) + [self.output_base, f"{self.output_base}.*"],
+                           min_size=self.min_file_size,
+                           max_size=self.max_file_size,
+                           recursive=self.recursive)
+
+    def _count_found(self, file_paths: Iterable[str]) -> Iterator[str]:
+        """Учитывает найденные при обходе файлы в self.files_total."""
+        for file_path in file_paths:
+            self.files_total += 1
+            yield file_path
+
+    def process_archive(self, archive_path: str):
+        """
+        Обрабатывает книги из архива (zip, tar, tar.gz, tar.bz2, tar.xz, tar.zst)
+        без распаковки: содержимое членов передается извлечению текста прямо из
+        архива, члены распределяются между рабочими процессами. Корпус
+        сохраняется в books_folder.
+        """
+        try:
+            archive = BookArchive(archive_path, self.supported_formats)
+            total_files = archive.count()
+        except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as e:
+            logging.error(f"Cannot read archive {archive_path}: {e}")
+            return None
+        return self.process_all_books(iter(archive), total_files)
+
+    def process_all_books(self, file_paths: Optional[Iterable[str]] = None, total_files: int = 0):
+        """
+        Обрабатывает все книги в папке; каждая книга сразу дописывается в корпус.
+
+        :param file_paths: Файлы (пути или члены архивов) вместо содержимого папки; может быть
+                           ленивым итератором (например, файлы по мере загрузки), обработка
+                           идет по мере поступления
+        :param total_files: Ожидаемое число файлов file_paths (для хода обработки)
+        """
         if not os.path.exists(self.books_folder):
             logging.error("Directory does not exist.")
             return None
 
-        all_books = []
-        supported_formats = (".docx", ".txt", ".pdf", ".html", ".epub")
-        files = [f for f in os.listdir(self.books_folder)
-                if any(f.endswith(fmt) for fmt in supported_formats)]
-        total_files = len(files)
+        if self.output_format not in ('txt', 'json', 'jsonl', 'xml', 'zip'):
+            logging.error(f"Unsupported output format: {self.output_format}")
+            return None
 
-        for i, filename in enumerate(files, 1):
-            file_path = os.path.join(self.books_folder, filename)
+        self.files_done = 0
+        self.files_total = total_files
+        scanner = None
+        if file_paths is None:
+            # Папка обходится лениво: книги обрабатываются, пока обход продолжается
+            scanner = self.scanner()
+            file_paths = self._count_found(scanner.scan(self.books_folder))
+        file_paths = self._valid_files(file_paths)
 
-            if not self.validate_filename(filename):
-                logging.warning(f"Skipping invalid filename: {filename}")
-                continue
+        if self.output_format == 'zip' and (self.shard_max_bytes or self.shard_max_documents):
+            logging.warning("Sharding is not supported for the zip format; writing a single archive")
+        output_path = self.output_path()
+        writer = None
+        try:
+            with ExitStack() as stack:
+                dedup = None
+                if self.dedup_threshold is not None:
+                    dedup = stack.enter_context(NearDuplicateFilter(
+                        self.dedup_index_path, self.dedup_threshold,
+                        corpus=f"{self.output_base} {time.strftime('%Y-%m-%d %H:%M:%S')}"))
+                stats = CorpusStats(self.stats_top_k) if self.collect_stats else None
+                for file_path, record in self._iter_processed(file_paths):
+                    if record is None:
+                        continue
+                    if dedup is not None and self.is_duplicate(dedup, file_path, record):
+                        continue
+                    if stats is not None:
+                        # Текст, переданный фрагментами, учитывается по мере записи
+                        record["text"] = stats.observe(record["text"], record["language"])
+                    if writer is None:
+                        # Файл корпуса создается при первой обработанной книге
+                        writer = self.open_output(output_path, stack)
+                    writer.write(record)
 
-            processor = {
-                ".docx": self.process_docx_file,
-                ".txt": self.process_txt_file,
-                ".pdf": self.process_pdf_file,
-                ".html": self.process_html_file,
-                ".epub": self.process_epub_file,
-            }.get(os.path.splitext(filename)[1].lower())
-
-            if processor:
-                processed_text = processor(file_path)
-                if processed_text:
-                    all_books.append(processed_text)
+                    filename = os.path.basename(file_path)
                     self.processed_books.append(filename)
                     logging.info(f"Processed: {filename}")
 
-            self.progress = int((i / total_files) * 100)
+                if writer is not None:
+                    writer.close()
+                    if isinstance(writer, CorpusWriter) and writer.index is not None:
+                        writer.save_index(index_path_for(output_path))
+                if dedup is not None:
+                    self.save_dedup_report(dedup)
+                if stats is not None and writer is not None:
+                    self.save_stats(stats)
 
-        if not all_books:
-            logging.error("No books were processed.")
-            return None
+            if self.failed_pages:
+                logging.warning(f"Skipped {self.failed_pages} unreadable PDF page(s)")
 
-        # Сохранение результатов
-        output_path = None
-        try:
-            if self.output_format == 'txt':
-                output_path = os.path.join(self.books_folder, f"{self.output_base}.txt")
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write("\n".join(all_books))
-
-            elif self.output_format == 'json':
-                output_path = os.path.join(self.books_folder, f"{self.output_base}.json")
-                json_data = []
-                for book in all_books:
-                    lines = book.split("\n")
-                    title = lines[0].split(":")[1].strip()
-                    author = lines[1].split(":")[1].strip()
-                    text = "\n".join(lines[4:]).strip()
-                    json_data.append({
-                        "title": title,
-                        "author": author,
-                        "language": self.language,
-                        "text": text
-                    })
-                with open(output_path, "w", encoding="utf-8") as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=2)
-
-            elif self.output_format == 'xml':
-                output_path = os.path.join(self.books_folder, f"{self.output_base}.xml")
-                root = ET.Element("books")
-                for book in all_books:
-                    lines = book.split("\n")
-                    book_elem = ET.SubElement(root, "book")
-                    ET.SubElement(book_elem, "title").text = lines[0].split(":")[1].strip()
-                    ET.SubElement(book_elem, "author").text = lines[1].split(":")[1].strip()
-                    ET.SubElement(book_elem, "language").text = self.language
-                    ET.SubElement(book_elem, "text").text = "\n".join(lines[4:]).strip()
-                ET.ElementTree(root).write(output_path, encoding="utf-8", xml_declaration=True)
-
-            elif self.output_format == 'zip':
-                # Создаем временные файлы
-                temp_files = []
-                for fmt in ['txt', 'json', 'xml']:
-                    temp_path = os.path.join(self.books_folder, f"{self.output_base}.{fmt}")
-                    temp_files.append(temp_path)
-
-                    if fmt == 'txt':
-                        with open(temp_path, "w", encoding="utf-8") as f:
-                            f.write("\n".join(all_books))
-                    elif fmt == 'json':
-                        json_data = []
-                        for book in all_books:
-                            lines = book.split("\n")
-                            json_data.append({
-                                "title": lines[0].split(":")[1].strip(),
-                                "author": lines[1].split(":")[1].strip(),
-                                "language": self.language,
-                                "text": "\n".join(lines[4:]).strip()
-                            })
-                        with open(temp_path, "w", encoding="utf-8") as f:
-                            json.dump(json_data, f, ensure_ascii=False, indent=2)
-                    elif fmt == 'xml':
-                        root = ET.Element("books")
-                        for book in all_books:
-                            lines = book.split("\n")
-                            book_elem = ET.SubElement(root, "book")
-                            ET.SubElement(book_elem, "title").text = lines[0].split(":")[1].strip()
-                            ET.SubElement(book_elem, "author").text = lines[1].split(":")[1].strip()
-                            ET.SubElement(book_elem, "language").text = self.language
-                            ET.SubElement(book_elem, "text").text = "\n".join(lines[4:]).strip()
-                        ET.ElementTree(root).write(temp_path, encoding="utf-8", xml_declaration=True)
-
-                # Архивируем
-                output_path = os.path.join(self.books_folder, f"{self.output_base}.zip")
-                with zipfile.ZipFile(output_path, 'w') as zipf:
-                    for file in temp_files:
-                        zipf.write(file, arcname=os.path.basename(file))
-
-                # Удаляем временные файлы
-                for file in temp_files:
-                    os.remove(file)
+            if scanner is not None and (scanner.skipped_size or scanner.errors):
+                logging.warning(f"Folder scan skipped {scanner.skipped_size} file(s) by size "
+                                f"and {scanner.errors} unreadable entries")
+
+            if self.cache is not None:
+                stats = self.cache.stats()
+                logging.info(f"Extraction cache: {stats['hits']} hits, {stats['misses']} misses, "
+                             f"{stats['entries']} entries, {stats['size']} bytes")
+
+            if writer is None:
+                logging.error("No books were processed.")
+                return None
+
+            if self.export_tokens:
+                self.export_token_ids(output_path)
 
             logging.info(f"Processing complete. Saved to: {output_path}")
             return output_path
 
         except Exception as e:
             logging.error(f"Error saving results: {e}")
-            return None    
\ No newline at end of file
+            return None
+
+
+# Экземпляр процессора в рабочем процессе пула (см. BookCorpusProcessor._iter_processed)
+_worker_processor: Optional[BookCorpusProcessor] = None
+
+
+def _init_book_worker(config: Dict):
+    """Создает процессор один раз на рабочий процесс."""
+    global _worker_processor
+    _worker_processor = BookCorpusProcessor(**config)
+
+
+def _run_book_task(task: Tuple):
+    """Выполняет задачу пула (см. BookCorpusProcessor._pool_tasks)."""
+    if task[0] == "pages":
+        return _extract_pages_in_worker(task[1], *task[2])
+    return _process_book_in_worker(task[1])
+
+
+def _process_book_in_worker(file_path: str) -> Tuple[Optional[Dict[str, str]], Optional[bool], int]:
+    """
+    Возвращает запись книги, признак попадания в кэш (None — кэш не использовался)
+    и число пропущенных страниц.
+    """
+    cache = _worker_processor.cache
+    hits = cache.hits if cache else 0
+    misses = cache.misses if cache else 0
+    failed_pages = _worker_processor.failed_pages
+    record = _worker_processor.process_book(file_path)
+    failed_pages = _worker_processor.failed_pages - failed_pages
+    if cache is None or (cache.hits == hits and cache.misses == misses):
+        return record, None, failed_pages
+    return record, cache.hits > hits, failed_pages
+
+
+def _extract_pages_in_worker(file_path: str, start: int, end: int) -> Tuple[List[str], int]:
+    """Извлекает текст страниц PDF [start, end); возвращает страницы и число пропущенных."""
+    failed_pages = _worker_processor.failed_pages
+    pages = list(_worker_processor.iter_pdf_pages(file_path, start, end))
+    return pages, _worker_processor.failed_pages - failed_pages
+
+
+def _join_lines(parts: Iterable[str]) -> Iterator[str]:
+    """Выдает части (страницы, абзацы), разделяя их переводом строки (как "\\n".join)."""
+    first = True
+    for part in parts:
+        if not first:
+            yield "\n"
+        first = False
+        yield part
+
+
+def _skip_edges(items: Iterable, head: int, tail: int) -> Iterator:
+    """
+    Пропускает первые head и последние tail элементов, как срез
+    items[head:][:-tail], но держит в памяти не больше tail элементов.
+    """
+    items = iter(items)
+    for _ in zip(range(head), items):
+        pass
+    if tail <= 0:
+        yield from items
+        return
+    buffer = deque(maxlen=tail)
+    for item in items:
+        if len(buffer) == tail:
+            yield buffer[0]
+        buffer.append(item)
+
+
+def _skip_text_lines(file, chunk_size: int, head: int, tail: int) -> Iterator[str]:
+    """
+    Выдает текст файла фрагментами без первых head и последних tail строк,
+    как "".join(file.readlines()[head:][:-tail]). Закрывает файл.
+    """
+    with file:
+        pending = ""
+        for chunk in iter(lambda: file.read(chunk_size), ""):
+            while head > 0 and chunk:
+                end = chunk.find("\n")
+                if end < 0:
+                    # Строка продолжается в следующем фрагменте
+                    chunk = ""
+                else:
+                    chunk = chunk[end + 1:]
+                    head -= 1
+            if not chunk:
+                continue
+            if tail <= 0:
+                yield chunk
+                continue
+            pending += chunk
+            cut = _tail_lines_start(pending, tail)
+            if cut:
+                yield pending[:cut]
+                pending = pending[cut:]
+        if tail <= 0:
+            return
+        # Конец файла: придержанные строки и есть последние tail строк
+        cut = _tail_lines_start(pending, tail)
+        if cut:
+            yield pending[:cut]
+
+
+def _tail_lines_start(text: str, lines: int) -> int:
+    """Начало последних lines строк текста (незавершенная последняя строка тоже считается)."""
+    pos = len(text) - 1 if text.endswith("\n") else len(text)
+    for _ in range(lines):
+        pos = text.rfind("\n", 0, pos)
+        if pos < 0:
+            return 0
+    return pos + 1
+
+
+def _replay_spool(spool, chunk_size: int = 1024 * 1024) -> Iterator[str]:
+    """Выдает текст временного файла фрагментами и закрывает его."""
+    with spool:
+        for chunk in iter(lambda: spool.read(chunk_size), ""):
+            yield chunk
+
+
+def _drain_after(chunks: Iterator[str], source: Iterator) -> Iterator[str]:
+    """
+    Выдает chunks, затем дочитывает source: части документа нужно забрать
+    из пула, даже если текст был прочитан не полностью.
+    """
+    try:
+        yield from chunks
+    finally:
+        for _ in source:
+            pass
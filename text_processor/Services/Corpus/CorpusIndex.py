@@ -0,0 +1,359 @@
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import uuid
+import xml.etree.ElementTree as ET
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Расширение файла индекса: <корпус>.idx рядом с корпусом
+INDEX_EXTENSION = ".idx"
+
+# Заголовок файла индекса: сигнатура, версия, длина метаданных JSON
+_HEADER = struct.Struct("<4sII")
+_MAGIC = b"CIDX"
+_VERSION = 1
+
+
+def index_path_for(corpus_path: str) -> str:
+    """Путь к индексу корпуса."""
+    return corpus_path + INDEX_EXTENSION
+
+
+def key_hash(value: str) -> int:
+    """
+    64-битный хеш значения поля для поиска: регистр и пробельные символы не
+    учитываются. Совпадение хешей разных значений практически исключено.
+    """
+    normalized = " ".join(str(value).split()).casefold()
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class CorpusIndexBuilder:
+    """
+    Собирает индекс корпуса во время записи (см. CorpusWriter.enable_index):
+    байтовые границы каждого документа и хеши полей для поиска (название, автор).
+
+    В памяти держится около 16 байт на документ и 16 байт на значение поля;
+    сам текст документов не хранится.
+    """
+
+    def __init__(self, fields: Optional[Callable[[Dict], Dict[str, str]]] = None):
+        """
+        :param fields: Поля документа для поиска: запись -> {имя поля: значение}
+        """
+        self.fields = fields
+        self._spans = array("Q")
+        self._keys: Dict[str, array] = {}
+        self._ids: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._spans) // 2
+
+    def add(self, start: int, end: int, record: Dict):
+        """Добавляет документ, занимающий байты [start, end) корпуса."""
+        doc_id = len(self)
+        self._spans.extend((start, end))
+        if self.fields is None:
+            return
+        for name, value in self.fields(record).items():
+            if value is None:
+                continue
+            if name not in self._keys:
+                self._keys[name] = array("Q")
+                self._ids[name] = array("Q")
+            self._keys[name].append(key_hash(value))
+            self._ids[name].append(doc_id)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"spans": np.frombuffer(self._spans, dtype="<u8").reshape(-1, 2)}
+        for name, keys in self._keys.items():
+            hashes = np.frombuffer(keys, dtype="<u8")
+            ids = np.frombuffer(self._ids[name], dtype="<u8").astype("<u4")
+            # Хеш-таблица в виде корзин: число корзин — степень двойки не меньше
+            # числа значений, значения корзины лежат подряд
+            num_buckets = 1 << max(0, (len(hashes) - 1).bit_length())
+            buckets = hashes & np.uint64(num_buckets - 1)
+            order = np.argsort(buckets, kind="stable")
+            starts = np.zeros(num_buckets + 1, dtype="<u8")
+            starts[1:] = np.cumsum(np.bincount(buckets.astype(np.int64), minlength=num_buckets))
+            arrays[f"{name}.buckets"] = starts
+            arrays[f"{name}.hashes"] = hashes[order]
+            arrays[f"{name}.ids"] = ids[order]
+        return arrays
+
+    def save(self, path: str, corpus_format: str, encoding: str, corpus_bytes: int):
+        """
+        Сохраняет индекс (атомарно): заголовок, метаданные JSON и массивы
+        little-endian, выровненные по 8 байт, которые читатель отображает в
+        память без копирования.
+        """
+        arrays = self._arrays()
+        layout = {}
+        offset = 0
+        for name, values in arrays.items():
+            layout[name] = {"offset": offset, "dtype": values.dtype.str, "shape": list(values.shape)}
+            offset += _aligned(values.nbytes)
+        meta = json.dumps({
+            "format": corpus_format,
+            "encoding": encoding,
+            "documents": len(self),
+            "corpus_bytes": corpus_bytes,
+            "fields": sorted(self._keys),
+            "arrays": layout,
+        }, ensure_ascii=False).encode("utf-8")
+        meta += b" " * (_aligned(_HEADER.size + len(meta)) - _HEADER.size - len(meta))
+
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, len(meta)))
+                f.write(meta)
+                for values in arrays.values():
+                    data = values.tobytes()
+                    f.write(data)
+                    f.write(b"\0" * (_aligned(len(data)) - len(data)))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class _BaseCorpusReader:
+    """Общие операции читателей: разбор документов, поиск по полям, выборка."""
+
+    format = ""
+    encoding = "utf-8"
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def raw(self, doc_id: int) -> memoryview:
+        """Байты документа без копирования (срез отображенного в память файла)."""
+        raise NotImplementedError
+
+    def ids(self, field: str, value: str) -> List[int]:
+        """Номера документов, у которых поле field равно value (без учета регистра)."""
+        raise NotImplementedError
+
+    def text(self, doc_id: int) -> str:
+        """Документ в виде строки в формате корпуса."""
+        view = self.raw(doc_id)
+        try:
+            return str(view, self.encoding)
+        finally:
+            view.release()
+
+    def document(self, doc_id: int):
+        """
+        Разобранный документ: словарь для json и jsonl, элемент ElementTree
+        для xml, строка для txt.
+        """
+        text = self.text(doc_id)
+        if self.format in ("json", "jsonl"):
+            return json.loads(text)
+        if self.format == "xml":
+            return ET.fromstring(text)
+        return text
+
+    def _check_id(self, doc_id: int) -> int:
+        size = len(self)
+        if doc_id < 0:
+            doc_id += size
+        if not 0 <= doc_id < size:
+            raise IndexError("document index out of range")
+        return doc_id
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.document(i) for i in range(*item.indices(len(self)))]
+        return self.document(item)
+
+    def __iter__(self) -> Iterator:
+        for doc_id in range(len(self)):
+            yield self.document(doc_id)
+
+    def by_title(self, title: str) -> List:
+        """Документы с названием title."""
+        return [self.document(i) for i in self.ids("title", title)]
+
+    def by_author(self, author: str) -> List:
+        """Документы автора author."""
+        return [self.document(i) for i in self.ids("author", author)]
+
+    def sample(self, k: int, seed: Optional[int] = None) -> List:
+        """k случайных документов без повторов; с корпуса читаются только они."""
+        doc_ids = random.Random(seed).sample(range(len(self)), min(k, len(self)))
+        return [self.document(i) for i in doc_ids]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CorpusReader(_BaseCorpusReader):
+    """
+    Произвольный доступ к корпусу по индексу смещений (<корпус>.idx).
+
+    Корпус и индекс отображаются в память (mmap) и в память не загружаются:
+    документ по номеру, названию или автору находится за O(1), raw() отдает
+    байты документа без копирования, sample() читает только выбранные
+    документы. Поддерживаются все форматы писателей корпуса (txt, json,
+    jsonl, xml), кроме zip.
+
+    Срезы raw() ссылаются на отображенный файл: до close() их нужно
+    освободить (memoryview.release()).
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        """
+        :param path: Путь к файлу корпуса
+        :param index_path: Путь к индексу (по умолчанию <path>.idx)
+        """
+        self.path = path
+        self.index_path = index_path or index_path_for(path)
+        self._index_file = open(self.index_path, "rb")
+        self._index_map = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_size = _HEADER.unpack_from(self._index_map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f"Not a corpus index: {self.index_path}")
+        meta = json.loads(bytes(self._index_map[_HEADER.size:_HEADER.size + meta_size]))
+        self.format = meta["format"]
+        self.encoding = meta["encoding"]
+        self.fields = meta["fields"]
+
+        self._corpus_file = open(path, "rb")
+        size = os.fstat(self._corpus_file.fileno()).st_size
+        if size != meta["corpus_bytes"]:
+            self.close()
+            raise ValueError(f"Index {self.index_path} does not match corpus {path}")
+        self._corpus_map = mmap.mmap(self._corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        base = _HEADER.size + meta_size
+        self._arrays = {
+            name: np.frombuffer(self._index_map, dtype=spec["dtype"], count=int(np.prod(spec["shape"])),
+                                offset=base + spec["offset"]).reshape(spec["shape"])
+            for name, spec in meta["arrays"].items()
+        }
+        self._spans = self._arrays["spans"]
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def span(self, doc_id: int) -> tuple:
+        """Байтовые границы документа [start, end) в файле корпуса."""
+        start, end = self._spans[self._check_id(doc_id)]
+        return int(start), int(end)
+
+    def raw(self, doc_id: int) -> memoryview:
+        start, end = self.span(doc_id)
+        return memoryview(self._corpus_map)[start:end]
+
+    def raw_range(self, start_id: int, stop_id: int) -> memoryview:
+        """
+        Байты документов start_id..stop_id-1 одним срезом без копирования
+        (вместе с разделителями формата между ними).
+        """
+        if not 0 <= start_id < stop_id <= len(self):
+            raise IndexError("document range out of range")
+        return memoryview(self._corpus_map)[int(self._spans[start_id][0]):int(self._spans[stop_id - 1][1])]
+
+    def ids(self, field: str, value: str) -> List[int]:
+        if f"{field}.buckets" not in self._arrays:
+            raise KeyError(f"Field is not indexed: {field}")
+        buckets = self._arrays[f"{field}.buckets"]
+        key = key_hash(value)
+        bucket = key & (len(buckets) - 2)
+        start, end = int(buckets[bucket]), int(buckets[bucket + 1])
+        hashes = self._arrays[f"{field}.hashes"][start:end]
+        found = self._arrays[f"{field}.ids"][start:end][hashes == np.uint64(key)]
+        return sorted(int(i) for i in found)
+
+    def close(self):
+        # Массивы numpy держат ссылки на отображение индекса
+        self._arrays = {}
+        self._spans = np.zeros((0, 2), dtype="<u8")
+        for name in ("_corpus_map", "_index_map", "_corpus_file", "_index_file"):
+            resource = getattr(self, name, None)
+            if resource is not None:
+                resource.close()
+                setattr(self, name, None)
+
+
+class ShardedCorpusReader(_BaseCorpusReader):
+    """
+    Сквозной доступ к корпусу из шардов (manifest.json ShardedCorpusWriter):
+    документы нумеруются подряд по всем шардам, у каждого шарда свой индекс.
+    """
+
+    def __init__(self, manifest_path: str):
+        """
+        :param manifest_path: Путь к манифесту корпуса
+        """
+        self.manifest_path = manifest_path
+        with open(manifest_path, encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        directory = os.path.dirname(manifest_path)
+        self.format = self.manifest["format"]
+        self.shards: List[CorpusReader] = []
+        # Номер первого документа каждого шарда
+        self._starts: List[int] = []
+        total = 0
+        try:
+            for shard in self.manifest["shards"]:
+                index = shard.get("index") or index_path_for(shard["file"])
+                reader = CorpusReader(os.path.join(directory, shard["file"]), os.path.join(directory, index))
+                self.shards.append(reader)
+                self._starts.append(total)
+                total += len(reader)
+        except Exception:
+            self.close()
+            raise
+        self._total = total
+        if self.shards:
+            self.encoding = self.shards[0].encoding
+
+    def __len__(self) -> int:
+        return self._total
+
+    def locate(self, doc_id: int) -> tuple:
+        """(шард, номер документа в шарде) для сквозного номера документа."""
+        doc_id = self._check_id(doc_id)
+        shard = bisect.bisect_right(self._starts, doc_id) - 1
+        return self.shards[shard], doc_id - self._starts[shard]
+
+    def raw(self, doc_id: int) -> memoryview:
+        reader, local_id = self.locate(doc_id)
+        return reader.raw(local_id)
+
+    def ids(self, field: str, value: str) -> List[int]:
+        return [start + i for start, reader in zip(self._starts, self.shards) for i in reader.ids(field, value)]
+
+    def close(self):
+        for reader in self.shards:
+            reader.close()
+
+
+def open_corpus(path: str) -> _BaseCorpusReader:
+    """Читатель корпуса: по манифесту — ShardedCorpusReader, иначе CorpusReader."""
+    if os.path.isdir(path):
+        path = os.path.join(path, "manifest.json")
+    if os.path.basename(path) == "manifest.json":
+        return ShardedCorpusReader(path)
+    return CorpusReader(path)
+
+
+def _aligned(size: int) -> int:
+    return (size + 7) // 8 * 8
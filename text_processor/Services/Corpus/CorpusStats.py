@@ -0,0 +1,416 @@
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+import uuid
+from collections import Counter
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Слова (с дефисами и апострофами внутри); знаки препинания считаются по гистограмме символов
+WORD_PATTERN = re.compile(r"\w+(?:[-'’]\w+)*")
+# Символы, соединяющие части слова в WORD_PATTERN
+_JOINERS = "-'’"
+
+# Первые 0.2 с частые слова считаются по всему тексту (небольшие корпуса — точно)
+SAMPLING_WARMUP = 0.2
+
+# Таджикские буквы и буквы, которые должны заменяться на них при очистке (TAJIK_REPLACEMENTS)
+TAJIK_LETTERS = frozenset("ҷӣҳқӯғҶӢҲҚӮҒ")
+LEGACY_TAJIK_LETTERS = frozenset("љїњќўѓЉЇЊЌЎЃ")
+
+# Языки, для которых проверяется наличие таджикских букв
+TAJIK_LANGUAGES = frozenset({"tg", "tj", "tajik"})
+
+
+class HeavyHitters:
+    """
+    Приближенные частоты самых частых элементов в ограниченной памяти.
+
+    Элементы считаются обычным Counter (подсчет списка выполняется в C);
+    когда различных элементов становится больше 4 * capacity, остаются только
+    capacity самых частых. Выброшенный элемент мог набрать не больше floor
+    вхождений, поэтому оценка count занижена не больше чем на error — сумму
+    floor всех сокращений. Для частых элементов (закон Ципфа) ошибка мала.
+    """
+
+    def __init__(self, capacity: int = 10000, on_prune: Optional[Callable[[Counter], None]] = None):
+        """
+        :param capacity: Сколько элементов сохраняется при сокращении
+        :param on_prune: Вызывается со всеми счетчиками перед сокращением
+        """
+        self.capacity = max(1, capacity)
+        self.on_prune = on_prune
+        self.counts = Counter()
+        self.error = 0
+
+    def update(self, items: Iterable[str]):
+        self.counts.update(items)
+        if len(self.counts) > 4 * self.capacity:
+            self.prune()
+
+    def prune(self):
+        if self.on_prune is not None:
+            self.on_prune(self.counts)
+        largest = heapq.nlargest(self.capacity + 1, self.counts.items(), key=itemgetter(1))
+        self.error += largest[-1][1]
+        self.counts = Counter(dict(largest[:-1]))
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        return self.counts.most_common(k)
+
+
+class HyperLogLog:
+    """
+    Оценка числа различных строк (HyperLogLog, 2^precision регистров;
+    относительная ошибка около 1.04 / sqrt(2^precision)).
+
+    Используется встроенный hash(): оценка верна в пределах одного процесса.
+    """
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def update(self, items: Iterable[str]):
+        precision = self.precision
+        shift = 64 - precision
+        mask = (1 << shift) - 1
+        registers = self.registers
+        for item in items:
+            h = hash(item) & 0xFFFFFFFFFFFFFFFF
+            index = h >> shift
+            rank = shift - (h & mask).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Поправка для малых множеств (linear counting)
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+class CorpusStats:
+    """
+    Статистика корпуса, собираемая по мере записи документов.
+
+    - число документов, слов и символов — всего, на документ (мин./сред./макс.,
+      гистограмма длин по степеням двойки) и по языкам;
+    - гистограмма символов и доли письменностей, число таджикских букв и
+      оставшихся незамененными букв љ, ї, њ, ќ, ў, ѓ — признак сбоя замены
+      при очистке таджикского текста;
+    - самые частые слова и n-граммы слов (HeavyHitters, память ограничена) и
+      приближенный размер словаря (HyperLogLog).
+
+    Счетчики символов и слов точные и считаются в numpy по кодам символов.
+    Частые слова и n-граммы требуют разбора текста в Python, поэтому
+    считаются по выборке фрагментов: фрагмент учитывается, пока время
+    подсчета не превышает time_budget от времени работы (первые 0.2 с —
+    всегда). Оценка частоты — число в выборке, деленное на долю слов выборки.
+
+    Текст, переданный итератором фрагментов (observe), считается по мере
+    того, как фрагменты читает писатель корпуса, и в памяти не собирается.
+    """
+
+    def __init__(self, top_k: int = 100, ngram_sizes: Tuple[int, ...] = (2,),
+                 capacity: int = 20000, lowercase: bool = True, time_budget: float = 0.02):
+        """
+        :param top_k: Сколько самых частых слов и n-грамм попадает в отчет
+        :param ngram_sizes: Длины n-грамм слов
+        :param capacity: Сколько различных слов (и n-грамм каждой длины) хранится после сокращения
+        :param lowercase: Приводить слова к нижнему регистру
+        :param time_budget: Доля времени работы, которую может занимать подсчет частых слов и n-грамм
+        """
+        self.top_k = top_k
+        self.ngram_sizes = tuple(n for n in ngram_sizes if n > 1)
+        self.lowercase = lowercase
+        self.time_budget = time_budget
+        self.documents = 0
+        self.words = 0
+        self.sampled_words = 0
+        self.chars = Counter()
+        self.languages: Dict[str, Dict[str, int]] = {}
+        self.doc_words = {"min": None, "max": 0}
+        self.doc_chars = {"min": None, "max": 0}
+        self.length_histogram = Counter()
+        self.vocabulary = HyperLogLog()
+        # Каждое слово попадает в оценку словаря до того, как может быть выброшено
+        self.top_words = HeavyHitters(capacity, on_prune=self.vocabulary.update)
+        self.top_ngrams = {n: HeavyHitters(capacity) for n in self.ngram_sizes}
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.sampling_seconds = 0.0
+
+    def observe(self, text: Union[str, Iterable[str], None], language: str = "") -> Union[str, Iterator[str]]:
+        """
+        Учитывает документ. Строка учитывается сразу и возвращается как есть;
+        итератор фрагментов оборачивается: фрагменты учитываются по мере чтения,
+        документ завершается, когда итератор исчерпан.
+        """
+        if text is None or isinstance(text, str):
+            document = _DocumentStats(self, language)
+            document.feed(text or "")
+            document.finish()
+            return text
+        return self._observe_chunks(text, language)
+
+    def _observe_chunks(self, chunks: Iterable[str], language: str) -> Iterator[str]:
+        document = _DocumentStats(self, language)
+        for chunk in chunks:
+            document.feed(chunk)
+            yield chunk
+        document.finish()
+
+    def may_sample(self) -> bool:
+        """Подсчет частых слов укладывается в отведенную долю времени."""
+        elapsed = time.perf_counter() - self.started
+        return self.sampling_seconds <= self.time_budget * elapsed + SAMPLING_WARMUP
+
+    def count_codes(self, codes: np.ndarray):
+        """Добавляет символы (коды UTF-32) в гистограмму."""
+        # Подсчет кодов в numpy в десятки раз быстрее Counter(text)
+        values, counts = np.unique(codes, return_counts=True)
+        chars = self.chars
+        for code, count in zip(values.tolist(), counts.tolist()):
+            char = chr(code)
+            chars[char] = chars.get(char, 0) + count
+
+    def _add_document(self, language: str, words: int, chars: int):
+        self.documents += 1
+        self.words += words
+        stats = self.languages.setdefault(language or "unknown", {"documents": 0, "words": 0, "chars": 0})
+        stats["documents"] += 1
+        stats["words"] += words
+        stats["chars"] += chars
+        for extremes, value in ((self.doc_words, words), (self.doc_chars, chars)):
+            extremes["min"] = value if extremes["min"] is None else min(extremes["min"], value)
+            extremes["max"] = max(extremes["max"], value)
+        self.length_histogram[words.bit_length()] += 1
+
+    def _top(self, counter: HeavyHitters, fraction: float) -> Dict:
+        return {
+            # [элемент, число в выборке, оценка для всего корпуса]
+            "items": [[item, count, round(count / fraction) if fraction else count]
+                      for item, count in counter.top(self.top_k)],
+            "max_undercount": counter.error,
+        }
+
+    def report(self) -> Dict:
+        """Отчет в виде словаря (сериализуется в JSON)."""
+        started = time.perf_counter()
+        self.vocabulary.update(self.top_words.counts)
+        total_chars = sum(self.chars.values())
+        scripts = Counter()
+        for char, count in self.chars.items():
+            scripts[_script(char)] += count
+        punctuation = scripts["punctuation"] + scripts["symbol"]
+        tajik = sum(self.chars[c] for c in TAJIK_LETTERS)
+        legacy = sum(self.chars[c] for c in LEGACY_TAJIK_LETTERS)
+
+        warnings = []
+        if legacy:
+            warnings.append(f"{legacy} unreplaced legacy Tajik letters (љ, ї, њ, ќ, ў, ѓ) found")
+        tajik_docs = sum(stats["documents"] for language, stats in self.languages.items()
+                         if language.lower() in TAJIK_LANGUAGES)
+        if tajik_docs and not tajik:
+            warnings.append("Tajik corpus contains no Tajik-specific letters (ҷ, ӣ, ҳ, қ, ӯ, ғ)")
+
+        def per_document(extremes: Dict, total: int) -> Dict:
+            return {"min": extremes["min"] or 0, "max": extremes["max"],
+                    "mean": total / self.documents if self.documents else 0.0}
+
+        fraction = min(1.0, self.sampled_words / self.words) if self.words else 0.0
+        self.seconds += time.perf_counter() - started
+        return {
+            "documents": self.documents,
+            "words": self.words,
+            # Слова и знаки препинания, как в TokenExporter (приближенно: дефисы
+            # и апострофы внутри слов тоже считаются знаками)
+            "tokens": self.words + punctuation,
+            "chars": total_chars,
+            "per_document": {
+                "words": per_document(self.doc_words, self.words),
+                "chars": per_document(self.doc_chars, total_chars),
+                # Число документов с длиной в словах меньше 2^k
+                "words_histogram": {f"<{2 ** k}": self.length_histogram[k]
+                                    for k in sorted(self.length_histogram)},
+            },
+            "languages": self.languages,
+            "sample": {
+                "words": self.sampled_words,
+                "fraction": fraction,
+                # Различных слов в выборке (оценка HyperLogLog)
+                "vocabulary_estimate": self.vocabulary.estimate(),
+            },
+            "top_words": self._top(self.top_words, fraction),
+            "top_ngrams": {str(n): self._top(counter, fraction) for n, counter in self.top_ngrams.items()},
+            "characters": {
+                "scripts": dict(scripts.most_common()),
+                "histogram": dict(self.chars.most_common()),
+            },
+            "checks": {
+                "tajik_letters": tajik,
+                "legacy_tajik_letters": legacy,
+                "warnings": warnings,
+            },
+            "seconds": round(self.seconds, 3),
+        }
+
+    def save(self, path: str) -> Dict:
+        """Сохраняет отчет в JSON (атомарно) и возвращает его."""
+        report = self.report()
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        for warning in report["checks"]["warnings"]:
+            logging.warning(f"Corpus statistics: {warning}")
+        return report
+
+
+class _DocumentStats:
+    """Счетчики одного документа; слова и n-граммы на границе фрагментов не разрываются."""
+
+    def __init__(self, stats: CorpusStats, language: str):
+        self.stats = stats
+        self.language = language
+        self.words = 0
+        self.chars = 0
+        # Два последних символа предыдущих фрагментов: соединитель на границе
+        # фрагментов оценивается по соседям из обоих фрагментов
+        self._tail = np.zeros(0, dtype="<u4")
+        # Входят ли в слово предпоследний (окончательно) и последний (пока
+        # без следующего символа) из них
+        self._tail_word = False
+        self._last_word = False
+        # Незавершенное слово в конце предыдущего фрагмента (для выборки)
+        self._carry = ""
+        # Последние слова предыдущего фрагмента для n-грамм через границу
+        self._history: List[str] = []
+
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        stats = self.stats
+        started = time.perf_counter()
+        codes = np.frombuffer(chunk.encode("utf-32-le", "surrogatepass"), dtype="<u4")
+        stats.count_codes(codes)
+        self.chars += len(codes)
+        context = len(self._tail)
+        if context:
+            codes = np.concatenate((self._tail, codes))
+        is_word = _word_mask(codes)
+        # Окончательно определены все символы, кроме последнего (соединитель
+        # в конце зависит от следующего фрагмента), начиная с последнего
+        # символа предыдущего фрагмента
+        final = is_word[max(0, context - 1):-1]
+        if len(final):
+            previous = self._tail_word if context > 1 else False
+            self.words += int(final[0] and not previous) + int(np.count_nonzero(final[1:] & ~final[:-1]))
+        self._tail = codes[-2:].copy()
+        self._tail_word = bool(is_word[-2]) if len(codes) > 1 else False
+        self._last_word = bool(is_word[-1])
+
+        # В выборку фрагмент попадает до последнего пробельного символа;
+        # фрагмент без пробелов целиком продолжает незавершенное слово
+        cut = max(chunk.rfind(" "), chunk.rfind("\n")) + 1
+        sampled = time.perf_counter()
+        if not cut:
+            self._carry += chunk
+        else:
+            if stats.may_sample():
+                self._sample(self._carry + chunk[:cut])
+            else:
+                self._history = []
+            self._carry = chunk[cut:]
+        if len(self._carry) > 1024:
+            # Длинный отрезок без пробелов не копится
+            self._carry = ""
+        now = time.perf_counter()
+        stats.sampling_seconds += now - sampled
+        stats.seconds += now - started
+
+    def _sample(self, text: str):
+        """Учитывает слова и n-граммы текста в частых элементах."""
+        stats = self.stats
+        if stats.lowercase:
+            text = text.lower()
+        words = WORD_PATTERN.findall(text)
+        if not words:
+            return
+        stats.sampled_words += len(words)
+        stats.top_words.update(words)
+        if stats.ngram_sizes:
+            sequence = self._history + words
+            for n, counter in stats.top_ngrams.items():
+                start = max(0, len(self._history) - n + 1)
+                # zip сдвинутых срезов строит n-граммы без цикла в Python
+                counter.update(map(" ".join, zip(*(sequence[start + i:] for i in range(n)))))
+            self._history = sequence[-(max(stats.ngram_sizes) - 1):]
+
+    def finish(self):
+        started = time.perf_counter()
+        if self._last_word and not self._tail_word:
+            self.words += 1
+        self._tail = self._tail[:0]
+        if self._carry and self.stats.may_sample():
+            self._sample(self._carry)
+        self._carry = ""
+        elapsed = time.perf_counter() - started
+        self.stats.sampling_seconds += elapsed
+        self.stats.seconds += elapsed
+        self.stats._add_document(self.language, self.words, self.chars)
+
+
+# Классы символов BMP: 1 — входит в \w, 2 — соединитель, 0 — прочие
+# (таблица строится при первом использовании)
+_char_classes: Optional[np.ndarray] = None
+
+
+def _word_mask(codes: np.ndarray) -> np.ndarray:
+    """Маска символов, входящих в слова WORD_PATTERN (включая соединители внутри слова)."""
+    global _char_classes
+    if _char_classes is None:
+        classes = np.array([chr(code).isalnum() or code == 0x5F for code in range(0x10000)], dtype=np.uint8)
+        classes[[ord(c) for c in _JOINERS]] = 2
+        # Символы вне BMP (эмодзи и т.п.) словами не считаются
+        classes[0xFFFF] = 0
+        _char_classes = classes
+    classes = _char_classes[np.minimum(codes, 0xFFFF)]
+    is_word = classes == 1
+    if len(codes) > 2:
+        is_word[1:-1] |= (classes[1:-1] == 2) & is_word[:-2] & is_word[2:]
+    return is_word
+
+
+def _script(char: str) -> str:
+    """Письменность или класс символа для гистограммы."""
+    if char.isspace():
+        return "whitespace"
+    if char.isdigit():
+        return "digit"
+    category = unicodedata.category(char)
+    if category.startswith("P"):
+        return "punctuation"
+    if category.startswith("S"):
+        return "symbol"
+    name = unicodedata.name(char, "")
+    for script in ("CYRILLIC", "LATIN", "ARABIC", "GREEK"):
+        if name.startswith(script):
+            return script.lower()
+    return "other"
@@ -0,0 +1,522 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import uuid
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from text_processor.Services.Corpus.CorpusIndex import CorpusIndexBuilder, index_path_for
+
+
+class CorpusWriter:
+    """
+    Базовый потоковый писатель корпуса.
+
+    Документы дописываются в двоичный поток по одному, поэтому в памяти
+    держится только текущий документ. Заголовок формата пишется перед
+    первым документом, завершение — в close().
+
+    Текст документа (поле text_field) может быть не строкой, а итератором
+    фрагментов: тогда документ пишется по частям (begin / write_text / end)
+    и целиком в памяти не собирается.
+
+    С enable_index() писатель запоминает байтовые границы документов (без
+    разделителей формата) для индекса произвольного доступа (CorpusIndex).
+    """
+
+    extension = ""
+    # Обработка символов, не представимых в кодировке
+    errors = "strict"
+    # Поле записи, которое может передаваться потоком фрагментов
+    text_field = "text"
+
+    def __init__(self, stream: BinaryIO, encoding: str = "utf-8"):
+        """
+        :param stream: Двоичный поток для записи (файл, член zip-архива и т.п.)
+        :param encoding: Кодировка текста
+        """
+        self.stream = stream
+        self.encoding = encoding
+        self.documents = 0
+        self.bytes_written = 0
+        self.closed = False
+        self.index: Optional[CorpusIndexBuilder] = None
+        self._marker = f"@@{uuid.uuid4().hex}@@"
+        self._tail = None
+        self._start = 0
+        self._record = None
+
+    def _emit(self, text: str):
+        data = text.encode(self.encoding, self.errors)
+        self.stream.write(data)
+        self.bytes_written += len(data)
+
+    def enable_index(self, fields: Optional[Callable[[Dict], Dict[str, str]]] = None):
+        """
+        Включает сбор индекса смещений документов (см. CorpusIndex).
+
+        :param fields: Поля документа для поиска: запись -> {имя поля: значение}
+        """
+        self.index = CorpusIndexBuilder(fields)
+
+    def save_index(self, path: str):
+        """Сохраняет индекс закрытого корпуса."""
+        self.index.save(path, self.extension, self.encoding, self.bytes_written)
+
+    def write(self, record: Dict):
+        """Дописывает документ в корпус."""
+        text = record.get(self.text_field)
+        if text is None or isinstance(text, str):
+            self._emit(self._separator(first=self.documents == 0))
+            start = self.bytes_written
+            self._emit(self._render_body(record))
+            self._finish_document(start, record)
+        else:
+            _write_streamed(self, record, text)
+
+    def begin(self, record: Dict):
+        """Начинает документ, текст которого будет передан через write_text."""
+        self._emit(self._separator(first=self.documents == 0))
+        self._start = self.bytes_written
+        self._record = record
+        # Документ форматируется с меткой вместо текста и делится по ней
+        document = self._render_body({**record, self.text_field: self._marker})
+        head, self._tail = document.split(self._marker, 1)
+        self._emit(head)
+
+    def write_text(self, chunk: str):
+        """Дописывает фрагмент текста начатого документа."""
+        self._emit(self._escape(chunk))
+
+    def end(self):
+        """Завершает документ, начатый begin."""
+        self._emit(self._tail)
+        self._finish_document(self._start, self._record)
+        self._tail = self._record = None
+
+    def _finish_document(self, start: int, record: Dict):
+        if self.index is not None:
+            self.index.add(start, self.bytes_written, record)
+        self.documents += 1
+
+    def _separator(self, first: bool) -> str:
+        """Заголовок формата или разделитель перед документом."""
+        return ""
+
+    def _render_body(self, record: Dict) -> str:
+        """Документ в виде строки (без разделителя)."""
+        raise NotImplementedError
+
+    def _escape(self, chunk: str) -> str:
+        """Экранирование фрагмента текста по правилам формата."""
+        return chunk
+
+    def _write_end(self):
+        """Завершает формат (закрывающие скобки, теги)."""
+
+    def close(self):
+        """Завершает корпус. Поток не закрывается."""
+        if not self.closed:
+            self._write_end()
+            self.stream.flush()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TxtCorpusWriter(CorpusWriter):
+    """Текстовый корпус: документы форматируются функцией render."""
+
+    extension = "txt"
+
+    def __init__(self, stream: BinaryIO, render: Callable[[Dict], str],
+                 separator: str = "", encoding: str = "utf-8"):
+        """
+        :param render: Форматирование документа в строку
+        :param separator: Разделитель между документами
+        """
+        super().__init__(stream, encoding)
+        self.render = render
+        self.separator = separator
+
+    def _separator(self, first: bool) -> str:
+        return "" if first else self.separator
+
+    def _render_body(self, record: Dict) -> str:
+        return self.render(record)
+
+
+class JsonCorpusWriter(CorpusWriter):
+    """
+    JSON-массив документов. Форматирование совпадает с
+    json.dump(records, f, ensure_ascii=False, indent=indent).
+    """
+
+    extension = "json"
+
+    def __init__(self, stream: BinaryIO, indent: int = 2, encoding: str = "utf-8"):
+        super().__init__(stream, encoding)
+        self.indent = indent
+
+    def _separator(self, first: bool) -> str:
+        return ("[\n" if first else ",\n") + " " * self.indent
+
+    def _render_body(self, record: Dict) -> str:
+        # Строки JSON не содержат переводов строк, поэтому отступ добавляется построчно
+        body = json.dumps(record, ensure_ascii=False, indent=self.indent)
+        return body.replace("\n", "\n" + " " * self.indent)
+
+    def _escape(self, chunk: str) -> str:
+        return json.dumps(chunk, ensure_ascii=False)[1:-1]
+
+    def _write_end(self):
+        self._emit("\n]" if self.documents else "[]")
+
+
+class JsonLinesCorpusWriter(CorpusWriter):
+    """JSON Lines: один документ в строке."""
+
+    extension = "jsonl"
+
+    def _render_body(self, record: Dict) -> str:
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def _escape(self, chunk: str) -> str:
+        return json.dumps(chunk, ensure_ascii=False)[1:-1]
+
+
+class XmlCorpusWriter(CorpusWriter):
+    """
+    XML-корпус. Вывод совпадает с ElementTree.write(..., xml_declaration=True)
+    для корневого элемента root_tag с документами, созданными функцией build.
+    """
+
+    extension = "xml"
+    errors = "xmlcharrefreplace"
+
+    def __init__(self, stream: BinaryIO, root_tag: str, build: Callable[[Dict], ET.Element],
+                 encoding: str = "utf-8"):
+        """
+        :param root_tag: Имя корневого элемента
+        :param build: Создание XML-элемента документа
+        """
+        super().__init__(stream, encoding)
+        self.root_tag = root_tag
+        self.build = build
+
+    def _separator(self, first: bool) -> str:
+        return f"<?xml version='1.0' encoding='{self.encoding}'?>\n<{self.root_tag}>" if first else ""
+
+    def _render_body(self, record: Dict) -> str:
+        return ET.tostring(self.build(record), encoding="unicode")
+
+    def _escape(self, chunk: str) -> str:
+        # Те же замены, что ElementTree делает в тексте элемента
+        return escape(chunk)
+
+    def _write_end(self):
+        if self.documents:
+            self._emit(f"</{self.root_tag}>")
+        else:
+            self._emit(f"<?xml version='1.0' encoding='{self.encoding}'?>\n<{self.root_tag} />")
+
+
+class ZipCorpusWriter:
+    """
+    Пишет несколько форматов корпуса в члены одного zip-архива за один проход
+    по документам, без промежуточных файлов рядом с корпусом.
+
+    Zip-архив допускает запись только одного члена за раз, поэтому первый
+    формат сжимается прямо в архив, а остальные накапливаются в анонимных
+    SpooledTemporaryFile (в памяти до spool_size, затем во временном файле,
+    который удаляется системой даже при аварийном завершении) и копируются
+    в архив при закрытии.
+    """
+
+    def __init__(self,
+                 path: str,
+                 members: List[Tuple[str, Callable[[BinaryIO], CorpusWriter]]],
+                 compresslevel: int = 6,
+                 zip64: bool = True,
+                 spool_size: int = 64 * 1024 * 1024):
+        """
+        :param path: Путь к создаваемому архиву
+        :param members: Пары (имя члена архива, фабрика писателя по двоичному потоку)
+        :param compresslevel: Уровень сжатия deflate 1-9; 0 — без сжатия
+        :param zip64: Разрешить члены архива больше 4 ГБ
+        :param spool_size: Сколько байт формата держать в памяти до сброса во временный файл
+        """
+        self.path = path
+        self.zip64 = zip64
+        if compresslevel:
+            self.zipf = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED,
+                                        compresslevel=compresslevel, allowZip64=zip64)
+        else:
+            self.zipf = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=zip64)
+        self.members = []
+        self.closed = False
+        for index, (arcname, factory) in enumerate(members):
+            if index == 0:
+                stream = self.zipf.open(arcname, "w", force_zip64=zip64)
+            else:
+                stream = tempfile.SpooledTemporaryFile(max_size=spool_size)
+            self.members.append((arcname, stream, factory(stream)))
+
+    @property
+    def documents(self) -> int:
+        return self.members[0][2].documents if self.members else 0
+
+    def write(self, record: Dict):
+        """Дописывает документ во все форматы."""
+        text = record.get(CorpusWriter.text_field)
+        if text is None or isinstance(text, str):
+            for _, _, writer in self.members:
+                writer.write(record)
+        else:
+            _write_streamed(self, record, text)
+
+    def begin(self, record: Dict):
+        for _, _, writer in self.members:
+            writer.begin(record)
+
+    def write_text(self, chunk: str):
+        for _, _, writer in self.members:
+            writer.write_text(chunk)
+
+    def end(self):
+        for _, _, writer in self.members:
+            writer.end()
+
+    def close(self):
+        """Завершает форматы и переносит накопленные члены в архив."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            for index, (arcname, stream, writer) in enumerate(self.members):
+                writer.close()
+                if index == 0:
+                    stream.close()
+                    continue
+                stream.seek(0)
+                with self.zipf.open(arcname, "w", force_zip64=self.zip64) as member:
+                    shutil.copyfileobj(stream, member, 1024 * 1024)
+                stream.close()
+        finally:
+            self.zipf.close()
+
+    def abort(self):
+        """Прерывает запись и удаляет недописанный архив."""
+        if self.closed:
+            return
+        self.closed = True
+        for _, stream, _ in self.members:
+            try:
+                stream.close()
+            except Exception:
+                pass
+        try:
+            self.zipf.close()
+        except Exception:
+            pass
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class _ChecksumStream:
+    """Двоичный поток, считающий размер и SHA-256 записанных данных."""
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.raw.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        self.raw.flush()
+
+
+class ShardedCorpusWriter:
+    """
+    Корпус из нескольких файлов (шардов) и манифеста.
+
+    Новый шард начинается, когда в текущем набралось max_bytes байт или
+    max_documents документов; документ целиком попадает в один шард, поэтому
+    max_bytes — мягкий предел. Каждый шард — самостоятельный файл формата
+    (например, закрытый JSON-массив), так что шарды можно читать независимо
+    в разных процессах или на разных узлах.
+
+    Шарды называются <base_name>-00000.<extension> и лежат в папке directory
+    вместе с манифестом manifest.json: число документов, размер в байтах и
+    SHA-256 каждого шарда (считаются при записи). Манифест пишется при
+    успешном закрытии; корпус без манифеста считается недописанным.
+
+    С index=True у каждого шарда свой индекс смещений <шард>.idx (имя — в
+    поле "index" шарда в манифесте).
+    """
+
+    manifest_name = "manifest.json"
+
+    def __init__(self,
+                 directory: str,
+                 base_name: str,
+                 factory: Callable[[BinaryIO], CorpusWriter],
+                 max_bytes: Optional[int] = None,
+                 max_documents: Optional[int] = None,
+                 index: bool = False,
+                 index_fields: Optional[Callable[[Dict], Dict[str, str]]] = None):
+        """
+        :param directory: Папка шардов и манифеста
+        :param base_name: Базовое имя шардов
+        :param factory: Фабрика писателя формата по двоичному потоку
+        :param max_bytes: Размер шарда в байтах, после которого начинается следующий
+        :param max_documents: Число документов в шарде, после которого начинается следующий
+        :param index: Писать индекс смещений для каждого шарда
+        :param index_fields: Поля документа для поиска по индексу (см. CorpusWriter.enable_index)
+        """
+        self.directory = directory
+        self.base_name = base_name
+        self.factory = factory
+        self.max_bytes = max_bytes
+        self.max_documents = max_documents
+        self.index = index
+        self.index_fields = index_fields
+        self.shards: List[Dict] = []
+        self.documents = 0
+        self.closed = False
+        self.extension = ""
+        self._file = None
+        self._stream: Optional[_ChecksumStream] = None
+        self._writer: Optional[CorpusWriter] = None
+        os.makedirs(directory, exist_ok=True)
+        # Манифест и шарды прежнего корпуса с тем же именем
+        stale = re.compile(rf"{re.escape(base_name)}-\d{{5}}\.\w+(\.idx)?")
+        for name in os.listdir(directory):
+            if name == self.manifest_name or stale.fullmatch(name):
+                os.remove(os.path.join(directory, name))
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, self.manifest_name)
+
+    def _current(self) -> CorpusWriter:
+        if self._writer is None:
+            # Писатель ничего не пишет до первого документа: файл с расширением
+            # формата подключается к потоку после создания писателя
+            self._stream = _ChecksumStream(None)
+            self._writer = self.factory(self._stream)
+            if self.index:
+                self._writer.enable_index(self.index_fields)
+            self.extension = self._writer.extension
+            name = f"{self.base_name}-{len(self.shards):05d}.{self.extension}"
+            self._file = self._stream.raw = open(os.path.join(self.directory, name), "wb")
+        return self._writer
+
+    def _finish_shard(self):
+        """Завершает текущий шард и добавляет его в манифест."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._file.close()
+        shard = {
+            "file": os.path.basename(self._file.name),
+            "documents": self._writer.documents,
+            "bytes": self._stream.size,
+            "sha256": self._stream.sha256.hexdigest(),
+        }
+        if self.index:
+            index_path = index_path_for(self._file.name)
+            self._writer.save_index(index_path)
+            shard["index"] = os.path.basename(index_path)
+        self.shards.append(shard)
+        self._writer = self._stream = self._file = None
+
+    def _roll(self):
+        writer = self._writer
+        if ((self.max_documents and writer.documents >= self.max_documents)
+                or (self.max_bytes and self._stream.size >= self.max_bytes)):
+            self._finish_shard()
+
+    def write(self, record: Dict):
+        """Дописывает документ в текущий шард."""
+        self._current().write(record)
+        self.documents += 1
+        self._roll()
+
+    def begin(self, record: Dict):
+        self._current().begin(record)
+
+    def write_text(self, chunk: str):
+        self._writer.write_text(chunk)
+
+    def end(self):
+        self._writer.end()
+        self.documents += 1
+        self._roll()
+
+    def close(self):
+        """Завершает последний шард и пишет манифест."""
+        if self.closed:
+            return
+        self.closed = True
+        self._finish_shard()
+        manifest = {
+            "format": self.extension,
+            "documents": self.documents,
+            "bytes": sum(shard["bytes"] for shard in self.shards),
+            "checksum": "sha256",
+            "shards": self.shards,
+        }
+        tmp_path = f"{self.manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def abort(self):
+        """Прерывает запись: шарды остаются, манифест не пишется."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _write_streamed(writer, record: Dict, chunks: Iterable[str]):
+    """Пишет документ, текст которого передан итератором фрагментов."""
+    writer.begin(record)
+    for chunk in chunks:
+        if chunk:
+            writer.write_text(chunk)
+    writer.end()
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlsplit, urlunsplit
+
+from lxml import etree
+
+from text_processor.Services.Corpus.BloomFilter import BloomFilter
+
+# Расширения ссылок, которые не ведут на HTML-страницы
+NON_HTML_EXTENSIONS = frozenset({
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".ico", ".bmp", ".tif", ".tiff",
+    ".mp3", ".mp4", ".avi", ".mov", ".wmv", ".webm", ".ogg", ".wav", ".flac",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".odt", ".rtf", ".epub",
+    ".zip", ".rar", ".7z", ".gz", ".tar", ".bz2", ".xz", ".exe", ".dmg", ".apk", ".iso",
+    ".css", ".js", ".json", ".xml", ".rss", ".woff", ".woff2", ".ttf", ".eot",
+})
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    Каноническая форма URL для дедупликации: без фрагмента, схема и хост в
+    нижнем регистре, без порта по умолчанию, пустой путь заменен на «/».
+    None для URL, которые не являются http(s).
+    """
+    url, _ = urldefrag(url.strip())
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if port is not None and port != _DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def site_host(url: str) -> str:
+    """Хост URL без префикса www. (для проверки, что ссылка ведет на тот же сайт)."""
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def is_crawlable(url: str) -> bool:
+    """Ссылка, вероятно, ведет на HTML-страницу (по расширению пути)."""
+    path = urlsplit(url).path.lower()
+    return os.path.splitext(path)[1] not in NON_HTML_EXTENSIONS
+
+
+def page_links(tree, url: str) -> List[str]:
+    """Абсолютные нормализованные ссылки <a href> страницы в порядке появления, без повторов."""
+    base = url
+    base_element = tree.find(".//base[@href]")
+    if base_element is not None:
+        base = urljoin(url, base_element.get("href").strip())
+    links = {}
+    for anchor in tree.iter("a"):
+        href = (anchor.get("href") or "").strip()
+        if not href or href.startswith("#") or href.lower().startswith(("javascript:", "mailto:", "tel:")):
+            continue
+        link = normalize_url(urljoin(base, href))
+        if link is not None:
+            links[link] = None
+    return list(links)
+
+
+def parse_sitemap(data: bytes) -> Tuple[List[str], List[str]]:
+    """
+    Разбирает sitemap (urlset) или индекс sitemap (sitemapindex).
+    Возвращает (адреса страниц, адреса вложенных sitemap).
+    """
+    # Внешние сущности и сеть отключены: sitemap приходит с чужого сервера
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+    root = etree.fromstring(data, parser)
+    if root is None:
+        return [], []
+    pages, sitemaps = [], []
+    is_index = etree.QName(root).localname == "sitemapindex"
+    for element in root.iter("{*}loc"):
+        if element.text and element.text.strip():
+            (sitemaps if is_index else pages).append(element.text.strip())
+    return pages, sitemaps
+
+
+class CrawlFrontier:
+    """
+    Очередь обхода сайта с сохранением на диск.
+
+    Адреса хранятся в SQLite (очередь и уже обработанные страницы), поэтому
+    объем памяти не зависит от размера обхода. Множество уже встреченных
+    адресов — фильтр Блума: повторная ссылка отсекается без обращения к диску;
+    при ложном совпадении (около error_rate) новая страница будет пропущена.
+
+    Записи обработанных страниц дописываются в журнал pages.jsonl (save_page),
+    чтобы корпус продолженного обхода содержал и страницы прерванного запуска.
+
+    Состояние фиксируется вызовом checkpoint(); прерванный обход продолжается
+    с последней контрольной точки: необработанные адреса остаются в очереди,
+    а журнал страниц обрезается до размера, сохраненного в этой точке.
+    """
+
+    def __init__(self, state_dir: str, capacity: int = 1_000_000, error_rate: float = 0.01):
+        """
+        :param state_dir: Папка состояния обхода
+        :param capacity: Ожидаемое число адресов (размер фильтра Блума)
+        :param error_rate: Доля ложных совпадений фильтра при capacity адресах
+        """
+        self.state_dir = state_dir
+        self.capacity = capacity
+        self.error_rate = error_rate
+        os.makedirs(state_dir, exist_ok=True)
+        self._bloom_path = os.path.join(state_dir, "seen.bloom")
+        self._conn = sqlite3.connect(os.path.join(state_dir, "frontier.sqlite3"))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, "
+            "depth INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS urls_pending ON urls (done, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self.seen = self._load_seen()
+        self._pages_path = os.path.join(state_dir, "pages.jsonl")
+        self._pages = self._open_pages()
+
+    def _load_seen(self) -> BloomFilter:
+        """Фильтр из файла; если он не соответствует очереди (сбой между сохранениями), строится заново."""
+        total = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        bloom = BloomFilter.load(self._bloom_path)
+        if bloom is not None and bloom.count == total:
+            return bloom
+        bloom = BloomFilter(max(self.capacity, total), self.error_rate)
+        if total:
+            logging.info(f"Восстановление множества адресов обхода ({total} шт.)")
+            for (url,) in self._conn.execute("SELECT url FROM urls"):
+                bloom.add(url)
+            # Ложные совпадения при восстановлении не должны рассинхронизировать счетчик
+            bloom.count = total
+        return bloom
+
+    def _open_pages(self):
+        """Журнал страниц для дописывания; записи после последней контрольной точки отбрасываются."""
+        size = int(self.get_meta("pages_size") or 0)
+        pages = open(self._pages_path, "r+b" if os.path.exists(self._pages_path) else "w+b")
+        pages.truncate(size)
+        pages.seek(size)
+        return pages
+
+    def close(self):
+        self._pages.close()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def reset(self):
+        """Очищает очередь и множество встреченных адресов."""
+        self._conn.execute("DELETE FROM urls")
+        self._conn.execute("DELETE FROM meta")
+        self._conn.commit()
+        self._pages.truncate(0)
+        self._pages.seek(0)
+        self.seen = BloomFilter(self.capacity, self.error_rate)
+        self.seen.save(self._bloom_path)
+
+    def add(self, url: str, depth: int) -> bool:
+        """Ставит адрес в очередь, если он еще не встречался."""
+        if not self.seen.add(url):
+            return False
+        self._conn.execute("INSERT INTO urls (url, depth) VALUES (?, ?)", (url, depth))
+        return True
+
+    def add_many(self, urls: Iterable[str], depth: int) -> int:
+        """Ставит в очередь новые адреса; возвращает их число."""
+        return sum(self.add(url, depth) for url in urls)
+
+    def next_batch(self, limit: int) -> List[Tuple[int, str, int]]:
+        """Следующие необработанные адреса в порядке постановки: (id, url, глубина)."""
+        return self._conn.execute(
+            "SELECT id, url, depth FROM urls WHERE done = 0 ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+
+    def mark_done(self, ids: Iterable[int]):
+        self._conn.executemany("UPDATE urls SET done = 1 WHERE id = ?", [(i,) for i in ids])
+
+    def pending(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM urls WHERE done = 0").fetchone()[0]
+
+    def done(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM urls WHERE done = 1").fetchone()[0]
+
+    def save_page(self, item: Dict):
+        """Дописывает запись обработанной страницы в журнал (фиксируется checkpoint)."""
+        self._pages.write(json.dumps(item, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def iter_pages(self) -> Iterator[Dict]:
+        """Записи страниц, сохраненные до последней контрольной точки, в порядке обработки."""
+        size = int(self.get_meta("pages_size") or 0)
+        with open(self._pages_path, "rb") as pages:
+            while pages.tell() < size:
+                line = pages.readline()
+                if not line:
+                    break
+                yield json.loads(line)
+
+    def checkpoint(self):
+        """Фиксирует журнал страниц и очередь и сохраняет фильтр Блума."""
+        # Журнал сохраняется на диск раньше очереди: зафиксированная очередь
+        # не ссылается на потерянные страницы
+        self._pages.flush()
+        os.fsync(self._pages.fileno())
+        self.set_meta("pages_size", str(self._pages.tell()))
+        self._conn.commit()
+        self.seen.save(self._bloom_path)
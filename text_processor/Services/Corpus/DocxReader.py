@@ -0,0 +1,112 @@
+import posixpath
+import zipfile
+from typing import Iterator
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+W_BODY = f"{{{W_NS}}}body"
+W_P = f"{{{W_NS}}}p"
+W_R = f"{{{W_NS}}}r"
+W_HYPERLINK = f"{{{W_NS}}}hyperlink"
+W_T = f"{{{W_NS}}}t"
+W_BR = f"{{{W_NS}}}br"
+W_TYPE = f"{{{W_NS}}}type"
+
+# Текстовые эквиваленты элементов внутри w:r (как в python-docx)
+RUN_CHARS = {
+    f"{{{W_NS}}}tab": "\t",
+    f"{{{W_NS}}}ptab": "\t",
+    f"{{{W_NS}}}cr": "\n",
+    f"{{{W_NS}}}noBreakHyphen": "-",
+}
+
+# Элементы тела документа, после которых разобранное дерево очищается
+BODY_BLOCKS = (W_P, f"{{{W_NS}}}tbl", f"{{{W_NS}}}sdt", f"{{{W_NS}}}sectPr")
+
+
+class DocxReader:
+    """
+    Потоковое чтение абзацев DOCX без объектной модели python-docx.
+
+    Основная часть документа (word/document.xml) читается из архива
+    инкрементальным парсером; абзацы выдаются по одному, уже разобранные
+    элементы удаляются из дерева. Текст абзаца совпадает с
+    python-docx Paragraph.text, набор абзацев — с Document.paragraphs
+    (абзацы верхнего уровня тела документа, без таблиц).
+    """
+
+    def __init__(self, file_path: str):
+        """
+        :param file_path: Путь к DOCX файлу
+        """
+        self.file_path = file_path
+        self.zipf = zipfile.ZipFile(file_path)
+        try:
+            self.document_part = self._find_document_part()
+        except Exception:
+            self.zipf.close()
+            raise
+
+    def _find_document_part(self) -> str:
+        """Имя основной части документа по связям пакета."""
+        part = "word/document.xml"
+        try:
+            rels = etree.fromstring(self.zipf.read("_rels/.rels"))
+        except KeyError:
+            rels = None
+        if rels is not None:
+            for rel in rels.iterfind(f"{{{RELS_NS}}}Relationship"):
+                if rel.get("Type") == OFFICE_DOCUMENT_REL and rel.get("TargetMode") != "External":
+                    part = posixpath.normpath(rel.get("Target", part).lstrip("/"))
+                    break
+        # Бросает KeyError, если части нет в архиве
+        self.zipf.getinfo(part)
+        return part
+
+    @staticmethod
+    def _run_text(run) -> str:
+        parts = []
+        for child in run:
+            tag = child.tag
+            if tag == W_T:
+                if child.text:
+                    parts.append(child.text)
+            elif tag == W_BR:
+                # Разрывы страницы и колонки текста не дают
+                if child.get(W_TYPE, "textWrapping") == "textWrapping":
+                    parts.append("\n")
+            else:
+                char = RUN_CHARS.get(tag)
+                if char:
+                    parts.append(char)
+        return "".join(parts)
+
+    def paragraph_text(self, paragraph) -> str:
+        """Текст абзаца w:p: прямые w:r и w:r внутри w:hyperlink."""
+        parts = []
+        for child in paragraph:
+            if child.tag == W_R:
+                parts.append(self._run_text(child))
+            elif child.tag == W_HYPERLINK:
+                parts.extend(self._run_text(run) for run in child.iterchildren(W_R))
+        return "".join(parts)
+
+    def iter_paragraphs(self) -> Iterator[str]:
+        """Выдает текст абзацев верхнего уровня по одному."""
+        with self.zipf, self.zipf.open(self.document_part) as stream:
+            for _, element in etree.iterparse(stream, events=("end",), tag=BODY_BLOCKS,
+                                              huge_tree=True, resolve_entities=False):
+                parent = element.getparent()
+                if parent is None or parent.tag != W_BODY:
+                    # Абзац внутри таблицы или другого блока
+                    continue
+                if element.tag == W_P:
+                    yield self.paragraph_text(element)
+                # Освобождаем уже обработанную часть дерева
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
@@ -0,0 +1,162 @@
+import logging
+import posixpath
+import zipfile
+from typing import Iterator, List
+from urllib.parse import unquote
+
+from lxml import etree
+from lxml import html as lxml_html
+
+CONTAINER_NS = "urn:oasis:names:tc:opendocument:xmlns:container"
+OPF_NS = "http://www.idpf.org/2007/opf"
+OPS_NS = "http://www.idpf.org/2007/ops"
+
+DOCUMENT_MEDIA_TYPES = ("application/xhtml+xml", "text/html")
+
+# Значения epub:type, которыми размечаются сноски и ссылки на них
+FOOTNOTE_TYPES = {"footnote", "footnotes", "endnote", "endnotes", "rearnote", "rearnotes", "noteref"}
+
+# Элементы с атрибутом epub:type: в XHTML он в пространстве имен OPS,
+# без объявления пространства имен — обычный атрибут с префиксом в имени
+EPUB_TYPED = etree.XPath(".//*[@epub:type]", namespaces={"epub": OPS_NS})
+EPUB_TYPED_HTML = etree.XPath(".//*[@*[name() = 'epub:type']]")
+
+# Элементы, до и после которых в тексте ставится перевод строки (в любом пространстве имен)
+BLOCK_TAGS = tuple("{*}" + name for name in (
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption",
+    "figure", "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "ol", "p",
+    "pre", "section", "table", "td", "th", "tr", "ul",
+))
+
+
+class EpubReader:
+    """
+    Потоковое чтение текста EPUB прямо из zip-контейнера.
+
+    Документы читаются в порядке spine из OPF-пакета, каждый разбирается
+    один раз парсером lxml, текст выдается по документу за раз.
+    """
+
+    def __init__(self, file_path: str, ignore_footnotes: bool = True, ignore_links: bool = True):
+        """
+        :param file_path: Путь к EPUB файлу
+        :param ignore_footnotes: Удалять сноски (epub:footnote, epub:type="footnote" и т.п.)
+        :param ignore_links: Удалять ссылки <a href> вместе с текстом
+        """
+        self.file_path = file_path
+        self.ignore_footnotes = ignore_footnotes
+        self.ignore_links = ignore_links
+        self.zipf = zipfile.ZipFile(file_path)
+        try:
+            self.documents = self._read_spine()
+        except Exception:
+            self.zipf.close()
+            raise
+        self._parser = etree.XMLParser(recover=True, resolve_entities=False,
+                                       no_network=True, huge_tree=True)
+
+    def _read_spine(self) -> List[str]:
+        """Пути документов внутри архива в порядке чтения."""
+        container = etree.fromstring(self.zipf.read("META-INF/container.xml"))
+        rootfile = container.find(f".//{{{CONTAINER_NS}}}rootfile")
+        if rootfile is None:
+            raise ValueError("EPUB container has no rootfile")
+        opf_path = rootfile.get("full-path")
+        opf_dir = posixpath.dirname(opf_path)
+        package = etree.fromstring(self.zipf.read(opf_path))
+
+        manifest = {}
+        for item in package.iterfind(f"{{{OPF_NS}}}manifest/{{{OPF_NS}}}item"):
+            if item.get("media-type") in DOCUMENT_MEDIA_TYPES and item.get("href"):
+                path = posixpath.normpath(posixpath.join(opf_dir, unquote(item.get("href"))))
+                manifest[item.get("id")] = path
+
+        names = set(self.zipf.namelist())
+        documents = []
+        for itemref in package.iterfind(f"{{{OPF_NS}}}spine/{{{OPF_NS}}}itemref"):
+            path = manifest.get(itemref.get("idref"))
+            if path is None:
+                continue
+            if path not in names:
+                logging.warning(f"EPUB spine item {path} not found in {self.file_path}")
+                continue
+            documents.append(path)
+        return documents
+
+    def _parse(self, data: bytes):
+        root = None
+        try:
+            root = etree.fromstring(data, self._parser)
+        except etree.XMLSyntaxError:
+            pass
+        if root is None:
+            # Документ не является корректным XHTML
+            root = lxml_html.document_fromstring(data)
+        body = root.find(".//{*}body")
+        return body if body is not None else root
+
+    def _candidates(self, root) -> List:
+        """Элементы, которые могут удаляться вместе с содержимым (см. _is_removed)."""
+        tags = ["{*}script", "{*}style"]
+        if self.ignore_footnotes:
+            tags.append("{*}footnote")
+        if self.ignore_links:
+            tags.append("{*}a")
+        candidates = list(root.iter(*tags))
+        if self.ignore_footnotes:
+            typed = EPUB_TYPED if OPS_NS in root.nsmap.values() else EPUB_TYPED_HTML
+            candidates += typed(root)
+        return candidates
+
+    def _is_removed(self, element) -> bool:
+        name = etree.QName(element).localname
+        if name in ("script", "style"):
+            return True
+        if self.ignore_links and name == "a" and element.get("href") is not None:
+            return True
+        if self.ignore_footnotes:
+            if name == "footnote":
+                return True
+            epub_type = element.get(f"{{{OPS_NS}}}type") or element.get("epub:type") or ""
+            return bool(FOOTNOTE_TYPES.intersection(epub_type.split()))
+        return False
+
+    def document_text(self, data: bytes) -> str:
+        """Текст одного XHTML-документа."""
+        root = self._parse(data)
+        for entity in list(root.iter(etree.Entity)):
+            # Необъявленная HTML-сущность (&nbsp; и т.п.) считается пробелом
+            _drop(entity, " ")
+        for element in self._candidates(root):
+            if self._is_removed(element):
+                _drop(element)
+        for element in root.iter(*BLOCK_TAGS):
+            element.text = "\n" + element.text if element.text else "\n"
+            element.tail = "\n" + element.tail if element.tail else "\n"
+        return "".join(root.itertext())
+
+    def iter_text(self) -> Iterator[str]:
+        """Выдает текст документов по одному; документы разделяются переводом строки."""
+        with self.zipf:
+            for index, path in enumerate(self.documents):
+                if index:
+                    yield "\n"
+                yield self.document_text(self.zipf.read(path))
+
+    def close(self):
+        self.zipf.close()
+
+
+def _drop(element, replacement: str = ""):
+    """Удаляет элемент с содержимым, сохраняя текст после него (tail)."""
+    parent = element.getparent()
+    if parent is None:
+        return
+    tail = replacement + (element.tail or "")
+    if tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + tail
+        else:
+            parent.text = (parent.text or "") + tail
+    parent.remove(element)
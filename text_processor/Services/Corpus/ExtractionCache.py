@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+
+class ExtractionCache:
+    """
+    Дисковый кэш извлеченного и очищенного текста.
+
+    Ключ записи — хэш содержимого файла и параметров очистки, поэтому кэш
+    переиспользуется между загрузками и запусками независимо от имени папки.
+    Тексты хранятся отдельными файлами, индекс (размер и время последнего
+    использования) — в SQLite. При превышении max_size удаляются давно не
+    использованные записи (LRU). Кэш безопасно использовать из нескольких
+    процессов одновременно.
+    """
+
+    # Увеличивается при изменении извлечения или очистки, чтобы не отдавать устаревший текст
+    VERSION = 2
+
+    def __init__(self, cache_dir: str, max_size: int = 2 * 1024 ** 3):
+        """
+        :param cache_dir: Папка кэша
+        :param max_size: Максимальный суммарный размер текстов в байтах
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._index() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        # Лимит мог уменьшиться с прошлого запуска
+        self.evict()
+
+    @contextmanager
+    def _index(self) -> Iterator[sqlite3.Connection]:
+        """Соединение с индексом кэша; изменения фиксируются при выходе."""
+        conn = sqlite3.connect(os.path.join(self.cache_dir, "index.sqlite3"), timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    @staticmethod
+    def file_digest(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """SHA-256 содержимого файла."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def make_key(self, content_digest: str, options: Dict) -> str:
+        """Ключ записи по хэшу содержимого и параметрам обработки."""
+        payload = json.dumps({"v": self.VERSION, "content": content_digest, "options": options},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        """Есть ли запись в кэше (счетчики не меняются)."""
+        return os.path.exists(self._blob_path(key))
+
+    def _touch(self, key: str, size: int):
+        """Обновляет время последнего использования записи."""
+        with self._index() as conn:
+            updated = conn.execute("UPDATE entries SET last_used = ? WHERE key = ?",
+                                   (time.time(), key)).rowcount
+            if not updated:
+                # Текст записан, но индекс не обновлен (например, процесс был прерван)
+                conn.execute("INSERT OR REPLACE INTO entries (key, size, last_used) VALUES (?, ?, ?)",
+                             (key, size, time.time()))
+        self.hits += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """Возвращает текст из кэша или None."""
+        try:
+            with open(self._blob_path(key), "r", encoding="utf-8") as f:
+                size = os.fstat(f.fileno()).st_size
+                text = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self._touch(key, size)
+        return text
+
+    def get_chunks(self, key: str, chunk_size: int = 1024 * 1024) -> Optional[Iterator[str]]:
+        """
+        Возвращает текст из кэша фрагментами по chunk_size символов или None.
+        Файл открывается сразу, читается по мере потребления.
+        """
+        try:
+            f = open(self._blob_path(key), "r", encoding="utf-8")
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self._touch(key, os.fstat(f.fileno()).st_size)
+        return self._read_chunks(f, chunk_size)
+
+    @staticmethod
+    def _read_chunks(f, chunk_size: int) -> Iterator[str]:
+        with f:
+            for chunk in iter(lambda: f.read(chunk_size), ""):
+                yield chunk
+
+    def put(self, key: str, text: str):
+        """Сохраняет текст в кэш и при необходимости вытесняет старые записи."""
+        for _ in self.put_chunks(key, [text]):
+            pass
+
+    def put_chunks(self, key: str, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Пропускает фрагменты текста насквозь, попутно записывая их в кэш.
+        Запись появляется в кэше, только если поток дочитан до конца.
+        """
+        path = self._blob_path(key)
+        # Пишем во временный файл и атомарно переименовываем
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = open(tmp_path, "w", encoding="utf-8")
+        except OSError as e:
+            logging.warning(f"Extraction cache write failed for {key}: {e}")
+            yield from chunks
+            return
+
+        complete = False
+        try:
+            for chunk in chunks:
+                if f is not None:
+                    try:
+                        f.write(chunk)
+                    except OSError as e:
+                        logging.warning(f"Extraction cache write failed for {key}: {e}")
+                        f.close()
+                        f = None
+                yield chunk
+            complete = True
+        finally:
+            if f is not None:
+                f.close()
+            size = None
+            if complete and f is not None:
+                try:
+                    size = os.path.getsize(tmp_path)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logging.warning(f"Extraction cache write failed for {key}: {e}")
+                    size = None
+            if size is None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if size is not None:
+            with self._index() as conn:
+                conn.execute("INSERT OR REPLACE INTO entries (key, size, last_used) VALUES (?, ?, ?)",
+                             (key, size, time.time()))
+            self.evict()
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока размер кэша больше max_size."""
+        with self._index() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_size:
+                return
+            evicted = []
+            for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+                if total <= self.max_size:
+                    break
+                evicted.append(key)
+                total -= size
+            conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+        for key in evicted:
+            try:
+                os.remove(self._blob_path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов и текущий размер кэша."""
+        with self._index() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size": size,
+        }
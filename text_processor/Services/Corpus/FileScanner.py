@@ -0,0 +1,118 @@
+import fnmatch
+import logging
+import os
+import re
+from typing import Iterable, Iterator, List, Optional
+
+
+class FileScanner:
+    """
+    Рекурсивный обход папки на os.scandir.
+
+    Файлы выдаются лениво (обработка начинается до конца обхода), в
+    детерминированном порядке: содержимое каждой папки сортируется по имени,
+    файлы папки выдаются раньше ее подпапок. Размер файла запрашивается,
+    только если заданы ограничения размера.
+
+    Шаблоны include/exclude — glob без учета регистра. Шаблон без "/"
+    сравнивается с именем файла или папки на любой глубине, шаблон с "/" —
+    с путем относительно корня обхода (разделитель "/" на любой ОС; "*"
+    захватывает и вложенные папки). Папка, подходящая под exclude,
+    пропускается целиком, без обхода.
+    """
+
+    def __init__(self,
+                 extensions: Optional[Iterable[str]] = None,
+                 include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None,
+                 min_size: int = 0,
+                 max_size: Optional[int] = None,
+                 recursive: bool = True,
+                 skip_hidden: bool = True,
+                 follow_symlinks: bool = False):
+        """
+        :param extensions: Расширения нужных файлов без учета регистра (None — любые)
+        :param include: Шаблоны нужных файлов (None — все файлы с нужными расширениями)
+        :param exclude: Шаблоны пропускаемых файлов и папок
+        :param min_size: Минимальный размер файла в байтах
+        :param max_size: Максимальный размер файла в байтах (None — без ограничения)
+        :param recursive: Обходить подпапки
+        :param skip_hidden: Пропускать файлы и папки, имя которых начинается с точки
+        :param follow_symlinks: Переходить по символическим ссылкам на папки
+        """
+        self.extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        self.include = _compile(include)
+        self.exclude = _compile(exclude)
+        self.min_size = max(0, min_size or 0)
+        self.max_size = max_size
+        self.recursive = recursive
+        self.skip_hidden = skip_hidden
+        self.follow_symlinks = follow_symlinks
+        # Сколько файлов пропущено из-за размера и ошибок доступа (за последний обход)
+        self.skipped_size = 0
+        self.errors = 0
+
+    def scan(self, root: str) -> Iterator[str]:
+        """Пути подходящих файлов под root."""
+        self.skipped_size = 0
+        self.errors = 0
+        # Стек папок (путь, путь относительно root); порядок обхода — в глубину
+        stack = [(root, "")]
+        while stack:
+            directory, relative = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                self.errors += 1
+                logging.warning(f"Cannot scan {directory}: {e}")
+                continue
+
+            subdirectories = []
+            for entry in entries:
+                name = entry.name
+                if self.skip_hidden and name.startswith("."):
+                    continue
+                entry_relative = f"{relative}/{name}" if relative else name
+                try:
+                    if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                        if self.recursive and not self._matches(self.exclude, name, entry_relative):
+                            subdirectories.append((entry.path, entry_relative))
+                        continue
+                    if not entry.is_file():
+                        continue
+                    if not self._wanted(name, entry_relative):
+                        continue
+                    if self.min_size or self.max_size is not None:
+                        size = entry.stat().st_size
+                        if size < self.min_size or (self.max_size is not None and size > self.max_size):
+                            self.skipped_size += 1
+                            continue
+                except OSError as e:
+                    self.errors += 1
+                    logging.warning(f"Cannot read {entry.path}: {e}")
+                    continue
+                yield entry.path
+            # Подпапки кладутся в стек в обратном порядке, чтобы обходиться по алфавиту
+            stack.extend(reversed(subdirectories))
+
+    def _wanted(self, name: str, relative: str) -> bool:
+        if self.extensions is not None and not name.lower().endswith(self.extensions):
+            return False
+        if self.include and not self._matches(self.include, name, relative):
+            return False
+        return not self._matches(self.exclude, name, relative)
+
+    @staticmethod
+    def _matches(patterns: List, name: str, relative: str) -> bool:
+        return any(pattern.match(relative if by_path else name) for pattern, by_path in patterns)
+
+
+def _compile(patterns: Optional[Iterable[str]]) -> List:
+    """Шаблоны glob в регулярные выражения без учета регистра: [(regex, по пути)]."""
+    compiled = []
+    for pattern in patterns or ():
+        pattern = pattern.strip().replace("\\", "/").strip("/")
+        if pattern:
+            compiled.append((re.compile(fnmatch.translate(pattern), re.IGNORECASE), "/" in pattern))
+    return compiled
@@ -0,0 +1,197 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Mapping, Optional
+
+
+class HttpCache:
+    """
+    Дисковый кэш HTTP-ответов для повторной сборки веб-корпусов.
+
+    Ключ записи — URL. Вместе с телом ответа хранятся ETag, Last-Modified,
+    кодировка и SHA-256 тела. Запись моложе ttl секунд отдается без запроса
+    к серверу, более старая проверяется условным GET (If-None-Match /
+    If-Modified-Since); ответ 304 продлевает запись без повторной загрузки
+    тела. Тела хранятся отдельными файлами, индекс — в SQLite; при
+    превышении max_size удаляются давно не использованные записи (LRU).
+    Кэш безопасно использовать из нескольких потоков и процессов.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = 1024 ** 3, ttl: float = 6 * 3600):
+        """
+        :param cache_dir: Папка кэша
+        :param max_size: Максимальный суммарный размер тел ответов в байтах
+        :param ttl: Сколько секунд после загрузки или проверки запись считается свежей
+                    (0 — проверять всегда)
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.ttl = ttl
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._index() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, encoding TEXT, "
+                "digest TEXT NOT NULL, size INTEGER NOT NULL, "
+                "validated REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        # Лимит мог уменьшиться с прошлого запуска
+        self.evict()
+
+    @contextmanager
+    def _index(self) -> Iterator[sqlite3.Connection]:
+        """Соединение с индексом кэша; изменения фиксируются при выходе."""
+        conn = sqlite3.connect(os.path.join(self.cache_dir, "index.sqlite3"), timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _body_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.body")
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Метаданные записи для URL или None."""
+        with self._index() as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified, encoding, digest, size, validated FROM responses WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, encoding, digest, size, validated = row
+        return {"etag": etag, "last_modified": last_modified, "encoding": encoding,
+                "digest": digest, "size": size, "validated": validated}
+
+    def is_fresh(self, entry: Dict) -> bool:
+        """Можно ли отдать запись без проверки на сервере."""
+        return self.ttl > 0 and time.time() - entry["validated"] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Dict) -> Dict[str, str]:
+        """Заголовки условного GET для проверки записи."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read_body(self, url: str, entry: Dict, revalidated_headers: Optional[Mapping[str, str]] = None
+                  ) -> Optional[bytes]:
+        """
+        Тело записи (None, если файл удален вытеснением). Отмечает попадание:
+        свежее или, если переданы заголовки ответа 304, подтвержденное сервером.
+        """
+        try:
+            with open(self._body_path(url), "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        if hashlib.sha256(body).hexdigest() != entry["digest"]:
+            # Тело перезаписано другим процессом после чтения индекса
+            return None
+
+        now = time.time()
+        with self._index() as conn:
+            if revalidated_headers is None:
+                conn.execute("UPDATE responses SET last_used = ? WHERE url = ?", (now, url))
+            else:
+                # Сервер может прислать новые валидаторы вместе с 304
+                conn.execute(
+                    "UPDATE responses SET etag = COALESCE(?, etag), "
+                    "last_modified = COALESCE(?, last_modified), validated = ?, last_used = ? WHERE url = ?",
+                    (revalidated_headers.get("ETag"), revalidated_headers.get("Last-Modified"), now, now, url)
+                )
+        with self._lock:
+            if revalidated_headers is None:
+                self.fresh_hits += 1
+            else:
+                self.revalidated += 1
+            self.bytes_saved += len(body)
+        return body
+
+    def store(self, url: str, headers: Mapping[str, str], encoding: Optional[str], body: bytes) -> str:
+        """
+        Сохраняет ответ 200 и возвращает SHA-256 тела. Ответы с
+        Cache-Control: no-store не сохраняются.
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            self.misses += 1
+        if "no-store" in headers.get("Cache-Control", "").lower():
+            return digest
+
+        path = self._body_path(url)
+        # Пишем во временный файл и атомарно переименовываем
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"HTTP-кэш: не удалось сохранить {url}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return digest
+
+        now = time.time()
+        with self._index() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, etag, last_modified, encoding, digest, size, validated, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, headers.get("ETag"), headers.get("Last-Modified"), encoding, digest, len(body), now, now)
+            )
+        self.evict()
+        return digest
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока размер кэша больше max_size."""
+        with self._index() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_size:
+                return
+            evicted = []
+            for url, size in conn.execute("SELECT url, size FROM responses ORDER BY last_used"):
+                if total <= self.max_size:
+                    break
+                evicted.append(url)
+                total -= size
+            conn.executemany("DELETE FROM responses WHERE url = ?", [(url,) for url in evicted])
+        for url in evicted:
+            try:
+                os.remove(self._body_path(url))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов, сэкономленные байты и текущий размер кэша."""
+        with self._index() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        hits = self.fresh_hits + self.revalidated
+        lookups = hits + self.misses
+        return {
+            "fresh_hits": self.fresh_hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "entries": entries,
+            "size": size,
+        }
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Слова для шинглов (без учета регистра и пунктуации)
+WORD_PATTERN = re.compile(r"\w+")
+
+# Множитель полиномиального хеша n-граммы слов (нечетный, по модулю 2^64)
+_SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# Сколько шинглов обрабатывается за один шаг MinHash (ограничивает память на длинных книгах)
+_BLOCK_SIZE = 8192
+
+
+def optimal_bands(threshold: float, num_perm: int, false_negative_weight: float = 0.9) -> Tuple[int, int]:
+    """
+    Число полос b и строк в полосе r (b * r <= num_perm), при которых взвешенная
+    сумма вероятностей ложного срабатывания (сходство ниже threshold) и пропуска
+    (сходство выше threshold) минимальна. Пропуски весят больше: ложные
+    кандидаты отсеиваются проверкой сходства сигнатур, а пропущенный дубликат
+    остается в корпусе.
+    """
+    def area(b: int, r: int, low: float, high: float) -> float:
+        # Интеграл вероятности попасть хотя бы в одну общую корзину
+        steps = 200
+        width = (high - low) / steps
+        total = 0.0
+        for i in range(steps):
+            s = low + (i + 0.5) * width
+            total += 1 - (1 - s ** r) ** b
+        return total * width
+
+    best, best_error = (1, num_perm), float("inf")
+    for b in range(1, num_perm + 1):
+        r = num_perm // b
+        false_positive = area(b, r, 0.0, threshold)
+        false_negative = (1 - threshold) - area(b, r, threshold, 1.0)
+        error = (1 - false_negative_weight) * false_positive + false_negative_weight * false_negative
+        if error < best_error:
+            best, best_error = (b, r), error
+    return best
+
+
+class MinHasher:
+    """
+    Потоковое вычисление MinHash-сигнатуры текста по шинглам из shingle_size
+    слов. Текст можно передавать фрагментами с произвольными границами:
+    сигнатура совпадает с сигнатурой склеенного текста.
+    """
+
+    def __init__(self, a: np.ndarray, b: np.ndarray, shingle_size: int):
+        self._a = a[:, None]
+        self._b = b[:, None]
+        self.shingle_size = shingle_size
+        self.signature = np.full(len(a), np.iinfo(np.uint32).max, dtype=np.uint32)
+        self.shingles = 0
+        self._carry: List[int] = []
+        self._pending = ""
+
+    def update(self, text: str):
+        text = self._pending + text
+        words = WORD_PATTERN.findall(text)
+        # Слово на границе фрагмента может продолжиться в следующем
+        self._pending = words.pop() if words and text and WORD_PATTERN.fullmatch(text[-1]) else ""
+        if words:
+            self._add_words([zlib.crc32(word.lower().encode("utf-8")) for word in words])
+
+    def _add_words(self, hashes: List[int]):
+        window = self._carry + hashes
+        k = self.shingle_size
+        self._carry = window[-(k - 1):] if k > 1 else []
+        if len(window) < k:
+            return
+        words = np.array(window, dtype=np.uint64)
+        count = len(words) - k + 1
+        shingles = words[:count].copy()
+        for j in range(1, k):
+            shingles = shingles * _SHINGLE_MULTIPLIER + words[j:j + count]
+        self.shingles += count
+        for start in range(0, count, _BLOCK_SIZE):
+            block = shingles[None, start:start + _BLOCK_SIZE]
+            # Хеширование умножением со сдвигом: старшие 32 бита (a * x + b) mod 2^64
+            values = ((self._a * block + self._b) >> np.uint64(32)).astype(np.uint32)
+            np.minimum(self.signature, values.min(axis=1), out=self.signature)
+
+    def digest(self) -> Optional[np.ndarray]:
+        """Сигнатура или None для текста без слов."""
+        if self._pending:
+            self._add_words([zlib.crc32(self._pending.lower().encode("utf-8"))])
+            self._pending = ""
+        if not self.shingles and self._carry:
+            # Текст короче одного шингла: шингл из всех его слов
+            self.shingle_size, carry, self._carry = len(self._carry), self._carry, []
+            self._add_words(carry)
+        return self.signature if self.shingles else None
+
+
+class NearDuplicateFilter:
+    """
+    Удаление почти повторяющихся документов: шинглы из слов, MinHash-сигнатуры
+    и LSH с разбиением сигнатуры на полосы.
+
+    Документ сравнивается только с документами, у которых совпала хотя бы одна
+    полоса сигнатуры, поэтому время обработки почти линейно по числу
+    документов. Кандидаты проверяются оценкой сходства Жаккара по сигнатурам;
+    документ со сходством не ниже threshold с уже принятым считается дубликатом.
+
+    Сигнатуры и полосы принятых документов хранятся в SQLite (index_path),
+    поэтому следующие запуски отсеивают дубликаты и прежних корпусов. Параметры
+    сигнатур фиксируются при создании индекса. Документ с тем же ключом
+    (например, тот же URL при пересборке корпуса) дубликатом самого себя не
+    считается: его сигнатура обновляется.
+    """
+
+    def __init__(self, index_path: Optional[str] = None, threshold: float = 0.8,
+                 num_perm: int = 128, shingle_size: int = 5, corpus: str = ""):
+        """
+        :param index_path: Файл индекса сигнатур (None — индекс только в памяти)
+        :param threshold: Порог сходства Жаккара для дубликатов (0-1)
+        :param num_perm: Длина MinHash-сигнатуры
+        :param shingle_size: Число слов в шингле
+        :param corpus: Имя текущего корпуса (для отчета о дубликатах из прежних корпусов)
+        """
+        self.threshold = threshold
+        self.corpus = corpus
+        self.checked = 0
+        self.removed = 0
+        # Ключ оставленного документа -> удаленные дубликаты
+        self.clusters: Dict[str, Dict] = {}
+        if index_path:
+            os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self._conn = sqlite3.connect(index_path or ":memory:")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, corpus TEXT, signature BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS docs_key ON docs (key)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER, bucket INTEGER, doc_id INTEGER)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket)")
+
+        stored = self._conn.execute("SELECT value FROM meta WHERE key = 'params'").fetchone()
+        if stored:
+            params = json.loads(stored[0])
+        else:
+            bands, rows = optimal_bands(threshold, num_perm)
+            params = {"num_perm": num_perm, "shingle_size": shingle_size, "bands": bands, "rows": rows,
+                      "seed": int.from_bytes(os.urandom(4), "little")}
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('params', ?)", (json.dumps(params),))
+        self._conn.commit()
+        self.params = params
+        self.num_perm = params["num_perm"]
+        self.shingle_size = params["shingle_size"]
+        self.bands = params["bands"]
+        self.rows = params["rows"]
+        rng = np.random.default_rng(params["seed"])
+        self._a = rng.integers(0, 2 ** 64, size=self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 64, size=self.num_perm, dtype=np.uint64)
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def minhasher(self) -> MinHasher:
+        return MinHasher(self._a, self._b, self.shingle_size)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        hasher = self.minhasher()
+        hasher.update(text)
+        return hasher.digest()
+
+    def _buckets(self, signature: np.ndarray) -> List[Tuple[int, int]]:
+        buckets = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            buckets.append((band, int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(),
+                                                 "little", signed=True)))
+        return buckets
+
+    def check_signature(self, key: str, signature: Optional[np.ndarray]) -> Optional[Tuple[str, str, float]]:
+        """
+        Проверяет документ по сигнатуре. Для дубликата возвращает (ключ
+        оставленного документа, его корпус, сходство); иначе добавляет документ
+        в индекс и возвращает None. Документы без слов не проверяются.
+        """
+        if signature is None:
+            return None
+        self.checked += 1
+        buckets = self._buckets(signature)
+        candidates = set()
+        for band, bucket in buckets:
+            candidates.update(doc_id for (doc_id,) in self._conn.execute(
+                "SELECT doc_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)))
+
+        best = None
+        same_key = []
+        for doc_id in candidates:
+            other_key, other_corpus, blob = self._conn.execute(
+                "SELECT key, corpus, signature FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            if other_key == key:
+                same_key.append(doc_id)
+                continue
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[2]):
+                best = (other_key, other_corpus, similarity)
+
+        if best is not None:
+            self._record_duplicate(key, *best)
+            return best
+
+        # Новая версия документа с тем же ключом заменяет прежнюю
+        for (doc_id,) in self._conn.execute("SELECT id FROM docs WHERE key = ?", (key,)).fetchall():
+            self._conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+            self._conn.execute("DELETE FROM bands WHERE doc_id = ?", (doc_id,))
+        doc_id = self._conn.execute("INSERT INTO docs (key, corpus, signature) VALUES (?, ?, ?)",
+                                    (key, self.corpus, signature.tobytes())).lastrowid
+        self._conn.executemany("INSERT INTO bands (band, bucket, doc_id) VALUES (?, ?, ?)",
+                               [(band, bucket, doc_id) for band, bucket in buckets])
+        return None
+
+    def check(self, key: str, text: str) -> Optional[Tuple[str, str, float]]:
+        """Проверяет документ (см. check_signature)."""
+        return self.check_signature(key, self.signature(text))
+
+    def check_chunks(self, key: str, chunks: Iterable[str]
+                     ) -> Tuple[Optional[Tuple[str, str, float]], Iterator[str]]:
+        """
+        Проверяет документ, переданный фрагментами. Фрагменты копятся во
+        временном файле (в памяти до 16 МБ), пока вычисляется сигнатура;
+        возвращает результат проверки и итератор для повторного чтения текста
+        (пустой для дубликата).
+        """
+        hasher = self.minhasher()
+        spool = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024, mode="w+", encoding="utf-8")
+        try:
+            for chunk in chunks:
+                hasher.update(chunk)
+                spool.write(chunk)
+            duplicate = self.check_signature(key, hasher.digest())
+        except BaseException:
+            spool.close()
+            raise
+        if duplicate is not None:
+            spool.close()
+            return duplicate, iter(())
+        spool.seek(0)
+        return None, self._replay(spool)
+
+    @staticmethod
+    def _replay(spool, chunk_size: int = 1024 * 1024) -> Iterator[str]:
+        with spool:
+            for chunk in iter(lambda: spool.read(chunk_size), ""):
+                yield chunk
+
+    def _record_duplicate(self, key: str, kept_key: str, kept_corpus: str, similarity: float):
+        self.removed += 1
+        cluster = self.clusters.setdefault(kept_key, {"kept": kept_key, "corpus": kept_corpus, "removed": []})
+        cluster["removed"].append({"key": key, "similarity": round(similarity, 3)})
+
+    def report(self) -> Dict:
+        """Сводка и кластеры удаленных дубликатов текущего запуска."""
+        return {
+            "threshold": self.threshold,
+            "params": self.params,
+            "checked": self.checked,
+            "removed": self.removed,
+            "clusters": list(self.clusters.values()),
+        }
+
+    def save_report(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
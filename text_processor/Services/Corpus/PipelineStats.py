@@ -0,0 +1,89 @@
+import logging
+import time
+from typing import Dict, List
+
+
+class StageStats:
+    """Счетчики одной стадии конвейера."""
+
+    def __init__(self, name: str, workers: int = 1):
+        """
+        :param name: Имя стадии
+        :param workers: Параллельность стадии (для расчета загрузки)
+        """
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.chars = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.depth = 0
+        self.max_depth = 0
+        self._depth_sum = 0
+        self._depth_samples = 0
+
+    def add(self, chars: int = 0, seconds: float = 0.0, error: bool = False):
+        """Учитывает обработанный элемент."""
+        self.items += 1
+        self.chars += chars
+        self.busy += seconds
+        if error:
+            self.errors += 1
+
+    def sample_depth(self, depth: int):
+        """Учитывает текущую длину очереди перед стадией."""
+        self.depth = depth
+        self.max_depth = max(self.max_depth, depth)
+        self._depth_sum += depth
+        self._depth_samples += 1
+
+    def as_dict(self, elapsed: float) -> Dict:
+        elapsed = max(elapsed, 1e-9)
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "errors": self.errors,
+            "items_per_sec": self.items / elapsed,
+            "chars_per_sec": self.chars / elapsed,
+            # Доля времени, когда обработчики стадии были заняты (если время измеряется)
+            "utilization": self.busy / (elapsed * self.workers) if self.busy else None,
+            "queue_depth_avg": self._depth_sum / self._depth_samples if self._depth_samples else 0.0,
+            "queue_depth_max": self.max_depth,
+        }
+
+
+class PipelineStats:
+    """
+    Счетчики стадий конвейера: пропускная способность и длина очереди перед
+    каждой стадией. Узкое место — стадия с полной входной очередью и
+    загрузкой около 1; стадии после него простаивают с пустыми очередями.
+    """
+
+    def __init__(self, stages: List[StageStats]):
+        self.stages = {stage.name: stage for stage in stages}
+        self.started = time.monotonic()
+        self.finished = None
+
+    def __getitem__(self, name: str) -> StageStats:
+        return self.stages[name]
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def report(self) -> List[Dict]:
+        elapsed = self.elapsed
+        return [stage.as_dict(elapsed) for stage in self.stages.values()]
+
+    def log(self):
+        for row in self.report():
+            utilization = "-" if row["utilization"] is None else f"{row['utilization']:.0%}"
+            logging.info(
+                f"Стадия {row['stage']}: {row['items']} шт. ({row['errors']} ошибок), "
+                f"{row['items_per_sec']:.1f} шт/с, {row['chars_per_sec'] / 1024:.0f} К символов/с, "
+                f"загрузка {utilization}, очередь средн. {row['queue_depth_avg']:.1f} "
+                f"макс. {row['queue_depth_max']}"
+            )
@@ -0,0 +1,280 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+
+class TaskTimeoutError(Exception):
+    """Задача не уложилась в отведенное время и была прервана."""
+
+
+class OrderedProcessPool:
+    """
+    Пул процессов, который выдает результаты в порядке входных задач.
+
+    - В работе одновременно не больше workers задач, поэтому время задачи
+      отсчитывается практически с момента ее запуска в процессе.
+    - Задача, превысившая task_timeout, завершается вместе с пулом
+      (процессы убиваются), остальные незавершенные задачи перезапускаются
+      в новом пуле.
+    - Если процесс пула аварийно завершился (нехватка памяти, падение
+      библиотеки разбора), ошибку BrokenProcessPool получают все задачи в
+      работе. Пул перезапускается, а эти задачи повторяются по одной:
+      ошибку получает только задача, на которой процесс снова завершился.
+    - Число готовых, но еще не выданных результатов ограничено max_pending,
+      чтобы одна долгая задача не приводила к накоплению результатов в памяти.
+    - Входные элементы читает отдельный поток в очередь на workers элементов:
+      пока чтение ждет (например, следующий загружаемый файл), готовые
+      результаты выдаются, а зависшие задачи прерываются по task_timeout.
+    """
+
+    def __init__(self,
+                 workers: Optional[int] = None,
+                 task_timeout: Optional[float] = None,
+                 initializer: Optional[Callable] = None,
+                 initargs: Tuple = (),
+                 max_pending: Optional[int] = None,
+                 start_method: Optional[str] = None):
+        """
+        :param workers: Число процессов (по умолчанию — число ядер)
+        :param task_timeout: Максимальное время выполнения одной задачи в секундах
+        :param initializer: Функция инициализации процесса
+        :param initargs: Аргументы функции инициализации
+        :param max_pending: Максимум готовых, но не выданных результатов
+        :param start_method: Способ запуска процессов ('fork', 'spawn', 'forkserver';
+                             None — по умолчанию для платформы). Пулу, который
+                             создается не из главного потока (например, в фоновой
+                             задаче сервера), нужен 'spawn' или 'forkserver': fork
+                             копирует процесс вместе с блокировками других потоков
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.task_timeout = task_timeout
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_pending = max_pending or self.workers * 4
+        self.start_method = start_method
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        context = multiprocessing.get_context(self.start_method) if self.start_method else None
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=context,
+                                   initializer=self.initializer,
+                                   initargs=self.initargs)
+
+    @staticmethod
+    def _terminate(executor: ProcessPoolExecutor):
+        """Останавливает пул, не дожидаясь зависших задач."""
+        # ProcessPoolExecutor не умеет прерывать отдельную задачу,
+        # поэтому процессы пула завершаются принудительно
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+
+    def imap(self,
+             func: Callable[[Any], Any],
+             items: Iterable[Any],
+             on_done: Optional[Callable[[Any, Optional[BaseException]], None]] = None
+             ) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+        """
+        Выполняет func для каждого элемента items.
+
+        :param func: Функция уровня модуля (должна сериализоваться pickle)
+        :param items: Входные элементы; читаются лениво (в отдельном потоке, не
+                      больше чем на workers элементов вперед)
+        :param on_done: Вызывается в порядке завершения задач: on_done(item, error)
+        :return: Кортежи (item, result, error) в порядке входных элементов
+        """
+        feed = _Feed(items, self.workers)
+        executor = self._new_executor()
+        inflight = {}  # future -> (index, item, started)
+        ready = {}     # index -> (item, result, error)
+        suspects = []  # (index, item) — задачи, которые были в работе при аварии пула
+        retrying = False
+        next_index = 0
+        submitted = 0
+        exhausted = False
+        completed = False
+
+        def finish(index, item, result, error):
+            ready[index] = (item, result, error)
+            if on_done:
+                on_done(item, error)
+
+        def submit(index, item):
+            try:
+                future = executor.submit(func, item)
+            except BrokenProcessPool as e:
+                # Пул сломался до отправки: задача обрабатывается как аварийная
+                future = Future()
+                future.set_exception(e)
+            inflight[future] = (index, item, time.monotonic())
+
+        def has_capacity():
+            return len(inflight) < self.workers and len(ready) < self.max_pending
+
+        try:
+            while True:
+                if not inflight:
+                    # После аварии задачи повторяются по одной, чтобы найти виновную
+                    retrying = bool(suspects)
+                    if retrying:
+                        submit(*suspects.pop(0))
+                while not retrying and not exhausted and has_capacity():
+                    try:
+                        item = feed.get_nowait()
+                    except queue.Empty:
+                        break
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    submit(submitted, item)
+                    submitted += 1
+
+                while next_index in ready:
+                    yield ready.pop(next_index)
+                    next_index += 1
+
+                if not inflight and not suspects and exhausted:
+                    break
+
+                timeout = None
+                if self.task_timeout and inflight:
+                    oldest = min(started for _, _, started in inflight.values())
+                    timeout = max(0.0, oldest + self.task_timeout - time.monotonic())
+
+                # Ожидание завершения задачи или, если есть свободный процесс, нового элемента
+                waiting = list(inflight)
+                if not retrying and not exhausted and has_capacity():
+                    waiting.append(feed.arrival)
+                done, _ = wait(waiting, timeout=timeout, return_when=FIRST_COMPLETED)
+                crashed = []
+                for future in done:
+                    if future not in inflight:
+                        continue
+                    index, item, _ = inflight.pop(future)
+                    try:
+                        finish(index, item, future.result(), None)
+                    except BrokenProcessPool as e:
+                        crashed.append((index, item, e))
+                    except Exception as e:
+                        finish(index, item, None, e)
+
+                if crashed:
+                    # Остальные задачи в работе тоже получат BrokenProcessPool
+                    # (кроме успевших завершиться): какая из них виновата, неизвестно
+                    for future, (index, item, _) in list(inflight.items()):
+                        if future.done() and not isinstance(future.exception(), BrokenProcessPool):
+                            error = future.exception()
+                            finish(index, item, None if error else future.result(), error)
+                        else:
+                            crashed.append((index, item, None))
+                    inflight.clear()
+                    if len(crashed) == 1:
+                        index, item, error = crashed[0]
+                        finish(index, item, None, error)
+                    else:
+                        suspects.extend((index, item) for index, item, _ in crashed)
+                        suspects.sort(key=lambda task: task[0])
+                        logging.warning(f"Process pool crashed with {len(crashed)} task(s) in progress, "
+                                        f"retrying them one at a time")
+
+                expired = []
+                if self.task_timeout:
+                    now = time.monotonic()
+                    expired = [future for future, (_, _, started) in inflight.items()
+                               if now - started >= self.task_timeout]
+                    for future in expired:
+                        index, item, _ = inflight.pop(future)
+                        finish(index, item, None, TaskTimeoutError(
+                            f"Task exceeded {self.task_timeout} s"))
+
+                if expired or crashed:
+                    # Перезапускаем пул и повторно отправляем незавершенные задачи
+                    restart = sorted(inflight.values(), key=lambda task: task[0])
+                    inflight.clear()
+                    self._terminate(executor)
+                    executor = self._new_executor()
+                    for index, item, _ in restart:
+                        submit(index, item)
+                    if restart:
+                        logging.warning(f"Process pool restarted, resubmitted {len(restart)} task(s)")
+            completed = True
+        finally:
+            feed.close()
+            if completed:
+                executor.shutdown(wait=True)
+            else:
+                # Генератор закрыт досрочно или произошла ошибка
+                self._terminate(executor)
+
+
+class _Feed:
+    """
+    Чтение входных элементов пула в отдельном потоке в ограниченную очередь.
+    arrival — Future, который завершается, когда в очереди появляется элемент
+    (его можно ждать вместе с задачами пула).
+    """
+
+    _END = object()
+
+    def __init__(self, items: Iterable[Any], size: int):
+        self._queue = queue.Queue(maxsize=max(1, size))
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.arrival = Future()
+        self._thread = threading.Thread(target=self._read, args=(iter(items),),
+                                        name="process-pool-feed", daemon=True)
+        self._thread.start()
+
+    def _read(self, items: Iterator[Any]):
+        try:
+            for item in items:
+                if not self._put((item, None)):
+                    return
+            self._put((self._END, None))
+        except BaseException as e:
+            # Ошибка чтения элементов передается потребителю
+            self._put((self._END, e))
+
+    def _put(self, entry) -> bool:
+        while not self._closed.is_set():
+            try:
+                self._queue.put(entry, timeout=0.1)
+            except queue.Full:
+                continue
+            with self._lock:
+                if not self.arrival.done():
+                    self.arrival.set_result(None)
+            return True
+        return False
+
+    def get_nowait(self) -> Any:
+        """
+        Следующий прочитанный элемент.
+
+        :raises queue.Empty: Элемент еще не прочитан
+        :raises StopIteration: Элементы закончились
+        """
+        with self._lock:
+            # Новый arrival до чтения очереди: элемент, добавленный после чтения, завершит его
+            if self.arrival.done():
+                self.arrival = Future()
+        item, error = self._queue.get_nowait()
+        if error is not None:
+            raise error
+        if item is self._END:
+            raise StopIteration
+        return item
+
+    def close(self):
+        """Останавливает чтение (поток завершится после текущего элемента)."""
+        self._closed.set()
@@ -0,0 +1,198 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional
+
+import nltk
+
+OPENING_CHARS = "\"'«“(["
+
+# Заглавные буквы BMP одним классом: кандидаты, за которыми идет строчная
+# буква, отсеиваются самим регулярным выражением, без проверки в цикле.
+# Символы вне BMP пропускаются в цикл, где проверяются через isupper()
+_UPPERCASE_CLASS = "[" + "".join(c for c in map(chr, range(0x10000)) if c.isupper()) + "\U00010000-\U0010ffff]"
+
+# Кандидат на границу предложения: знаки конца предложения, закрывающие
+# кавычки и скобки, пробельные символы, затем (возможно, после открывающей
+# кавычки или скобки) заглавная буква
+SENTENCE_END_PATTERN = re.compile(
+    r"[.!?…]+[\"'»”)\]]*\s+(?=[" + re.escape(OPENING_CHARS) + "]?" + _UPPERCASE_CLASS + ")"
+)
+
+# Сокращения, после которых точка не завершает предложение (однобуквенные —
+# инициалы и «т.е.», «ш.», «с.» — обрабатываются отдельно, см. SINGLE_LETTER_WORDS)
+ABBREVIATIONS = frozenset({
+    # русские
+    "др", "пр", "гг", "вв", "см", "стр", "ул", "руб", "коп", "тыс", "млн", "млрд",
+    "акад", "проф", "доц", "ср", "напр", "им", "род", "обл", "рис", "табл", "гл",
+    # таджикские
+    "ҷ", "тт", "мил", "ҳаз", "сах", "ноҳ",
+    # английские
+    "mr", "mrs", "ms", "dr", "prof", "etc", "vs", "st", "jr", "sr", "inc", "ltd", "no", "fig",
+})
+MAX_ABBREVIATION_LENGTH = max(map(len, ABBREVIATIONS))
+
+# Однобуквенные слова, которые могут стоять в конце предложения
+# (остальные одиночные буквы с точкой считаются инициалами и сокращениями)
+SINGLE_LETTER_WORDS = frozenset({"ӯ", "я"})
+
+# Языки, для которых NLTK поставляет модели Punkt
+PUNKT_LANGUAGES = frozenset({
+    "czech", "danish", "dutch", "english", "estonian", "finnish", "french", "german",
+    "greek", "italian", "malayalam", "norwegian", "polish", "portuguese", "russian",
+    "slovene", "spanish", "swedish", "turkish",
+})
+
+
+def split_sentences_by_rules(text: str, final: bool = True) -> List[str]:
+    """
+    Быстрое разбиение на предложения по правилам (для таджикского, русского
+    и как запасной вариант, если модели Punkt нет).
+
+    Граница — знак конца предложения и пробел, за которыми идет заглавная буква
+    (или открывающая кавычка/скобка); инициалы и известные сокращения границей
+    не считаются.
+
+    :param final: Текст закончен; иначе последняя часть возвращается
+                  незавершенной (граница у самого конца текста не проверяется)
+    """
+    sentences = []
+    start = 0
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        end = match.end()
+        following = text[end + 1] if text[end] in OPENING_CHARS else text[end]
+        if not following.isupper():
+            continue
+        if text[match.start()] == "." and _is_abbreviation(_word_before(text, start, match.start())):
+            continue
+        sentences.append(text[start:match.start()] + match.group())
+        start = end
+    tail = text[start:]
+    if final:
+        sentences.append(tail)
+    sentences = [sentence for sentence in (s.strip() for s in sentences) if sentence]
+    return sentences if final else sentences + [tail]
+
+
+def _word_before(text: str, start: int, end: int) -> str:
+    """
+    Слово, заканчивающееся в позиции end. Сокращения короткие, поэтому
+    слово длиннее MAX_ABBREVIATION_LENGTH обрезается (и сокращением не считается).
+    """
+    begin = end
+    limit = max(start, end - MAX_ABBREVIATION_LENGTH - 1)
+    while begin > limit and (text[begin - 1].isalnum() or text[begin - 1] == "_"):
+        begin -= 1
+    return text[begin:end]
+
+
+def _is_abbreviation(word: str) -> bool:
+    if not word:
+        return False
+    word = word.lower()
+    if len(word) == 1:
+        return word not in SINGLE_LETTER_WORDS
+    return word in ABBREVIATIONS
+
+
+class SentenceSplitter:
+    """
+    Разбиение текста на предложения для вывода «одно предложение в строке».
+
+    Для языков с моделью Punkt используется NLTK, для остальных (в том
+    числе таджикского) — split_sentences_by_rules. Экземпляры кэшируются
+    на процесс (см. get_sentence_splitter), поэтому модель загружается
+    один раз на процесс.
+    """
+
+    def __init__(self, language: str):
+        """
+        :param language: Язык в формате nltk ("russian", "english", "tajik", ...)
+        """
+        self.language = language
+        self.punkt = _load_punkt(language)
+
+    def split(self, text: str) -> List[str]:
+        """Предложения текста."""
+        if self.punkt is None:
+            return split_sentences_by_rules(text)
+        return [sentence for sentence in (s.strip() for s in self.punkt.tokenize(text)) if sentence]
+
+    def split_chunks(self, chunks: Iterable[str], buffer_size: int = 1024 * 1024,
+                     max_sentence_size: Optional[int] = None) -> Iterator[List[str]]:
+        """
+        Разбивает на предложения текст, переданный фрагментами, и выдает
+        завершенные предложения пакетами (по пакету на заполненный буфер).
+        В памяти держится не больше буфера и незавершенного предложения;
+        незавершенное предложение длиннее max_sentence_size (по умолчанию —
+        buffer_size) выдается частью, до последнего перевода строки или
+        пробела перед этой границей.
+        """
+        max_sentence_size = max(1, max_sentence_size or buffer_size)
+        buffer = ""
+        for chunk in chunks:
+            buffer += chunk
+            if len(buffer) < buffer_size:
+                continue
+            if self.punkt is None:
+                *sentences, buffer = split_sentences_by_rules(buffer, final=False)
+            else:
+                # Последнее предложение может продолжиться в следующем фрагменте
+                spans = list(self.punkt.span_tokenize(buffer))
+                sentences = [buffer[start:end] for start, end in spans[:-1]]
+                if spans:
+                    buffer = buffer[spans[-1][0]:]
+            while len(buffer) >= max_sentence_size:
+                cut = _fallback_cut(buffer, max_sentence_size)
+                sentences.append(buffer[:cut])
+                buffer = buffer[cut:]
+            batch = [sentence for sentence in (s.strip() for s in sentences) if sentence]
+            if batch:
+                yield batch
+        batch = self.split(buffer)
+        if batch:
+            yield batch
+
+
+def _fallback_cut(text: str, limit: int) -> int:
+    """Позиция разреза слишком длинного предложения: после последнего перевода строки или пробела до limit."""
+    cut = text.rfind("\n", 0, limit) + 1
+    if not cut:
+        cut = max(text.rfind(" ", 0, limit), text.rfind("\t", 0, limit)) + 1
+    return cut or limit
+
+
+def _find_punkt(language: str):
+    """Установленная модель Punkt (punkt_tab или старый pickle) или None."""
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer
+        return PunktTokenizer(language)
+    except (ImportError, LookupError, OSError, ValueError):
+        pass
+    try:
+        return nltk.data.load(f"tokenizers/punkt/{language}.pickle")
+    except (LookupError, OSError, ValueError):
+        return None
+
+
+def _load_punkt(language: str):
+    """Загружает модель Punkt; None, если для языка ее нет или она недоступна."""
+    if language not in PUNKT_LANGUAGES:
+        return None
+    punkt = _find_punkt(language)
+    if punkt is None:
+        # Одна попытка загрузки на процесс (см. get_sentence_splitter)
+        try:
+            nltk.download("punkt_tab", quiet=True)
+        except Exception as e:
+            logging.warning(f"Sentence splitting: Punkt download failed: {e}")
+        punkt = _find_punkt(language)
+    if punkt is None:
+        logging.warning(f"Sentence splitting: no Punkt model for {language}, using rule-based splitter")
+    return punkt
+
+
+@lru_cache(maxsize=None)
+def get_sentence_splitter(language: str) -> SentenceSplitter:
+    """Разбиватель предложений для языка; создается один раз на процесс."""
+    return SentenceSplitter(language)
@@ -0,0 +1,243 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern, Tuple
+
+# Номера страниц: строка, в которой кроме цифр только пробельные символы.
+# Исходный «^\s*\d+\s*$» захватывает и соседние пустые строки, из-за чего на
+# длинных отрезках пробелов работает квадратично; пробелы вокруг номера все
+# равно схлопываются следующим проходом, поэтому достаточно искать в пределах строки
+PAGE_NUMBER_PATTERN = r"^[^\S\n]*\d+[^\S\n]*$"
+
+# Спецсимволы по умолчанию (сохраняем таджикские буквы)
+BOOK_SPECIAL_CHARS = r"[^\w\s\.,!?;:()«»“”'\"\\/-]"
+
+URL_PATTERN = r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
+WWW_PATTERN = r"www\.[a-zA-Z0-9-]+\.[a-zA-Z]{2,}"
+
+# Сноска в начале документа ("1. ..."); многоточие на этом этапе еще не удалено
+FOOTNOTE_HEAD_PATTERN = r"\d+\.(?!\.)"
+
+# Замена символов љ, ї, њ, ќ, ў, ѓ на ҷ, ӣ, ҳ, қ, ӯ, ғ (строчные и заглавные)
+TAJIK_REPLACEMENTS = {
+    "љ": "ҷ",
+    "ї": "ӣ",
+    "њ": "ҳ",
+    "ќ": "қ",
+    "ў": "ӯ",
+    "ѓ": "ғ",
+    "Љ": "Ҷ",
+    "Ї": "Ӣ",
+    "Њ": "Ҳ",
+    "Ќ": "Қ",
+    "Ў": "Ӯ",
+    "Ѓ": "Ғ",
+}
+
+# Безопасная точка разреза потока: пробельный символ, за которым идет буква
+_SAFE_CUT = re.compile(r"\s(?=[^\W\d])")
+_DIGIT_LINE = re.compile(r"\s*\d+\s*")
+
+
+def _junk_run(special_chars: str) -> str:
+    """
+    Паттерн отрезка из пробельных символов и спецсимволов. Отрезок целиком
+    заменяется одним пробелом, что эквивалентно двум проходам
+    «спецсимволы -> пробел» и «\\s+ -> пробел». Одиночные пробелы между словами
+    (замена самих на себя) пропускаются без создания совпадения.
+    """
+    prefix = r"[^\w\s"
+    if special_chars.startswith(prefix) and special_chars.endswith("]"):
+        rest = special_chars[len(prefix):]
+        # Убираем \s из отрицательного класса: пробелы тоже попадают в отрезок
+        return rf"(?! [\w{rest}){prefix[:-2]}{rest}+"
+    return rf"(?:\s|{special_chars})+"
+
+
+class TextCleaner:
+    """
+    Скомпилированный движок очистки текста.
+
+    Паттерны компилируются один раз на конфигурацию (см. get_book_cleaner и
+    get_web_cleaner) и объединяются в минимальное число проходов так, чтобы
+    результат побайтно совпадал с последовательным применением исходных
+    re.sub по списку паттернов.
+    """
+
+    def __init__(self,
+                 passes: List[Pattern],
+                 footnote_head: Optional[Pattern] = None,
+                 footnote_after: int = 0,
+                 replacements: Optional[Dict[str, str]] = None,
+                 streamable: bool = False):
+        """
+        :param passes: Скомпилированные паттерны; каждое совпадение заменяется пробелом
+        :param footnote_head: Если текст начинается с этого паттерна, весь документ
+                              считается сноской
+        :param footnote_after: После скольких проходов проверяется footnote_head
+        :param replacements: Таблица замены символов
+        :param streamable: Можно ли очищать текст по частям (см. clean_chunks)
+        """
+        self.passes = passes
+        self.footnote_head = footnote_head
+        self.footnote_after = footnote_after
+        self.replacements = replacements
+        self.streamable = streamable
+        self._replace_pattern = (
+            re.compile("[" + "".join(replacements) + "]") if replacements else None
+        )
+
+    def _apply(self, text: str, head: bool = True) -> Optional[str]:
+        """
+        Прогоняет проходы; возвращает None, если документ целиком — сноска.
+
+        :param head: Текст является началом документа (проверяется сноска)
+        """
+        for i, pattern in enumerate(self.passes):
+            if head and i == self.footnote_after and self.footnote_head is not None \
+                    and self.footnote_head.match(text):
+                return None
+            text = pattern.sub(" ", text)
+        if self._replace_pattern is not None:
+            # Один проход по классу символов быстрее, чем str.translate со словарем
+            text = self._replace_pattern.sub(lambda m: self.replacements[m.group()], text)
+        return text
+
+    def clean(self, text: str) -> str:
+        """Очищает текст целиком."""
+        text = self._apply(text)
+        return text.strip() if text else ""
+
+    def clean_chunks(self, chunks: Iterable[str], buffer_size: int = 1 << 20) -> Iterator[str]:
+        """
+        Очищает поток фрагментов текста. Конкатенация результата совпадает с
+        clean("".join(chunks)), но в памяти держится только буфер до ближайшей
+        безопасной точки разреза: пробельного символа перед буквой в строке,
+        которая не может оказаться номером страницы. Ни один проход не
+        находит совпадений через такую точку. Для конфигураций с
+        пользовательскими паттернами текст собирается целиком.
+
+        :param chunks: Фрагменты исходного текста
+        :param buffer_size: Размер буфера (в символах), после которого ищется точка разреза
+        """
+        if not self.streamable:
+            yield self.clean("".join(chunks))
+            return
+
+        chunks = iter(chunks)
+        head = True
+        started = False
+        pending_space = ""
+        buffer = ""
+
+        def emit(piece: str) -> Iterator[str]:
+            # Повторяет strip() всего текста: ведущие пробелы отбрасываются,
+            # хвостовые придерживаются до следующего непустого фрагмента
+            nonlocal started, pending_space
+            if not started:
+                piece = piece.lstrip()
+                if not piece:
+                    return
+                started = True
+            body = piece.rstrip()
+            if body:
+                yield pending_space + body
+                pending_space = piece[len(body):]
+            else:
+                pending_space += piece
+
+        for chunk in chunks:
+            buffer += chunk
+            if len(buffer) < buffer_size:
+                continue
+            cut = self._find_cut(buffer)
+            if cut <= 0:
+                continue
+            cleaned = self._apply(buffer[:cut], head)
+            buffer = buffer[cut:]
+            if cleaned is None:
+                # Весь документ — сноска: дочитываем поток без вывода
+                for _ in chunks:
+                    pass
+                return
+            head = False
+            yield from emit(cleaned)
+
+        cleaned = self._apply(buffer, head)
+        if cleaned is not None:
+            yield from emit(cleaned)
+
+    @staticmethod
+    def _find_cut(buffer: str) -> int:
+        """Позиция последней безопасной точки разреза буфера (0, если ее нет)."""
+        end = len(buffer)
+        while end > 0:
+            start = max(0, end - 4096)
+            last = None
+            for last in _SAFE_CUT.finditer(buffer, start, end):
+                pass
+            if last is None:
+                end = start
+                continue
+            cut = last.end()
+            line_start = buffer.rfind("\n", 0, cut) + 1
+            if not _DIGIT_LINE.fullmatch(buffer, line_start, cut):
+                return cut
+            end = last.start()
+        return 0
+
+
+def _compile(patterns: Iterable[str]) -> List[Pattern]:
+    return [re.compile(pattern, re.MULTILINE) for pattern in patterns]
+
+
+@lru_cache(maxsize=32)
+def get_book_cleaner(ignore_footnotes: bool = True,
+                     ignore_links: bool = True,
+                     custom_patterns: Tuple[str, ...] = ()) -> TextCleaner:
+    """
+    Возвращает движок очистки для BookCorpusProcessor.clean_text.
+
+    Проходы исходной реализации «<.*?>», «\\[\\d+\\]», «\\^...», «^\\s*$» и «\\t+»
+    после схлопывания спецсимволов и пробелов ничего не находят и опущены;
+    три паттерна сносок сводятся к проверке начала документа.
+    """
+    passes = [PAGE_NUMBER_PATTERN, _junk_run(BOOK_SPECIAL_CHARS)]
+    if ignore_links:
+        passes += [r"\.\.+", URL_PATTERN]
+        tail = [WWW_PATTERN]
+    else:
+        tail = [r"\.\.+"]
+    if custom_patterns:
+        passes += tail + list(custom_patterns) + [r"\d+"]
+    else:
+        passes.append("|".join(tail + [r"\d+"]))
+
+    return TextCleaner(
+        passes=_compile(passes),
+        footnote_head=re.compile(FOOTNOTE_HEAD_PATTERN) if ignore_footnotes else None,
+        footnote_after=2,
+        replacements=TAJIK_REPLACEMENTS,
+        streamable=not custom_patterns,
+    )
+
+
+@lru_cache(maxsize=32)
+def get_web_cleaner(special_chars: str,
+                    remove_extra_spaces: bool = True,
+                    normalize_punctuation: bool = True,
+                    custom_patterns: Tuple[str, ...] = ()) -> TextCleaner:
+    """
+    Возвращает движок очистки для WebCorpusProcessor.clean_text
+    (без разбора HTML, который выполняется до вызова движка).
+    """
+    punctuation = [r",,+", r"!!+", r"\?\?+"] if normalize_punctuation else []
+    passes = [PAGE_NUMBER_PATTERN, _junk_run(special_chars)]
+    if remove_extra_spaces:
+        # После схлопывания пробельные символы — только одиночные пробелы,
+        # поэтому повторный \s+ сводится к схлопыванию двойных пробелов
+        passes += [r"\.\.+", "|".join([r"  +"] + punctuation)]
+    else:
+        passes.append("|".join([r"\.\.+"] + punctuation))
+    passes += list(custom_patterns)
+
+    return TextCleaner(passes=_compile(passes))
@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import re
+import uuid
+import xml.etree.ElementTree as ET
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from text_processor.Services.Corpus.CorpusIndex import open_corpus
+from text_processor.Services.Corpus.ProcessPool import OrderedProcessPool
+
+# Слова (с дефисами и апострофами внутри) и отдельные знаки препинания.
+# \w в Python включает кириллицу с таджикскими буквами (ғ, ӣ, қ, ӯ, ҳ, ҷ) и латиницу
+TOKEN_PATTERN = re.compile(r"\w+(?:[-'’]\w+)*|[^\w\s]")
+
+# Служебный токен для слов вне словаря
+UNK_TOKEN = "<unk>"
+UNK_ID = 0
+
+
+def tokenize(text: str, lowercase: bool = True) -> List[str]:
+    """Разбивает текст на токены (слова и знаки препинания)."""
+    if lowercase:
+        text = text.lower()
+    return TOKEN_PATTERN.findall(text)
+
+
+def document_text(document) -> str:
+    """
+    Текст документа, прочитанного CorpusReader, для корпусов книг и
+    веб-страниц: поле text (книги) или content.content (страницы) для
+    json/jsonl, элемент text для xml, текст после заголовка записи для txt.
+    """
+    if isinstance(document, dict):
+        if "text" in document:
+            return document["text"] or ""
+        return (document.get("content") or {}).get("content") or ""
+    if isinstance(document, ET.Element):
+        element = document.find("text")
+        if element is None:
+            element = document.find("content/text")
+        return (element.text or "") if element is not None else ""
+    for marker in ("\n# -----\n", "\nContent:\n"):
+        _, found, body = document.partition(marker)
+        if found:
+            return body
+    return document
+
+
+class TokenExporter:
+    """
+    Экспорт корпуса в массивы номеров токенов для обучения моделей.
+
+    Корпус читается по индексу смещений (CorpusReader), поэтому диапазоны
+    документов токенизируются в нескольких процессах без передачи текста
+    между ними. Словарь строится первым проходом (самые частые токены) или
+    загружается из файла.
+
+    Результат для базового имени base:
+    - base.tokens.u32 — номера токенов всех документов подряд (uint32, little-endian);
+    - base.offsets.u64 — границы документов: документ i занимает токены
+      offsets[i]:offsets[i + 1] (uint64, documents + 1 значение);
+    - base.vocab.json — словарь: список токенов, номер токена — позиция в списке;
+    - base.tokens.json — описание экспорта; пишется последним.
+
+    Массивы без заголовков открываются мгновенно:
+    np.memmap("base.tokens.u32", dtype="<u4", mode="r").
+    """
+
+    def __init__(self,
+                 vocab_size: int = 50000,
+                 min_count: int = 1,
+                 lowercase: bool = True,
+                 workers: Optional[int] = 1,
+                 docs_per_task: int = 256,
+                 vocab_path: Optional[str] = None,
+                 start_method: Optional[str] = None):
+        """
+        :param vocab_size: Максимальный размер словаря вместе с <unk>
+        :param min_count: Минимальная частота токена для попадания в словарь
+        :param lowercase: Приводить текст к нижнему регистру
+        :param workers: Число процессов токенизации (1 — в текущем процессе, 0 или None — по числу ядер)
+        :param docs_per_task: Сколько документов токенизирует одна задача пула
+        :param vocab_path: Готовый словарь (JSON-список токенов); если файла нет,
+                           построенный словарь сохраняется по этому пути
+        :param start_method: Способ запуска процессов пула (см. OrderedProcessPool)
+        """
+        self.vocab_size = max(1, vocab_size)
+        self.min_count = max(1, min_count)
+        self.lowercase = lowercase
+        self.workers = workers
+        self.docs_per_task = max(1, docs_per_task)
+        self.vocab_path = vocab_path
+        self.start_method = start_method
+
+    @staticmethod
+    def paths(output_base: str) -> Dict[str, str]:
+        """Пути файлов экспорта для базового имени."""
+        return {
+            "tokens": f"{output_base}.tokens.u32",
+            "offsets": f"{output_base}.offsets.u64",
+            "vocab": f"{output_base}.vocab.json",
+            "meta": f"{output_base}.tokens.json",
+        }
+
+    @classmethod
+    def load(cls, output_base: str) -> Tuple[np.memmap, np.memmap, List[str]]:
+        """Массивы экспорта, отображенные в память, и словарь: (tokens, offsets, vocab)."""
+        with open(cls.paths(output_base)["meta"], encoding="utf-8") as f:
+            meta = json.load(f)
+        directory = os.path.dirname(output_base)
+        with open(os.path.join(directory, meta["vocab"]), encoding="utf-8") as f:
+            vocab = json.load(f)
+        tokens = _memmap(os.path.join(directory, meta["tokens"]), "<u4")
+        offsets = _memmap(os.path.join(directory, meta["offsets"]), "<u8")
+        return tokens, offsets, vocab
+
+    def _run(self, func, corpus_path: str, vocab: Optional[Dict[str, int]], total: int) -> Iterator:
+        """Результаты func по диапазонам документов в порядке документов."""
+        ranges = ((start, min(start + self.docs_per_task, total))
+                  for start in range(0, total, self.docs_per_task))
+        config = (corpus_path, self.lowercase, vocab)
+        if self.workers == 1:
+            _init_token_worker(*config)
+            try:
+                for task in ranges:
+                    yield func(task)
+            finally:
+                _close_token_worker()
+            return
+        pool = OrderedProcessPool(workers=self.workers, initializer=_init_token_worker, initargs=config,
+                                  start_method=self.start_method)
+        for task, result, error in pool.imap(func, ranges):
+            if error is not None:
+                raise RuntimeError(f"Tokenization of documents {task[0]}-{task[1] - 1} failed: {error}")
+            yield result
+
+    def build_vocab(self, corpus_path: str, total: int) -> List[str]:
+        """Словарь по частоте токенов в корпусе: <unk>, затем самые частые токены."""
+        counts = Counter()
+        for partial_counts in self._run(_count_range, corpus_path, None, total):
+            counts.update(partial_counts)
+        frequent = sorted((item for item in counts.items() if item[1] >= self.min_count),
+                          key=lambda item: (-item[1], item[0]))
+        return [UNK_TOKEN] + [token for token, _ in frequent[:self.vocab_size - 1]]
+
+    def export(self, corpus_path: str, output_base: str) -> Dict:
+        """
+        Токенизирует корпус с индексом (файл корпуса или манифест шардов).
+        Токенизация не зависит от языка (см. TOKEN_PATTERN).
+
+        :param corpus_path: Путь к корпусу
+        :param output_base: Базовое имя файлов экспорта
+        :return: Описание экспорта (содержимое base.tokens.json)
+        """
+        paths = self.paths(output_base)
+        with open_corpus(corpus_path) as reader:
+            total = len(reader)
+
+        if self.vocab_path and os.path.exists(self.vocab_path):
+            with open(self.vocab_path, encoding="utf-8") as f:
+                vocab = json.load(f)
+        else:
+            vocab = self.build_vocab(corpus_path, total)
+            if self.vocab_path:
+                _write_json(self.vocab_path, vocab)
+        if len(vocab) > 2 ** 32:
+            raise ValueError("Vocabulary does not fit uint32 token ids")
+        if os.path.abspath(self.vocab_path or "") != os.path.abspath(paths["vocab"]):
+            _write_json(paths["vocab"], vocab)
+
+        # Описание прежнего экспорта удаляется первым: без него экспорт считается недописанным
+        if os.path.exists(paths["meta"]):
+            os.remove(paths["meta"])
+        offsets = array("Q", [0])
+        unknown = 0
+        with open(paths["tokens"], "wb") as tokens_file:
+            for ids in self._run(_encode_range, corpus_path, {token: i for i, token in enumerate(vocab)}, total):
+                for doc_ids in ids:
+                    doc_ids.tofile(tokens_file)
+                    offsets.append(offsets[-1] + len(doc_ids))
+                    unknown += int(np.count_nonzero(doc_ids == UNK_ID))
+        with open(paths["offsets"], "wb") as offsets_file:
+            offsets.tofile(offsets_file)
+
+        meta = {
+            "corpus": os.path.basename(corpus_path),
+            "documents": total,
+            "tokens": os.path.basename(paths["tokens"]),
+            "offsets": os.path.basename(paths["offsets"]),
+            "vocab": os.path.basename(paths["vocab"]),
+            "dtype": "<u4",
+            "offsets_dtype": "<u8",
+            "token_count": offsets[-1],
+            "vocab_size": len(vocab),
+            "unk_id": UNK_ID,
+            "unknown_tokens": unknown,
+            "lowercase": self.lowercase,
+            "pattern": TOKEN_PATTERN.pattern,
+        }
+        _write_json(paths["meta"], meta)
+        logging.info(f"Exported {offsets[-1]} tokens of {total} documents "
+                     f"(vocabulary {len(vocab)}, unknown {unknown}) to {paths['tokens']}")
+        return meta
+
+
+# Читатель корпуса и параметры токенизации в рабочем процессе (см. TokenExporter._run)
+_worker_state: Dict = {}
+
+
+def _init_token_worker(corpus_path: str, lowercase: bool, vocab: Optional[Dict[str, int]]):
+    """Открывает корпус один раз на рабочий процесс."""
+    _worker_state.update(reader=open_corpus(corpus_path), lowercase=lowercase, vocab=vocab)
+
+
+def _close_token_worker():
+    reader = _worker_state.pop("reader", None)
+    if reader is not None:
+        reader.close()
+    _worker_state.clear()
+
+
+def _iter_tokens(task: Tuple[int, int]) -> Iterator[List[str]]:
+    reader = _worker_state["reader"]
+    for doc_id in range(*task):
+        yield tokenize(document_text(reader.document(doc_id)), _worker_state["lowercase"])
+
+
+def _count_range(task: Tuple[int, int]) -> Counter:
+    """Частоты токенов в документах [start, stop)."""
+    counts = Counter()
+    for tokens in _iter_tokens(task):
+        counts.update(tokens)
+    return counts
+
+
+def _encode_range(task: Tuple[int, int]) -> List[np.ndarray]:
+    """Номера токенов каждого документа [start, stop)."""
+    vocab = _worker_state["vocab"]
+    return [np.fromiter((vocab.get(token, UNK_ID) for token in tokens), dtype="<u4", count=len(tokens))
+            for tokens in _iter_tokens(task)]
+
+
+def _memmap(path: str, dtype: str) -> np.ndarray:
+    # np.memmap не отображает пустые файлы
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def _write_json(path: str, data):
+    """Пишет JSON атомарно."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
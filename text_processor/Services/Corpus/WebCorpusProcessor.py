@@ -1,19 +1,48 @@
+import gzip
+import hashlib
 import io
 import os
 import re
+import time
 import logging
-from typing import List, Dict, Optional, Union
+from itertools import chain
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple, Union
+from functools import partial
 import json
 import requests
 from bs4 import BeautifulSoup
 from trafilatura import extract
+from trafilatura.utils import load_html
 import xml.etree.ElementTree as ET
-import zipfile
 from pathlib import Path
+from text_processor.Services.Corpus.TextCleaner import get_web_cleaner
+from text_processor.Services.Corpus.CrawlFrontier import (
+    CrawlFrontier, is_crawlable, normalize_url, page_links, parse_sitemap, site_host
+)
+from text_processor.Services.Corpus.ExtractionCache import ExtractionCache
+from text_processor.Services.Corpus.HttpCache import HttpCache
+from text_processor.Services.Corpus.NearDuplicateFilter import NearDuplicateFilter
+from text_processor.Services.Corpus.PipelineStats import PipelineStats, StageStats
+from text_processor.Services.Corpus.ProcessPool import OrderedProcessPool, TaskTimeoutError
+from text_processor.Services.Corpus.WebFetcher import WebFetcher
+from text_processor.Services.Corpus.TokenExporter import TokenExporter
+from text_processor.Services.Corpus.CorpusIndex import index_path_for
+from text_processor.Services.Corpus.CorpusStats import CorpusStats
+from text_processor.Services.Corpus.CorpusWriters import (
+    CorpusWriter, TxtCorpusWriter, JsonCorpusWriter, JsonLinesCorpusWriter, XmlCorpusWriter,
+    ZipCorpusWriter, ShardedCorpusWriter
+)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# Имена meta-тегов с автором страницы (в порядке приоритета)
+AUTHOR_META_NAMES = ('author', 'dc.creator', 'dcterms.creator')
+
+# Глубина вложенности индексов sitemap и максимальный размер одного sitemap (по протоколу — 50 МБ)
+MAX_SITEMAP_DEPTH = 3
+MAX_SITEMAP_SIZE = 50 * 1024 * 1024
+
 class WebCorpusProcessor:
     def __init__(
         self,
@@ -24,8 +53,97 @@ class WebCorpusProcessor:
         clean_html: bool = True,
         remove_extra_spaces: bool = True,
         normalize_punctuation: bool = True,
-        rootPath:str=''
+        rootPath:str='',
+        zip_compresslevel: int = 6,
+        fetch_concurrency: int = 1,
+        per_host_limit: int = 4,
+        fetch_timeout: float = 10.0,
+        fetch_retries: int = 2,
+        max_body_size: int = 10 * 1024 * 1024,
+        fetch_queue_size: int = 64,
+        extract_workers: int = 1,
+        extract_timeout: Optional[float] = None,
+        start_method: Optional[str] = None,
+        write_queue_size: Optional[int] = None,
+        html_backend: str = 'lxml',
+        cache_dir: Optional[str] = None,
+        cache_max_size: int = 2 * 1024 ** 3,
+        cache_ttl: float = 6 * 3600,
+        crawl_max_depth: int = 2,
+        crawl_max_pages: int = 1000,
+        crawl_state_dir: Optional[str] = None,
+        crawl_batch_size: int = 500,
+        crawl_seen_capacity: int = 1_000_000,
+        collect_links: bool = False,
+        dedup_threshold: Optional[float] = None,
+        dedup_index_path: Optional[str] = None,
+        shard_max_bytes: Optional[int] = None,
+        shard_max_documents: Optional[int] = None,
+        write_index: bool = True,
+        export_tokens: bool = False,
+        token_vocab_size: int = 50000,
+        token_vocab_path: Optional[str] = None,
+        collect_stats: bool = True,
+        stats_top_k: int = 100
     ):
+        """
+        :param fetch_concurrency: Максимум одновременных загрузок страниц
+                                  (1 — последовательная загрузка без повторов)
+        :param per_host_limit: Максимум одновременных загрузок с одного хоста
+        :param fetch_timeout: Таймаут соединения и чтения в секундах
+        :param fetch_retries: Число повторов после сетевой ошибки или ответа 429/5xx
+                              (при обработке конвейером)
+        :param max_body_size: Максимальный размер страницы в байтах (при обработке конвейером)
+        :param fetch_queue_size: Сколько загруженных страниц может ждать извлечения;
+                                 при заполнении загрузка приостанавливается
+        :param extract_workers: Число процессов для извлечения текста (1 — в текущем
+                                процессе, 0 или None — по числу ядер)
+        :param extract_timeout: Максимальное время извлечения одной страницы в секундах
+                                (только при extract_workers != 1)
+        :param start_method: Способ запуска процессов извлечения (см. OrderedProcessPool)
+        :param write_queue_size: Сколько извлеченных страниц может ждать записи
+                                 (по умолчанию — 4 на процесс извлечения)
+        :param html_backend: 'lxml' — страница разбирается один раз, дерево lxml
+                             используется и trafilatura, и для заголовка и автора;
+                             'bs4' — прежний путь (trafilatura + BeautifulSoup)
+        :param cache_dir: Папка кэша HTTP-ответов и извлеченных записей (None — без кэша)
+        :param cache_max_size: Максимальный размер каждого из двух кэшей в байтах
+        :param cache_ttl: Сколько секунд ответ из кэша используется без проверки на
+                          сервере; более старые проверяются условным GET (ETag, Last-Modified)
+        :param crawl_max_depth: Глубина обхода по ссылкам от начальных страниц (источники 'crawl')
+        :param crawl_max_pages: Максимум страниц за весь обход, включая прерванные запуски
+        :param crawl_state_dir: Папка состояния обхода для продолжения после прерывания
+                                (по умолчанию <rootPath>/<output_base>.crawl)
+        :param crawl_batch_size: Сколько страниц очереди обхода обрабатывается между
+                                 контрольными точками
+        :param crawl_seen_capacity: Ожидаемое число адресов обхода (размер фильтра Блума)
+        :param collect_links: Добавлять в запись ссылки страницы (ключ "links"); включается
+                              при обходе
+        :param dedup_threshold: Порог сходства (0-1), начиная с которого страница считается
+                                почти дубликатом уже записанной и не попадает в корпус
+                                (None — без удаления дубликатов)
+        :param dedup_index_path: Файл индекса сигнатур для удаления дубликатов и среди
+                                 прежних корпусов (None — только внутри корпуса)
+        :param shard_max_bytes: Писать корпус шардами: новый файл после стольких байт
+        :param shard_max_documents: Писать корпус шардами: новый файл после стольких страниц
+                                    (шарды и manifest.json — в папке <rootPath>/<output_base>;
+                                    для формата 'zip' не применяется)
+        :param write_index: Писать рядом с корпусом индекс смещений <корпус>.idx для
+                            произвольного доступа по номеру, заголовку и автору
+                            (см. CorpusIndex.CorpusReader; для формата 'zip' не пишется)
+        :param export_tokens: После записи корпуса экспортировать номера токенов в
+                              <output_base>.tokens.u32 и границы страниц в <output_base>.offsets.u64
+                              (см. TokenExporter; нужен индекс корпуса)
+        :param token_vocab_size: Размер словаря экспорта токенов
+        :param token_vocab_path: Готовый словарь экспорта токенов (если файла нет,
+                                 построенный словарь сохраняется по этому пути)
+        :param collect_stats: Собирать статистику корпуса при записи и сохранять ее в
+                              <output_base>.stats.json (см. CorpusStats)
+        :param stats_top_k: Сколько самых частых слов и биграмм попадает в статистику
+
+        При fetch_concurrency > 1, extract_workers != 1 или с кэшем страницы
+        обрабатываются конвейером: загрузка -> извлечение -> запись (см. iter_web_items).
+        """
         self.output_base = output_base
         self.output_format = output_format.lower()
         self.language = language.lower()
@@ -35,6 +153,44 @@ class WebCorpusProcessor:
         self.normalize_punctuation = normalize_punctuation
         self.processed_items: List[Dict] = []
         self.rootPath=rootPath
+        self.zip_compresslevel = zip_compresslevel
+        self.fetch_concurrency = fetch_concurrency
+        self.per_host_limit = per_host_limit
+        self.fetch_timeout = fetch_timeout
+        self.fetch_retries = fetch_retries
+        self.max_body_size = max_body_size
+        self.fetch_queue_size = fetch_queue_size
+        self.extract_workers = extract_workers
+        self.extract_timeout = extract_timeout
+        self.start_method = start_method
+        self.write_queue_size = write_queue_size
+        self.html_backend = html_backend.lower()
+        self.cache_dir = cache_dir
+        self.http_cache = (HttpCache(os.path.join(cache_dir, 'http'), cache_max_size, cache_ttl)
+                           if cache_dir else None)
+        self.extraction_cache = (ExtractionCache(os.path.join(cache_dir, 'extractions'), cache_max_size)
+                                 if cache_dir else None)
+        self.crawl_max_depth = crawl_max_depth
+        self.crawl_max_pages = crawl_max_pages
+        self.crawl_state_dir = crawl_state_dir
+        self.crawl_batch_size = max(1, crawl_batch_size)
+        self.crawl_seen_capacity = crawl_seen_capacity
+        self.collect_links = collect_links
+        self.dedup_threshold = dedup_threshold
+        self.dedup_index_path = dedup_index_path
+        self.dedup_report: Optional[Dict] = None
+        self.shard_max_bytes = shard_max_bytes
+        self.shard_max_documents = shard_max_documents
+        self.write_index = write_index
+        self.export_tokens = export_tokens
+        self.token_vocab_size = token_vocab_size
+        self.token_vocab_path = token_vocab_path
+        self.token_export: Optional[Dict] = None
+        self.collect_stats = collect_stats
+        self.stats_top_k = stats_top_k
+        self.stats_report: Optional[Dict] = None
+        self.pipeline_stats: Optional[PipelineStats] = None
+        self.processed_count = 0
 
         self.language_patterns = {
             'ru': {
@@ -48,39 +204,22 @@ class WebCorpusProcessor:
         }
 
     def clean_text(self, text: str, custom_patterns: Optional[List[str]] = None) -> str:
-        if self.clean_html:
+        # Без «<» и «&» в тексте нет ни тегов, ни сущностей: разбор HTML меняет
+        # в нем только пробельные символы, которые очистка все равно схлопывает
+        if self.clean_html and ("<" in text or "&" in text):
             soup = BeautifulSoup(text, 'html.parser')
             text = soup.get_text(separator=" ")
 
         lang_patterns = self.language_patterns.get(self.language, self.language_patterns['en'])
 
-        patterns = [
-            r"^\s*\d+\s*$",
+        # Паттерны компилируются один раз на конфигурацию (см. TextCleaner)
+        cleaner = get_web_cleaner(
             lang_patterns['special_chars'],
-            r"\s+",
-            r"^\s*$",
-            r"\t+",
-            r"\.{2,}",
-        ]
-
-        if self.remove_extra_spaces:
-            patterns.append(r"\s+")
-
-        if self.normalize_punctuation:
-            patterns.extend([
-                r"\.{2,}",
-                r",{2,}",
-                r"!{2,}",
-                r"\?{2,}",
-            ])
-
-        if custom_patterns:
-            patterns.extend(custom_patterns)
-
-        for pattern in patterns:
-            text = re.sub(pattern, " ", text, flags=re.MULTILINE)
-
-        return text.strip()
+            self.remove_extra_spaces,
+            self.normalize_punctuation,
+            tuple(custom_patterns or ())
+        )
+        return cleaner.clean(text)
 
     def clean_content(self, data: Dict) -> Dict:
         cleaned_data = {
@@ -92,134 +231,590 @@ class WebCorpusProcessor:
 
     def extract_web_content(self, url: str) -> Dict:
         try:
-            response = requests.get(url, timeout=10)
+            response = requests.get(url, timeout=self.fetch_timeout)
             response.raise_for_status()
+            return self.parse_web_content(url, response.text)
+        except Exception as e:
+            return self._error_content(url, e)
 
-            # Используем trafilatura для извлечения основного текста
-            main_content = extract(response.text) or ""
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            title = soup.title.string.strip() if soup.title else "No Title"
-
-            author = "Unknown Author"
-            for meta_name in ['author', 'dc.creator', 'dcterms.creator']:
-                author_tag = soup.find("meta", attrs={"name": meta_name})
-                if author_tag and "content" in author_tag.attrs:
-                    author = author_tag["content"].strip()
-                    break
-
-            raw_data = {
-                "title": title,
-                "author": author,
-                "content": main_content,
-                "url": url,
-                "language": self.language
-            }
+    def parse_web_content(self, url: str, html: str) -> Dict:
+        """Извлекает и очищает заголовок, автора и основной текст загруженной страницы."""
+        tree = load_html(html) if self.html_backend == 'lxml' else None
+        if tree is not None:
+            title, author, main_content = self._parse_tree(tree)
+        else:
+            # Прежний путь; также для документов, которые trafilatura не считает HTML
+            title, author, main_content = self._parse_soup(html)
 
-            return self.clean_content(raw_data)
-        except Exception as e:
-            logging.error(f"Ошибка при извлечении контента из {url}: {e}")
-            return {
-                "title": "Error",
-                "author": "Unknown",
-                "content": "",
-                "url": url,
-                "language": self.language
-            }
+        raw_data = {
+            "title": title,
+            "author": author,
+            "content": main_content,
+            "url": url,
+            "language": self.language
+        }
+
+        cleaned_data = self.clean_content(raw_data)
+        if self.collect_links:
+            link_tree = tree if tree is not None else load_html(html)
+            cleaned_data["links"] = page_links(link_tree, url) if link_tree is not None else []
+        return cleaned_data
+
+    def _parse_tree(self, tree) -> Tuple[str, str, str]:
+        """Заголовок, автор и основной текст из одного дерева lxml (trafilatura.load_html)."""
+        # Метаданные читаются до extract: дерево не должно измениться
+        title_element = tree.find(".//title")
+        title = _element_string(title_element).strip() if title_element is not None else "No Title"
+
+        # Первый meta с каждым именем, как soup.find("meta", attrs={"name": ...})
+        metas = {}
+        for meta in tree.iter("meta"):
+            name = meta.get("name")
+            if name in AUTHOR_META_NAMES and name not in metas:
+                metas[name] = meta
+        author = "Unknown Author"
+        for meta_name in AUTHOR_META_NAMES:
+            author_tag = metas.get(meta_name)
+            if author_tag is not None and "content" in author_tag.attrib:
+                author = author_tag.get("content").strip()
+                break
+
+        # Используем trafilatura для извлечения основного текста (без повторного разбора)
+        main_content = extract(tree) or ""
+        return title, author, main_content
+
+    def _parse_soup(self, html: str) -> Tuple[str, str, str]:
+        """Заголовок, автор и основной текст: trafilatura и отдельный разбор BeautifulSoup."""
+        # Используем trafilatura для извлечения основного текста
+        main_content = extract(html) or ""
+
+        soup = BeautifulSoup(html, 'html.parser')
+        title = soup.title.string.strip() if soup.title else "No Title"
+
+        author = "Unknown Author"
+        for meta_name in AUTHOR_META_NAMES:
+            author_tag = soup.find("meta", attrs={"name": meta_name})
+            if author_tag and "content" in author_tag.attrs:
+                author = author_tag["content"].strip()
+                break
+        return title, author, main_content
+
+    def _error_content(self, url: str, error: Exception) -> Dict:
+        logging.error(f"Ошибка при извлечении контента из {url}: {error}")
+        return {
+            "title": "Error",
+            "author": "Unknown",
+            "content": "",
+            "url": url,
+            "language": self.language
+        }
+
+    def _worker_config(self) -> Dict:
+        """Параметры для создания копии процессора в рабочем процессе."""
+        return {
+            "language": self.language,
+            "encoding": self.encoding,
+            "clean_html": self.clean_html,
+            "remove_extra_spaces": self.remove_extra_spaces,
+            "normalize_punctuation": self.normalize_punctuation,
+            "html_backend": self.html_backend,
+            "collect_links": self.collect_links,
+        }
+
+    def _extract_stage(self, pages: Iterator[Tuple[int, str, str]], stats: PipelineStats,
+                       on_done: Callable[[Tuple, Optional[BaseException]], None]
+                       ) -> Iterator[Tuple[int, str, Dict, bool]]:
+        """
+        Стадия извлечения: (индекс, url, html) -> (индекс, url, запись, признак ошибки).
+        Результаты выдаются в порядке поступления страниц; on_done вызывается
+        при завершении извлечения каждой страницы.
+        """
+        extract_stats = stats["extract"]
+        if self.extract_workers == 1:
+            for index, url, html in pages:
+                started = time.monotonic()
+                try:
+                    content = self.parse_web_content(url, html)
+                    error = False
+                except Exception as e:
+                    content = self._error_content(url, e)
+                    error = True
+                on_done((index, url, html), None)
+                extract_stats.add(len(content["content"]), time.monotonic() - started, error)
+                yield index, url, content, error
+            return
+
+        pool = OrderedProcessPool(
+            workers=self.extract_workers,
+            task_timeout=self.extract_timeout,
+            initializer=_init_web_worker,
+            initargs=(self._worker_config(),),
+            max_pending=self.write_queue_size,
+            start_method=self.start_method
+        )
+        extract_stats.workers = pool.workers
+        for (index, url, _), result, error in pool.imap(_extract_in_worker, pages, on_done):
+            if isinstance(error, TaskTimeoutError):
+                error = TimeoutError(f"извлечение заняло больше {self.extract_timeout} с")
+            if error is not None:
+                content, seconds, failed = self._error_content(url, error), 0.0, True
+            else:
+                content, seconds, failed = result
+            extract_stats.add(len(content["content"]), seconds, failed)
+            yield index, url, content, failed
+
+    def iter_web_items(self, urls: List[str]) -> Iterator[Dict]:
+        """
+        Конвейер обработки веб-страниц, записи выдаются в порядке urls:
+
+        - загрузка (WebFetcher, fetch_concurrency потоков) складывает страницы
+          в очередь на fetch_queue_size страниц;
+        - извлечение (extract_workers процессов) берет страницы из очереди
+          по мере освобождения процессов;
+        - запись получает извлеченные записи; пока запись занята, результаты
+          копятся в буфере на write_queue_size страниц.
+
+        Стадия приостанавливается, пока заполнена очередь следующей за ней.
+        С кэшем страницы, тело которых не изменилось с прошлой обработки, берутся
+        из кэша извлеченных записей и минуют стадию извлечения.
+        Счетчики стадий сохраняются в pipeline_stats и выводятся в лог по завершении.
+        """
+        stats = self.pipeline_stats = PipelineStats([
+            StageStats("fetch", self.fetch_concurrency),
+            StageStats("extract", self.extract_workers),
+            StageStats("write"),
+        ])
+        # Записи, готовые раньше предыдущих по порядку
+        reorder: Dict[int, Dict] = {}
+        next_index = 0
+        # Ключи кэша извлеченных записей для страниц на стадии извлечения
+        extraction_keys: Dict[int, str] = {}
+
+        def take_ready() -> List[Dict]:
+            nonlocal next_index
+            items = []
+            while next_index in reorder:
+                items.append(self._web_item(urls[next_index], reorder.pop(next_index)))
+                next_index += 1
+            return items
+
+        def write(items: List[Dict]) -> Iterator[Dict]:
+            for item in items:
+                started = time.monotonic()
+                yield item
+                stats["write"].add(len(item["content"]["content"]), time.monotonic() - started)
+
+        with WebFetcher(concurrency=self.fetch_concurrency,
+                        per_host=self.per_host_limit,
+                        timeout=self.fetch_timeout,
+                        retries=self.fetch_retries,
+                        max_body_size=self.max_body_size,
+                        max_pending=self.fetch_queue_size,
+                        cache=self.http_cache) as fetcher:
+            completed = 0
+            extracted = 0
+
+            def pages() -> Iterator[Tuple[int, str, str]]:
+                for index, result in fetcher.iter_fetch(urls):
+                    failed = result["error"] is not None
+                    stats["fetch"].add(0 if failed else len(result["text"]), error=failed)
+                    if failed:
+                        # Страница, которую не удалось загрузить, сразу идет в запись
+                        reorder[index] = self._error_content(result["url"], result["error"])
+                        continue
+                    if self.extraction_cache is not None and result["digest"] is not None:
+                        key = self.extraction_key(result["digest"])
+                        cached = self.extraction_cache.get(key)
+                        if cached is not None:
+                            reorder[index] = json.loads(cached)
+                            continue
+                        extraction_keys[index] = key
+                    yield index, result["url"], result["text"]
+
+            def on_done(page, error):
+                nonlocal completed
+                completed += 1
+
+            try:
+                for index, url, content, failed in self._extract_stage(pages(), stats, on_done):
+                    extracted += 1
+                    reorder[index] = content
+                    key = extraction_keys.pop(index, None)
+                    if key is not None and not failed:
+                        self.extraction_cache.put(key, json.dumps(content, ensure_ascii=False))
+                    stats["extract"].sample_depth(fetcher.pending)
+                    # Извлеченные, но еще не записанные страницы (в том числе готовые
+                    # результаты пула, ждущие своей очереди)
+                    stats["write"].sample_depth(len(reorder) + completed - extracted)
+                    yield from write(take_ready())
+                yield from write(take_ready())
+            finally:
+                stats.finish()
+                stats.log()
+
+    def iter_crawl_items(self, seeds: List[str], sitemaps: List[str]) -> Iterator[Dict]:
+        """
+        Обход сайтов по ссылкам от начальных страниц seeds и страниц из sitemaps.
+
+        Обход идет в ширину пакетами по crawl_batch_size страниц через конвейер
+        iter_web_items; ссылки на страницы тех же сайтов (хосты seeds и sitemaps)
+        ставятся в очередь до глубины crawl_max_depth, всего обрабатывается не
+        больше crawl_max_pages страниц. Очередь и множество встреченных адресов
+        хранятся в crawl_state_dir (см. CrawlFrontier) и фиксируются после
+        каждого пакета вместе с записями обработанных страниц: повторный запуск
+        с теми же seeds и sitemaps сначала выдает сохраненные записи, а затем
+        продолжает незавершенный обход, а не начинает его заново.
+        """
+        seeds = [url for url in map(normalize_url, seeds) if url]
+        hosts = {site_host(url) for url in seeds + list(sitemaps)}
+        fingerprint = hashlib.sha256(json.dumps([sorted(seeds), sorted(sitemaps)]).encode("utf-8")).hexdigest()
+        collect_links = self.collect_links
+        self.collect_links = True
+        try:
+            with CrawlFrontier(self._crawl_state_path(), self.crawl_seen_capacity) as frontier:
+                if (frontier.get_meta("fingerprint") == fingerprint and frontier.pending()
+                        and frontier.done() < self.crawl_max_pages):
+                    logging.info(f"Продолжение обхода: обработано {frontier.done()}, "
+                                 f"в очереди {frontier.pending()}")
+                    # Страницы прерванного запуска попадают в корпус из журнала обхода
+                    for item in frontier.iter_pages():
+                        self.processed_count += 1
+                        yield item
+                else:
+                    frontier.reset()
+                    frontier.set_meta("fingerprint", fingerprint)
+                    frontier.add_many(seeds, 0)
+                    sitemap_urls = (normalize_url(url) for url in self.iter_sitemap_urls(sitemaps))
+                    frontier.add_many((url for url in sitemap_urls if url and site_host(url) in hosts), 0)
+                    frontier.checkpoint()
+
+                crawled = frontier.done()
+                while crawled < self.crawl_max_pages:
+                    batch = frontier.next_batch(min(self.crawl_batch_size, self.crawl_max_pages - crawled))
+                    if not batch:
+                        break
+                    items = self.iter_web_items([url for _, url, _ in batch])
+                    for (_, _, depth), item in zip(batch, items):
+                        links = item["content"].pop("links", [])
+                        if depth < self.crawl_max_depth:
+                            frontier.add_many((link for link in links
+                                               if site_host(link) in hosts and is_crawlable(link)), depth + 1)
+                        frontier.save_page(item)
+                        yield item
+                    frontier.mark_done(url_id for url_id, _, _ in batch)
+                    frontier.checkpoint()
+                    crawled += len(batch)
+
+                if len(frontier.seen) > frontier.seen.capacity:
+                    logging.warning(f"Адресов обхода ({len(frontier.seen)}) больше емкости фильтра Блума "
+                                    f"({frontier.seen.capacity}): часть новых страниц может быть пропущена")
+                logging.info(f"Обход: обработано {crawled} страниц, в очереди {frontier.pending()}, "
+                             f"встречено адресов {len(frontier.seen)}")
+        finally:
+            self.collect_links = collect_links
+
+    def _crawl_state_path(self) -> str:
+        return self.crawl_state_dir or self._output_path(f"{self.output_base}.crawl")
+
+    def iter_sitemap_urls(self, sitemap_urls: List[str]) -> Iterator[str]:
+        """Адреса страниц из sitemap (в том числе .xml.gz) и вложенных индексов sitemap."""
+        pending = [(url, 0) for url in sitemap_urls]
+        visited = set()
+        while pending:
+            url, level = pending.pop(0)
+            if url in visited:
+                continue
+            visited.add(url)
+            try:
+                pages, nested = parse_sitemap(self._fetch_sitemap(url))
+            except Exception as e:
+                logging.error(f"Ошибка при чтении sitemap {url}: {e}")
+                continue
+            yield from pages
+            if level < MAX_SITEMAP_DEPTH:
+                pending.extend((nested_url, level + 1) for nested_url in nested)
+
+    def _fetch_sitemap(self, url: str) -> bytes:
+        with requests.get(url, timeout=self.fetch_timeout, stream=True) as response:
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > MAX_SITEMAP_SIZE:
+                    raise ValueError(f"sitemap больше {MAX_SITEMAP_SIZE} байт")
+        if data[:2] == b"\x1f\x8b":
+            with gzip.GzipFile(fileobj=io.BytesIO(data)) as f:
+                data = f.read(MAX_SITEMAP_SIZE + 1)
+            if len(data) > MAX_SITEMAP_SIZE:
+                raise ValueError(f"sitemap больше {MAX_SITEMAP_SIZE} байт")
+        return bytes(data)
+
+    def extraction_key(self, digest: str) -> str:
+        """Ключ кэша извлеченной записи: SHA-256 тела страницы и параметры извлечения."""
+        return self.extraction_cache.make_key(digest, self._worker_config())
+
+    def _web_item(self, url: str, content: Dict) -> Dict:
+        """Запись корпуса для страницы."""
+        self.processed_count += 1
+        return {
+            "source": "web",
+            "url": url,
+            "content": content,
+            "language": self.language
+        }
 
     # Остальные методы класса остаются без изменений...
     def process_all_sources(self, sources: List[Dict]):
-        all_data = []
         filename=None
-        for source in sources:
-            if source["type"] == "web":
-                content = self.extract_web_content(source["url"])
-                if content:
-                    all_data.append({
-                        "source": "web",
-                        "url": source["url"],
-                        "content": content,
-                        "language": self.language
-                    })
-
-        if self.output_format == 'json':
-            filename= self.save_to_json(all_data)
-        elif self.output_format == 'xml':
-            filename= self.save_to_xml(all_data)
-        elif self.output_format == 'zip':
-            filename= self.save_to_zip(all_data)
+        self.processed_count = 0
+        urls = [source["url"] for source in sources if source["type"] == "web"]
+        if urls and (self.fetch_concurrency > 1 or self.extract_workers != 1 or self.http_cache is not None):
+            all_data = self.iter_web_items(urls)
         else:
-            filename= self.save_to_txt(all_data)
+            all_data = (self._web_item(url, self.extract_web_content(url)) for url in urls)
+
+        # Источники обхода: начальные страницы ('crawl') и карты сайта ('sitemap')
+        seeds = [source["url"] for source in sources if source["type"] == "crawl"]
+        sitemaps = [source["url"] for source in sources if source["type"] == "sitemap"]
+        if seeds or sitemaps:
+            all_data = chain(all_data, self.iter_crawl_items(seeds, sitemaps))
+
+        dedup = None
+        if self.dedup_threshold is not None:
+            dedup = NearDuplicateFilter(self.dedup_index_path, self.dedup_threshold,
+                                        corpus=f"{self.output_base} {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            all_data = self.iter_unique_items(all_data, dedup)
 
-        logging.info(f"Обработано источников: {len(all_data)}.")
+        stats = None
+        if self.collect_stats:
+            stats = CorpusStats(self.stats_top_k)
+            all_data = self.iter_observed_items(all_data, stats)
+
+        try:
+            if self.output_format == 'json':
+                filename= self.save_to_json(all_data)
+            elif self.output_format == 'jsonl':
+                filename= self.save_to_jsonl(all_data)
+            elif self.output_format == 'xml':
+                filename= self.save_to_xml(all_data)
+            elif self.output_format == 'zip':
+                filename= self.save_to_zip(all_data)
+            else:
+                filename= self.save_to_txt(all_data)
+        finally:
+            if dedup is not None:
+                dedup.close()
+
+        logging.info(f"Обработано источников: {self.processed_count}.")
+        if dedup is not None:
+            self.save_dedup_report(dedup)
+        if stats is not None:
+            self.save_stats(stats)
+        if self.http_cache is not None:
+            self.log_cache_stats()
         full_path = Path(self.rootPath) / filename
+        if self.export_tokens:
+            self.export_token_ids(str(full_path))
         print('full_path',full_path)
         return full_path
 
-    def save_to_json(self, data: List[Dict]):
-        filename = f"{self.output_base}.json"
-        with open(filename, "w", encoding=self.encoding) as json_file:
-            json.dump(data, json_file, ensure_ascii=False, indent=4)
+    def iter_observed_items(self, items: Iterable[Dict], stats: CorpusStats) -> Iterator[Dict]:
+        """Учитывает основной текст страниц в статистике корпуса по мере записи."""
+        for item in items:
+            stats.observe(item["content"].get("content", ""), item.get("language", ""))
+            yield item
+
+    def save_stats(self, stats: CorpusStats):
+        """Сохраняет статистику корпуса в <output_base>.stats.json."""
+        filename = f"{self.output_base}.stats.json"
+        self.stats_report = stats.save(self._output_path(filename))
+        logging.info(f"Статистика корпуса: {stats.documents} страниц, {self.stats_report['tokens']} токенов, "
+                     f"около {self.stats_report['sample']['vocabulary_estimate']} различных слов "
+                     f"({stats.seconds:.1f} с), файл: {filename}")
+
+    def export_token_ids(self, corpus_path: str):
+        """Экспортирует номера токенов записанного корпуса (см. TokenExporter)."""
+        if self.output_format == 'zip' or not self.write_index:
+            logging.warning("Экспорт токенов требует корпуса с индексом (write_index, не zip); пропущен")
+            return
+        exporter = TokenExporter(self.token_vocab_size, workers=self.extract_workers,
+                                 vocab_path=self.token_vocab_path, start_method=self.start_method)
+        self.token_export = exporter.export(corpus_path, self._output_path(self.output_base))
+
+    def iter_unique_items(self, items: Iterable[Dict], dedup: NearDuplicateFilter) -> Iterator[Dict]:
+        """Пропускает страницы, основной текст которых почти совпадает с уже принятой страницей."""
+        for item in items:
+            duplicate = dedup.check(item["url"], item["content"].get("content", ""))
+            if duplicate is not None:
+                kept_url, _, similarity = duplicate
+                logging.info(f"Почти дубликат пропущен: {item['url']} (сходство {similarity:.2f} с {kept_url})")
+                continue
+            yield item
+
+    def save_dedup_report(self, dedup: NearDuplicateFilter):
+        """Сохраняет кластеры удаленных дубликатов в <output_base>.duplicates.json."""
+        self.dedup_report = dedup.report()
+        filename = f"{self.output_base}.duplicates.json"
+        dedup.save_report(self._output_path(filename))
+        logging.info(f"Удалено почти дубликатов: {dedup.removed} из {dedup.checked} "
+                     f"({len(dedup.clusters)} кластеров), отчет: {filename}")
+
+    def log_cache_stats(self):
+        http = self.http_cache.stats()
+        extraction = self.extraction_cache.stats()
+        logging.info(
+            f"HTTP-кэш: попаданий {http['hit_ratio']:.0%} ({http['fresh_hits']} без запроса, "
+            f"{http['revalidated']} подтверждено ответом 304, {http['misses']} загружено), "
+            f"сэкономлено {http['bytes_saved'] / (1024 * 1024):.1f} МБ, "
+            f"записей {http['entries']} ({http['size'] / (1024 * 1024):.1f} МБ)"
+        )
+        logging.info(f"Кэш извлечения: {extraction['hits']} попаданий, {extraction['misses']} промахов")
+
+    def format_entry(self, item: Dict) -> str:
+        """Форматирует запись для текстового корпуса."""
+        content = item.get('content', {})
+        return (
+            f"Title: {content.get('title', 'N/A')}\n"
+            f"Author: {content.get('author', 'N/A')}\n"
+            f"URL: {item.get('url', 'N/A')}\n"
+            f"Language: {item.get('language', 'N/A')}\n"
+            f"Content:\n{content.get('content', '')}\n\n"
+        )
+
+    def entry_element(self, item: Dict) -> ET.Element:
+        """Создает XML-элемент записи."""
+        entry = ET.Element("entry")
+        ET.SubElement(entry, "source").text = item.get("source", "web")
+        ET.SubElement(entry, "url").text = item.get("url", "")
+        ET.SubElement(entry, "language").text = item.get("language", self.language)
+
+        content = item.get("content", {})
+        content_elem = ET.SubElement(entry, "content")
+        ET.SubElement(content_elem, "title").text = content.get("title", "N/A")
+        ET.SubElement(content_elem, "author").text = content.get("author", "N/A")
+        ET.SubElement(content_elem, "text").text = content.get("content", "")
+        return entry
+
+    @staticmethod
+    def index_fields(item: Dict) -> Dict[str, str]:
+        """Поля страницы для поиска по индексу корпуса."""
+        content = item.get("content", {})
+        return {"title": content.get("title"), "author": content.get("author")}
+
+    def create_writer(self, output_format: str, stream) -> CorpusWriter:
+        """Создает потоковый писатель веб-корпуса для формата."""
+        if output_format == 'json':
+            return JsonCorpusWriter(stream, indent=4, encoding=self.encoding)
+        if output_format == 'jsonl':
+            return JsonLinesCorpusWriter(stream, encoding=self.encoding)
+        if output_format == 'xml':
+            return XmlCorpusWriter(stream, root_tag="news_corpus", build=self.entry_element,
+                                   encoding=self.encoding)
+        return TxtCorpusWriter(stream, render=self.format_entry, encoding=self.encoding)
+
+    def _output_path(self, filename: str) -> str:
+        """Путь к выходному файлу внутри rootPath."""
+        if self.rootPath:
+            os.makedirs(self.rootPath, exist_ok=True)
+        return os.path.join(self.rootPath, filename)
+
+    def _save(self, output_format: str, data: Iterable[Dict]):
+        if self.shard_max_bytes or self.shard_max_documents:
+            return self._save_sharded(output_format, data)
+        filename = f"{self.output_base}.{output_format}"
+        path = self._output_path(filename)
+        # Индекс прежнего корпуса с тем же именем ему больше не соответствует
+        if os.path.exists(index_path_for(path)):
+            os.remove(index_path_for(path))
+        with open(path, "wb") as stream:
+            with self.create_writer(output_format, stream) as writer:
+                if self.write_index:
+                    writer.enable_index(self.index_fields)
+                for item in data:
+                    writer.write(item)
+        if writer.index is not None:
+            writer.save_index(index_path_for(path))
         logging.info(f"Данные сохранены в {filename}")
         return filename
 
-    def save_to_txt(self, data: List[Dict]):
-        filename = f"{self.output_base}.txt"
-        with open(filename, "w", encoding=self.encoding) as txt_file:
+    def _save_sharded(self, output_format: str, data: Iterable[Dict]):
+        """Пишет корпус шардами в папку <output_base>; возвращает путь к манифесту."""
+        with ShardedCorpusWriter(self._output_path(self.output_base), self.output_base,
+                                 partial(self.create_writer, output_format),
+                                 max_bytes=self.shard_max_bytes,
+                                 max_documents=self.shard_max_documents,
+                                 index=self.write_index, index_fields=self.index_fields) as writer:
             for item in data:
-                content = item.get('content', {})
-                txt_file.write(f"Title: {content.get('title', 'N/A')}\n")
-                txt_file.write(f"Author: {content.get('author', 'N/A')}\n")
-                txt_file.write(f"URL: {item.get('url', 'N/A')}\n")
-                txt_file.write(f"Language: {item.get('language', 'N/A')}\n")
-                txt_file.write(f"Content:\n{content.get('content', '')}\n\n")
-        logging.info(f"Данные сохранены в {filename}")
-        return filename
+                writer.write(item)
+        logging.info(f"Данные сохранены в {len(writer.shards)} шардов в папке {self.output_base}")
+        return os.path.join(self.output_base, ShardedCorpusWriter.manifest_name)
 
-    def save_to_xml(self, data: List[Dict]):
-        filename = f"{self.output_base}.xml"
-        root = ET.Element("news_corpus")
+    def save_to_json(self, data: Iterable[Dict]):
+        return self._save('json', data)
 
-        for item in data:
-            entry = ET.SubElement(root, "entry")
-            ET.SubElement(entry, "source").text = item.get("source", "web")
-            ET.SubElement(entry, "url").text = item.get("url", "")
-            ET.SubElement(entry, "language").text = item.get("language", self.language)
+    def save_to_jsonl(self, data: Iterable[Dict]):
+        return self._save('jsonl', data)
 
-            content = item.get("content", {})
-            content_elem = ET.SubElement(entry, "content")
-            ET.SubElement(content_elem, "title").text = content.get("title", "N/A")
-            ET.SubElement(content_elem, "author").text = content.get("author", "N/A")
-            ET.SubElement(content_elem, "text").text = content.get("content", "")
+    def save_to_txt(self, data: Iterable[Dict]):
+        return self._save('txt', data)
 
-        tree = ET.ElementTree(root)
-        tree.write(filename, encoding=self.encoding, xml_declaration=True)
-        logging.info(f"Данные сохранены в {filename}")
-        return filename
+    def save_to_xml(self, data: Iterable[Dict]):
+        return self._save('xml', data)
 
-    def save_to_zip(self, data: List[Dict]):
+    def save_to_zip(self, data: Iterable[Dict]):
+        """Пишет json, xml и txt за один проход прямо в члены zip-архива."""
+        if self.shard_max_bytes or self.shard_max_documents:
+            logging.warning("Формат zip пишется одним архивом, разбиение на шарды не применяется")
         zip_filename = f"{self.output_base}.zip"
-        temp_files = []
-        formats = ['json', 'xml', 'txt']
+        members = [(f"{self.output_base}.{fmt}", partial(self.create_writer, fmt))
+                   for fmt in ('json', 'xml', 'txt')]
+        with ZipCorpusWriter(self._output_path(zip_filename), members,
+                             compresslevel=self.zip_compresslevel) as writer:
+            for item in data:
+                writer.write(item)
+        logging.info(f"Все данные сохранены в ZIP-архив {zip_filename}")
+        return zip_filename
 
-        try:
-            with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for fmt in formats:
-                    filename = f"{self.output_base}.{fmt}"
-                    if fmt == 'json':
-                        self.save_to_json(data)
-                    elif fmt == 'xml':
-                        self.save_to_xml(data)
-                    else:
-                        self.save_to_txt(data)
-                    zipf.write(filename)
-                    temp_files.append(filename)
-
-            logging.info(f"Все данные сохранены в ZIP-архив {zip_filename}")
-            return filename
-        finally:
-            for filename in temp_files:
-                try:
-                    os.remove(filename)
-                except OSError as e:
-                    logging.warning(f"Не удалось удалить временный файл {filename}: {e}")
\ No newline at end of file
+
+def _element_string(element) -> Optional[str]:
+    """
+    Аналог BeautifulSoup Tag.string для элемента lxml: текст единственного
+    дочернего узла (с рекурсией в единственный дочерний элемент) или None.
+    """
+    nodes = [element.text] if element.text else []
+    for child in element:
+        nodes.append(child)
+        if child.tail:
+            nodes.append(child.tail)
+    if len(nodes) != 1:
+        return None
+    node = nodes[0]
+    if isinstance(node, str):
+        return node
+    if not isinstance(node.tag, str):
+        # Комментарий или инструкция обработки
+        return node.text
+    return _element_string(node)
+
+
+# Экземпляр процессора в рабочем процессе пула (см. WebCorpusProcessor._extract_stage)
+_worker_processor: Optional[WebCorpusProcessor] = None
+
+
+def _init_web_worker(config: Dict):
+    """Создает процессор один раз на рабочий процесс."""
+    global _worker_processor
+    _worker_processor = WebCorpusProcessor(**config)
+
+
+def _extract_in_worker(page: Tuple[int, str, str]) -> Tuple[Dict, float, bool]:
+    """Извлекает контент страницы; возвращает запись, время извлечения и признак ошибки."""
+    _, url, html = page
+    started = time.monotonic()
+    try:
+        content = _worker_processor.parse_web_content(url, html)
+        failed = False
+    except Exception as e:
+        content = _worker_processor._error_content(url, e)
+        failed = True
+    return content, time.monotonic() - started, failed
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
+
+from text_processor.Services.Corpus.HttpCache import HttpCache
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Максимальная пауза перед повтором, в том числе по заголовку Retry-After (в секундах)
+MAX_RETRY_DELAY = 60.0
+
+# Признак окончания потока результатов (см. iter_fetch)
+_DONE = object()
+
+
+class BodyTooLargeError(Exception):
+    """Тело ответа превышает допустимый размер."""
+
+
+class WebFetcher:
+    """
+    Параллельная загрузка страниц для WebCorpusProcessor.
+
+    - Планирование выполняется в цикле asyncio: одновременно выполняется не
+      больше concurrency запросов и не больше per_host запросов к одному хосту;
+      ожидание повтора (экспоненциальная пауза со случайной добавкой) слотов
+      не занимает.
+    - Сами запросы выполняются общей сессией requests в пуле потоков: соединения
+      к хосту переиспользуются (keep-alive), размер пула на хост равен per_host.
+    - Тело ответа читается потоково и обрывается после max_body_size байт.
+    - С cache (HttpCache) свежие ответы берутся из кэша без запроса, остальные
+      проверяются условным GET; ответ 304 отдается из кэша.
+
+    Результат загрузки — словарь {"url", "status", "text", "digest", "cache", "error"}:
+    digest — SHA-256 тела (только с кэшем), cache — "fresh", "revalidated" или
+    "miss" (None без кэша). При ошибке text равен None, а error содержит исключение.
+    """
+
+    def __init__(self,
+                 concurrency: int = 32,
+                 per_host: int = 4,
+                 timeout: float = 10.0,
+                 retries: int = 2,
+                 backoff: float = 0.5,
+                 max_body_size: int = 10 * 1024 * 1024,
+                 max_pending: Optional[int] = None,
+                 headers: Optional[Dict[str, str]] = None,
+                 cache: Optional[HttpCache] = None):
+        """
+        :param concurrency: Максимум одновременных запросов
+        :param per_host: Максимум одновременных запросов к одному хосту
+        :param timeout: Таймаут соединения и чтения в секундах
+        :param retries: Сколько раз повторить запрос после сетевой ошибки или ответа 429/5xx
+        :param backoff: Пауза перед первым повтором в секундах (удваивается с каждым повтором)
+        :param max_body_size: Максимальный размер тела ответа в байтах
+        :param max_pending: Максимум загруженных, но еще не выданных результатов
+        :param headers: Дополнительные заголовки запросов
+        :param cache: Дисковый кэш ответов (None — без кэша)
+        """
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_body_size = max_body_size
+        self.max_pending = max_pending or self.concurrency * 2
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="fetch")
+        self._limit: Optional[asyncio.Semaphore] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._results: Optional[queue.Queue] = None
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def pending(self) -> int:
+        """Сколько загруженных страниц ждет потребителя iter_fetch."""
+        return self._results.qsize() if self._results is not None else 0
+
+    def _request(self, url: str) -> Dict:
+        """Выполняет запрос в потоке пула; бросает исключение при ошибке."""
+        if self.cache is None:
+            return self._download(url, None)
+        entry = self.cache.lookup(url)
+        if entry is not None and self.cache.is_fresh(entry):
+            body = self.cache.read_body(url, entry)
+            if body is not None:
+                return _cached_result(entry, body, "fresh")
+        return self._download(url, entry)
+
+    def _download(self, url: str, entry: Optional[Dict]) -> Dict:
+        """Загружает страницу; с записью кэша entry — условным GET."""
+        headers = HttpCache.conditional_headers(entry) if entry is not None else None
+        with self.session.get(url, timeout=self.timeout, stream=True, headers=headers) as response:
+            if response.status_code == 304 and entry is not None:
+                body = self.cache.read_body(url, entry, response.headers)
+                if body is not None:
+                    return _cached_result(entry, body, "revalidated")
+                # Тело вытеснено из кэша после чтения индекса: загружаем целиком
+                return self._download(url, None)
+            response.raise_for_status()
+            length = response.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > self.max_body_size:
+                raise BodyTooLargeError(f"Content-Length {length} exceeds {self.max_body_size} bytes")
+            body = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                body += chunk
+                if len(body) > self.max_body_size:
+                    raise BodyTooLargeError(f"Body exceeds {self.max_body_size} bytes")
+            body = bytes(body)
+            digest = cache_state = None
+            if self.cache is not None:
+                cache_state = "miss"
+                if response.status_code == 200:
+                    digest = self.cache.store(url, response.headers, response.encoding, body)
+            return {"status": response.status_code, "text": _decode(response.encoding, body),
+                    "digest": digest, "cache": cache_state}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return limit
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        delay = self.backoff * 2 ** attempt * random.uniform(1.0, 1.5)
+        response = getattr(error, "response", None)
+        retry_after = _parse_retry_after(response.headers.get("Retry-After") if response is not None else None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return min(delay, MAX_RETRY_DELAY)
+
+    async def fetch(self, url: str) -> Dict:
+        """Загружает страницу с учетом ограничений параллельности и повторов."""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            # Сначала слот хоста, потом общий: запросы, ждущие занятый хост,
+            # не отнимают общие слоты у остальных
+            async with self._host_limit(url), self._limit:
+                try:
+                    result = await loop.run_in_executor(self._executor, self._request, url)
+                    return {"url": url, **result, "error": None}
+                except Exception as e:
+                    error = e
+            status = _error_status(error)
+            retryable = (status in RETRY_STATUSES if status is not None
+                         else isinstance(error, (requests.ConnectionError, requests.Timeout)))
+            if not retryable or attempt >= self.retries:
+                return {"url": url, "status": status, "text": None, "digest": None, "cache": None,
+                        "error": error}
+            await asyncio.sleep(self._retry_delay(attempt, error))
+            attempt += 1
+
+    async def fetch_all(self, urls: Iterable[str]) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Загружает страницы и выдает пары (индекс URL, результат) по мере
+        готовности. URL читаются лениво: в работе не больше max_pending задач.
+        """
+        self._limit = asyncio.Semaphore(self.concurrency)
+        self._host_limits = {}
+        window = asyncio.Semaphore(self.max_pending)
+        done: asyncio.Queue = asyncio.Queue()
+        tasks = set()
+        started = 0
+
+        async def job(index: int, url: str):
+            done.put_nowait((index, await self.fetch(url)))
+
+        async def feed():
+            nonlocal started
+            try:
+                for index, url in enumerate(urls):
+                    await window.acquire()
+                    task = asyncio.create_task(job(index, url))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    started += 1
+            finally:
+                done.put_nowait(_DONE)
+
+        feeder = asyncio.create_task(feed())
+        try:
+            fed = False
+            received = 0
+            while not fed or received < started:
+                item = await done.get()
+                if item is _DONE:
+                    fed = True
+                    continue
+                received += 1
+                window.release()
+                yield item
+            # Ошибка чтения списка URL
+            await feeder
+        finally:
+            feeder.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+    def iter_fetch(self, urls: Iterable[str]) -> Iterator[Tuple[int, Dict]]:
+        """
+        Синхронная обертка над fetch_all: цикл asyncio работает в отдельном
+        потоке, результаты выдаются по мере готовности. Пока потребитель
+        обрабатывает результат, загрузка продолжается; буфер готовых
+        результатов ограничен max_pending.
+        """
+        results: queue.Queue = queue.Queue(maxsize=self.max_pending)
+        self._results = results
+        stop = threading.Event()
+
+        async def produce():
+            try:
+                async for item in self.fetch_all(urls):
+                    while not stop.is_set():
+                        try:
+                            results.put_nowait(item)
+                            break
+                        except queue.Full:
+                            await asyncio.sleep(0.01)
+                    if stop.is_set():
+                        # Потребитель прекратил чтение: незапущенные загрузки отменяются
+                        return
+            except Exception as e:
+                logging.error(f"Загрузка страниц прервана: {e}")
+                results.put(e)
+            finally:
+                results.put(_DONE)
+
+        thread = threading.Thread(target=asyncio.run, args=(produce(),), name="web-fetcher", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Освобождаем место в буфере, чтобы поток завершился
+            while thread.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
+
+
+def _cached_result(entry: Dict, body: bytes, cache_state: str) -> Dict:
+    """Результат загрузки для тела из кэша."""
+    return {"status": 200, "text": _decode(entry["encoding"], body), "digest": entry["digest"],
+            "cache": cache_state}
+
+
+def _decode(encoding: Optional[str], body: bytes) -> str:
+    """Декодирует тело так же, как requests.Response.text (encoding — response.encoding)."""
+    if encoding is None:
+        encoding = chardet.detect(body)["encoding"] if chardet is not None else "utf-8"
+    try:
+        return str(body, encoding or "utf-8", errors="replace")
+    except (LookupError, TypeError):
+        return str(body, errors="replace")
+
+
+def _error_status(error: Exception) -> Optional[int]:
+    """HTTP-статус ответа, вызвавшего ошибку (None для сетевых ошибок)."""
+    response = getattr(error, "response", None)
+    return response.status_code if response is not None else None
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах (число или HTTP-дата) или None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка файла средствами msvcrt
+    fcntl = None
+    import msvcrt
+
+from django.utils.text import get_valid_filename
+
+# Размер блока чтения тела запроса и файлов при подсчете контрольных сумм
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Суффикс недозагруженного файла: под своим именем файл появляется только целиком
+PART_SUFFIX = ".part"
+
+# Суффикс файла блокировки (см. _file_lock)
+LOCK_SUFFIX = ".lock"
+
+
+class UploadError(ValueError):
+    """Ошибка загрузки части файла; status — HTTP-код ответа клиенту."""
+
+    def __init__(self, message: str, status: int = 400, received: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.received = received
+
+
+class ChunkedUpload:
+    """
+    Возобновляемая загрузка набора файлов частями.
+
+    Клиент заранее объявляет файлы (имя, размер и, при желании, SHA-256) и
+    отправляет каждую часть со смещением. Часть принимается, только если ее
+    смещение равно числу уже полученных байт, поэтому после обрыва связи
+    клиент узнает полученный размер (status) и продолжает с него. Части
+    одного файла принимаются по очереди, даже если запросы обрабатывают
+    разные процессы сервера (блокировка файла .<имя>.lock). Состояние
+    загрузки — сами файлы на диске (<имя>.part), так что оно переживает
+    перезапуск сервера.
+
+    Полностью полученный файл сверяется с объявленной контрольной суммой и
+    переименовывается в конечное имя; iter_completed выдает такие файлы
+    по мере готовности, чтобы обработка шла одновременно с загрузкой.
+    """
+
+    def __init__(self, directory: str, files: List[Dict], idle_timeout: Optional[float] = None):
+        """
+        :param directory: Папка загрузки
+        :param files: Объявленные файлы (см. normalize_files)
+        :param idle_timeout: Сколько секунд iter_completed ждет новых данных,
+                             прежде чем считать загрузку брошенной (None — без ограничения)
+        """
+        self.directory = directory
+        self.files = files
+        self.idle_timeout = idle_timeout
+        # Причина, по которой iter_completed прервал ожидание файлов
+        self.error: Optional[str] = None
+
+    @staticmethod
+    def normalize_files(files, extensions: Optional[tuple] = None) -> List[Dict]:
+        """
+        Проверяет объявление файлов: [{"name", "size", "sha256"?}, ...].
+
+        :param extensions: Допустимые расширения файлов (None — любые)
+        :raises UploadError: Если объявление неверно
+        """
+        if not isinstance(files, list) or not files:
+            raise UploadError("Не указаны файлы для загрузки")
+        normalized = []
+        names = set()
+        for item in files:
+            try:
+                name = get_valid_filename(os.path.basename(str(item["name"])))
+                size = int(item["size"])
+            except Exception:
+                raise UploadError(f"Неверное описание файла: {item}")
+            if size < 0:
+                raise UploadError(f"Неверный размер файла {name}")
+            if extensions is not None and not name.lower().endswith(extensions):
+                raise UploadError(f"Неподдерживаемый формат файла: {name}")
+            if name in names:
+                raise UploadError(f"Файл {name} указан несколько раз")
+            names.add(name)
+            sha256 = str(item.get("sha256") or "").lower() or None
+            if sha256 is not None and len(sha256) != 64:
+                raise UploadError(f"Неверная контрольная сумма SHA-256 файла {name}")
+            normalized.append({"name": name, "size": size, "sha256": sha256})
+        return normalized
+
+    def path(self, index: int) -> str:
+        return os.path.join(self.directory, self.files[index]["name"])
+
+    def part_path(self, index: int) -> str:
+        return self.path(index) + PART_SUFFIX
+
+    def lock_path(self, index: int) -> str:
+        # Скрытый файл: обход папки книг его пропускает
+        return os.path.join(self.directory, f".{self.files[index]['name']}{LOCK_SUFFIX}")
+
+    def received(self, index: int) -> int:
+        """Число полученных байт файла."""
+        if os.path.exists(self.path(index)):
+            return self.files[index]["size"]
+        try:
+            return os.path.getsize(self.part_path(index))
+        except FileNotFoundError:
+            return 0
+
+    def is_complete(self, index: int) -> bool:
+        return os.path.exists(self.path(index))
+
+    def status(self) -> List[Dict]:
+        """Состояние файлов: сколько байт получено и завершена ли загрузка."""
+        return [{"index": index, "name": item["name"], "size": item["size"],
+                 "received": self.received(index), "complete": self.is_complete(index)}
+                for index, item in enumerate(self.files)]
+
+    def write(self, index: int, offset: int, stream, length: int, chunk_sha256: Optional[str] = None) -> Dict:
+        """
+        Дописывает часть файла из потока (тело запроса читается блоками, без
+        загрузки в память целиком).
+
+        :param index: Номер файла в объявлении
+        :param offset: Смещение части в файле
+        :param stream: Поток с данными части (объект с методом read)
+        :param length: Длина части в байтах
+        :param chunk_sha256: Контрольная сумма части; при несовпадении часть отбрасывается
+        :return: Состояние файла (см. status)
+        :raises UploadError: Смещение не совпадает с полученным размером, часть
+                             повреждена или файл не совпадает с контрольной суммой
+        """
+        if not 0 <= index < len(self.files):
+            raise UploadError(f"Нет файла с номером {index}", status=404)
+        size = self.files[index]["size"]
+        with _file_lock(self.lock_path(index)):
+            received = self.received(index)
+            if self.is_complete(index):
+                if offset + length <= size:
+                    # Повтор части, ответ на которую не дошел до клиента
+                    return self.status()[index]
+                raise UploadError("Файл уже загружен", status=409, received=received)
+            if offset != received:
+                raise UploadError(f"Ожидалась часть со смещения {received}", status=409, received=received)
+            if offset + length > size:
+                raise UploadError("Часть выходит за объявленный размер файла", received=received)
+
+            os.makedirs(self.directory, exist_ok=True)
+            digest = hashlib.sha256()
+            written = 0
+            with open(self.part_path(index), "ab") as f:
+                try:
+                    while written < length:
+                        block = stream.read(min(READ_BLOCK_SIZE, length - written))
+                        if not block:
+                            break
+                        f.write(block)
+                        digest.update(block)
+                        written += len(block)
+                    if written != length:
+                        raise UploadError(f"Получено {written} байт из {length}", received=received)
+                    if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+                        raise UploadError("Контрольная сумма части не совпадает", status=422, received=received)
+                except BaseException:
+                    # Часть отбрасывается целиком, чтобы клиент повторил ее с прежнего смещения
+                    f.truncate(received)
+                    raise
+
+            if received + written == size:
+                self._complete(index)
+        return self.status()[index]
+
+    def _complete(self, index: int):
+        """Сверяет полностью полученный файл с контрольной суммой и дает ему конечное имя."""
+        expected = self.files[index]["sha256"]
+        if expected:
+            digest = hashlib.sha256()
+            with open(self.part_path(index), "rb") as f:
+                for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+                    digest.update(block)
+            if digest.hexdigest() != expected:
+                os.remove(self.part_path(index))
+                raise UploadError(f"Контрольная сумма файла {self.files[index]['name']} не совпадает; "
+                                  f"файл нужно загрузить заново", status=422, received=0)
+        os.replace(self.part_path(index), self.path(index))
+
+    def iter_completed(self, poll_interval: float = 0.5) -> Iterator[str]:
+        """
+        Пути загруженных файлов по мере их готовности; заканчивается, когда
+        загружены все объявленные файлы.
+
+        :raises TimeoutError: Если данные не поступали дольше idle_timeout секунд
+        """
+        pending = set(range(len(self.files)))
+        last_activity = time.monotonic()
+        last_received = -1
+        while pending:
+            for index in sorted(pending):
+                if self.is_complete(index):
+                    pending.discard(index)
+                    yield self.path(index)
+            if not pending:
+                break
+            received = sum(self.received(index) for index in pending)
+            if received != last_received:
+                last_received = received
+                last_activity = time.monotonic()
+            elif self.idle_timeout and time.monotonic() - last_activity > self.idle_timeout:
+                self.error = (f"Загрузка не продолжалась {self.idle_timeout:.0f} с; "
+                              f"не загружено файлов: {len(pending)}")
+                raise TimeoutError(self.error)
+            time.sleep(poll_interval)
+        logging.info(f"Upload to {self.directory} complete: {len(self.files)} file(s)")
+
+
+@contextmanager
+def _file_lock(path: str):
+    """
+    Блокировка файла для потоков и процессов сервера: части одного файла
+    дописываются по очереди, даже если запросы обрабатывают разные процессы.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            return
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,230 @@
+import json
+import os
+import re
+import struct
+import zipfile
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # сжатие zstd доступно, только если установлен пакет zstandard
+    zstandard = None
+
+from text_processor.Services.Corpus.CorpusWriters import ShardedCorpusWriter
+
+# Размер блока чтения файла при отдаче
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Расширения, которые добавляются к имени файла при сжатии
+COMPRESSED_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+# Локальный заголовок члена zip-архива (после него — имя и дополнительное поле)
+_LOCAL_HEADER = struct.Struct("<4s5H3I2H")
+
+
+class CorpusDownload:
+    """
+    Отдаваемая часть результата задачи: файл корпуса, шард из манифеста или
+    член zip-архива. Член архива читается прямо из архива, без распаковки на
+    диск: несжатый — как диапазон байт файла, сжатый (deflate) — с распаковкой
+    на лету, а в gzip отдается без пересжатия (поток deflate из архива
+    оборачивается заголовком gzip; CRC-32 и размер берутся из архива).
+    """
+
+    def __init__(self, path: str, name: str, size: int, offset: int = 0,
+                 compressed_size: Optional[int] = None, crc: Optional[int] = None):
+        """
+        :param path: Файл на диске
+        :param name: Имя файла для клиента
+        :param size: Размер отдаваемых данных (для сжатого члена архива — после распаковки)
+        :param offset: Смещение данных в файле
+        :param compressed_size: Размер данных deflate (только для сжатого члена архива)
+        :param crc: CRC-32 распакованных данных (только для сжатого члена архива)
+        """
+        self.path = path
+        self.name = name
+        self.size = size
+        self.offset = offset
+        self.compressed_size = compressed_size
+        self.crc = crc
+        stat = os.stat(path)
+        self.mtime = stat.st_mtime
+        self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}-{offset:x}"'
+
+    @property
+    def deflated(self) -> bool:
+        return self.compressed_size is not None
+
+    @property
+    def whole_file(self) -> bool:
+        """Данные — весь файл целиком (его можно отдать средствами сервера)."""
+        return not self.deflated and self.offset == 0 and self.size == os.path.getsize(self.path)
+
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Данные в диапазоне [start, end) блоками."""
+        end = self.size if end is None else end
+        if not self.deflated:
+            yield from _iter_file(self.path, self.offset + start, end - start)
+            return
+        # Сжатый член архива распаковывается с начала; байты до start пропускаются
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        position = 0
+        for block in _iter_file(self.path, self.offset, self.compressed_size):
+            data = decompressor.decompress(block)
+            if position + len(data) > start:
+                yield data[max(0, start - position):end - position]
+            position += len(data)
+            if position >= end:
+                return
+        data = decompressor.flush()
+        if data and position < end:
+            yield data[max(0, start - position):end - position]
+
+    def iter_compressed(self, method: str, level: Optional[int] = None) -> Iterator[bytes]:
+        """Данные целиком, сжатые потоком ('gzip' или 'zstd')."""
+        if method == "gzip" and self.deflated:
+            yield from self._iter_gzip_member()
+        elif method == "gzip":
+            yield from iter_gzip(self.iter_bytes(), 6 if level is None else level)
+        elif method == "zstd":
+            yield from iter_zstd(self.iter_bytes(), 3 if level is None else level)
+        else:
+            raise ValueError(f"Unsupported compression: {method}")
+
+    def _iter_gzip_member(self) -> Iterator[bytes]:
+        """Поток gzip из данных deflate члена архива без распаковки и пересжатия."""
+        yield b"\x1f\x8b\x08\x00" + struct.pack("<I", int(self.mtime)) + b"\x00\xff"
+        yield from _iter_file(self.path, self.offset, self.compressed_size)
+        yield struct.pack("<II", self.crc, self.size & 0xFFFFFFFF)
+
+
+def compression_methods() -> List[str]:
+    """Доступные методы сжатия при отдаче."""
+    return ["gzip", "zstd"] if zstandard is not None else ["gzip"]
+
+
+def resolve(result_path: str, shard: Optional[str] = None, member: Optional[str] = None) -> CorpusDownload:
+    """
+    Отдаваемая часть результата.
+
+    :param result_path: Путь к корпусу (для корпуса из шардов — к манифесту)
+    :param shard: Имя или номер шарда корпуса из шардов
+    :param member: Имя члена zip-архива
+    :raises FileNotFoundError: Если такой части нет
+    """
+    if shard is not None:
+        if os.path.basename(result_path) != ShardedCorpusWriter.manifest_name:
+            raise FileNotFoundError("Корпус не разбит на шарды")
+        with open(result_path, encoding="utf-8") as f:
+            shards = json.load(f)["shards"]
+        for number, entry in enumerate(shards):
+            if shard in (entry["file"], str(number)):
+                path = os.path.join(os.path.dirname(result_path), entry["file"])
+                return CorpusDownload(path, entry["file"], os.path.getsize(path))
+        raise FileNotFoundError(f"Нет шарда {shard}")
+
+    if member is not None:
+        if not zipfile.is_zipfile(result_path):
+            raise FileNotFoundError("Корпус не является zip-архивом")
+        with zipfile.ZipFile(result_path) as zipf:
+            try:
+                info = zipf.getinfo(member)
+            except KeyError:
+                raise FileNotFoundError(f"Нет файла {member} в архиве")
+        if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED) or info.flag_bits & 0x1:
+            raise FileNotFoundError(f"Файл {member} сжат неподдерживаемым методом")
+        offset = _member_offset(result_path, info)
+        if info.compress_type == zipfile.ZIP_STORED:
+            return CorpusDownload(result_path, os.path.basename(member), info.file_size, offset)
+        return CorpusDownload(result_path, os.path.basename(member), info.file_size, offset,
+                              compressed_size=info.compress_size, crc=info.CRC)
+
+    return CorpusDownload(result_path, os.path.basename(result_path), os.path.getsize(result_path))
+
+
+def parts(result_path: str) -> List[Dict]:
+    """Части результата, которые можно скачать по отдельности: шарды или члены архива."""
+    try:
+        if os.path.basename(result_path) == ShardedCorpusWriter.manifest_name:
+            with open(result_path, encoding="utf-8") as f:
+                return [{"shard": entry["file"], "size": entry["bytes"], "documents": entry["documents"]}
+                        for entry in json.load(f)["shards"]]
+        if zipfile.is_zipfile(result_path):
+            with zipfile.ZipFile(result_path) as zipf:
+                return [{"member": info.filename, "size": info.file_size}
+                        for info in zipf.infolist() if not info.is_dir()]
+    except (OSError, ValueError, KeyError):
+        pass
+    return []
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Диапазон [start, end) из заголовка Range; None — отдать файл целиком
+    (заголовка нет, он не в байтах или запрошено несколько диапазонов).
+
+    :raises ValueError: Если диапазон не пересекается с файлом (ответ 416)
+    """
+    if not header:
+        return None
+    match = _RANGE.fullmatch(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Последние last байт
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size
+    start = int(first)
+    end = size if last == "" else min(size, int(last) + 1)
+    if start >= size or start >= end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def iter_gzip(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Сжимает поток байт в формат gzip."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_zstd(chunks: Iterable[bytes], level: int = 3) -> Iterator[bytes]:
+    """Сжимает поток байт в формат zstd (нужен пакет zstandard)."""
+    if zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _member_offset(path: str, info: zipfile.ZipInfo) -> int:
+    """Смещение данных члена архива: после локального заголовка, имени и дополнительного поля."""
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+    if header[0] != b"PK\x03\x04":
+        raise FileNotFoundError(f"Поврежден заголовок файла {info.filename} в архиве")
+    return info.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1]
+
+
+def _iter_file(path: str, offset: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while length > 0:
+            block = f.read(min(READ_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
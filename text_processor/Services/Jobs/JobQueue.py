@@ -0,0 +1,275 @@
+import logging
+import os
+import shutil
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from text_easy_processor import settings
+from text_processor.models import CorpusJob
+from text_processor.Services.Corpus.BookArchive import iter_books
+from text_processor.Services.Corpus.BookCorpusProcessor import BookCorpusProcessor
+from text_processor.Services.Corpus.WebCorpusProcessor import WebCorpusProcessor
+from text_processor.Services.Jobs.ChunkedUpload import ChunkedUpload
+
+
+class JobQueue:
+    """
+    Локальный пул фоновых задач построения корпусов.
+
+    Задачи хранятся в модели CorpusJob: запрос только ставит задачу в очередь,
+    а потоки пула забирают ее из базы. Захват задачи — условный UPDATE, поэтому
+    одну задачу не возьмут два потока или два процесса сервера. Пока задача
+    выполняется, ход обработки и heartbeat сохраняются раз в progress_interval
+    секунд; задача, чей heartbeat не обновлялся дольше stale_after секунд
+    (сервер был перезапущен или процесс упал), снова берется в работу, но не
+    больше max_attempts раз.
+
+    Сами процессоры распараллеливают обработку процессами, поэтому по
+    умолчанию задачи выполняются по одной. Задачи загрузки ('upload') большую
+    часть времени ждут данных от клиента, поэтому их выполняют отдельные
+    потоки (upload_workers): медленная или брошенная загрузка не задерживает
+    остальные задачи очереди.
+    """
+
+    def __init__(self,
+                 workers: int = 1,
+                 upload_workers: int = 4,
+                 poll_interval: float = 5.0,
+                 progress_interval: float = 1.0,
+                 stale_after: float = 120.0,
+                 max_attempts: int = 3):
+        """
+        :param workers: Число задач, выполняемых одновременно (кроме задач загрузки)
+        :param upload_workers: Число задач загрузки, выполняемых одновременно
+        :param poll_interval: Как часто свободный поток проверяет очередь в базе (в секундах)
+        :param progress_interval: Как часто сохраняется ход выполнения задачи (в секундах)
+        :param stale_after: Через сколько секунд без heartbeat задача считается прерванной
+        :param max_attempts: Сколько раз задача берется в работу, прежде чем считается неудачной
+        """
+        self.workers = max(1, workers)
+        self.upload_workers = max(1, upload_workers)
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.stale_after = max(stale_after, 3 * progress_interval)
+        self.max_attempts = max(1, max_attempts)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Запускает потоки пула (повторный вызов ничего не делает)."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, args=(False,),
+                                          name=f"corpus-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            for i in range(self.upload_workers):
+                thread = threading.Thread(target=self._worker_loop, args=(True,),
+                                          name=f"corpus-upload-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Останавливает потоки после завершения текущих задач."""
+        self._stopping.set()
+        self._wakeup.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def submit(self, kind: str, params: dict, job_id=None) -> CorpusJob:
+        """
+        Ставит задачу в очередь.
+
+        :param kind: Тип задачи (см. CorpusJob.KIND_CHOICES)
+        :param params: {"kwargs": параметры процессора, "sources": источники веб-корпуса}
+        :param job_id: Идентификатор задачи (по умолчанию создается новый)
+        """
+        fields = {"kind": kind, "params": params}
+        if job_id is not None:
+            fields["id"] = job_id
+        job = CorpusJob.objects.create(**fields)
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def claim(self, uploads: bool = False) -> Optional[CorpusJob]:
+        """
+        Забирает самую старую задачу из очереди или прерванную задачу.
+
+        :param uploads: Забирать задачи загрузки ('upload') вместо остальных задач
+        """
+        now = timezone.now()
+        stale = now - timedelta(seconds=self.stale_after)
+        candidates = CorpusJob.objects.filter(
+            Q(status=CorpusJob.QUEUED) | Q(status=CorpusJob.RUNNING, heartbeat__lt=stale)
+        )
+        if uploads:
+            candidates = candidates.filter(kind="upload")
+        else:
+            candidates = candidates.exclude(kind="upload")
+        candidates = candidates.order_by("created_at")
+        for job in candidates[:10]:
+            if job.status == CorpusJob.RUNNING and job.attempts >= self.max_attempts:
+                CorpusJob.objects.filter(pk=job.pk, status=CorpusJob.RUNNING, heartbeat__lt=stale).update(
+                    status=CorpusJob.FAILED, finished_at=now,
+                    error=f"Задача прерывалась {job.attempts} раз(а)")
+                continue
+            # Условие повторяет выборку: задачу, захваченную другим потоком, UPDATE не изменит
+            claimed = CorpusJob.objects.filter(pk=job.pk, status=job.status)
+            if job.status == CorpusJob.RUNNING:
+                claimed = claimed.filter(heartbeat__lt=stale)
+            if claimed.update(status=CorpusJob.RUNNING, started_at=now, heartbeat=now, finished_at=None,
+                              processed=0, progress=0.0, error="", attempts=F("attempts") + 1):
+                if job.status == CorpusJob.RUNNING:
+                    logging.warning(f"Resuming interrupted corpus job {job.pk}")
+                job.refresh_from_db()
+                return job
+        return None
+
+    def _worker_loop(self, uploads: bool):
+        while not self._stopping.is_set():
+            job = None
+            try:
+                job = self.claim(uploads)
+                if job is not None:
+                    self.run(job)
+            except Exception as e:
+                logging.error(f"Corpus job queue error: {e}")
+            finally:
+                close_old_connections()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+        connection.close()
+
+    def run(self, job: CorpusJob):
+        """Выполняет захваченную задачу и сохраняет ее результат."""
+        logging.info(f"Starting corpus job {job.pk} ({job.kind})")
+        processor = None
+        finished = threading.Event()
+        monitor = None
+        try:
+            processor = build_processor(job)
+            monitor = threading.Thread(target=self._monitor, args=(job, processor, finished),
+                                       name=f"corpus-job-monitor-{job.pk}", daemon=True)
+            monitor.start()
+            upload = None
+            if job.kind == "folder":
+                result = processor.process_all_books()
+            elif job.kind == "upload":
+                # Файлы обрабатываются по мере загрузки; книги из архивов — без распаковки
+                upload = upload_of(job)
+                files = iter_books(upload.iter_completed(), BookCorpusProcessor.supported_formats)
+                result = processor.process_all_books(files, len(upload.files))
+            elif job.kind == "archive":
+                result = processor.process_archive(job.params["archive"])
+            else:
+                result = processor.process_all_sources(job.params.get("sources", []))
+        except Exception as e:
+            logging.error(f"Corpus job {job.pk} failed: {e}")
+            result, error = None, str(e) or type(e).__name__
+        else:
+            if result:
+                error = ""
+            elif upload is not None and upload.error:
+                error = upload.error
+            else:
+                error = "Корпус не создан: нет обработанных документов (подробности в журнале сервера)"
+        finally:
+            finished.set()
+            if monitor is not None:
+                monitor.join()
+
+        processed, total = progress_of(job, processor) if processor is not None else (0, 0)
+        fields = {"processed": processed, "total": total, "finished_at": timezone.now(),
+                  "heartbeat": timezone.now()}
+        if error:
+            fields.update(status=CorpusJob.FAILED, error=error)
+        else:
+            fields.update(status=CorpusJob.DONE, progress=100.0, result_path=str(result))
+        CorpusJob.objects.filter(pk=job.pk).update(**fields)
+        logging.info(f"Corpus job {job.pk} {fields['status']}: {result or error}")
+        crawl_state_dir = job.params.get("kwargs", {}).get("crawl_state_dir")
+        if not error and crawl_state_dir:
+            # Состояние завершенного обхода (с журналом страниц) больше не нужно
+            shutil.rmtree(crawl_state_dir, ignore_errors=True)
+
+    def _monitor(self, job: CorpusJob, processor, finished: threading.Event):
+        """Сохраняет ход выполнения и heartbeat задачи, пока она выполняется."""
+        try:
+            while not finished.wait(self.progress_interval):
+                processed, total = progress_of(job, processor)
+                progress = min(99.0, 100.0 * processed / total) if total else 0.0
+                CorpusJob.objects.filter(pk=job.pk, status=CorpusJob.RUNNING).update(
+                    processed=processed, total=total, progress=progress, heartbeat=timezone.now())
+        except Exception as e:
+            logging.error(f"Cannot update progress of corpus job {job.pk}: {e}")
+        finally:
+            connection.close()
+
+
+def build_processor(job: CorpusJob):
+    """
+    Создает процессор задачи по ее параметрам. Пулы процессов задачи
+    запускаются способом settings.CORPUS_JOB_START_METHOD: задача
+    выполняется не в главном потоке сервера, и fork здесь небезопасен.
+    """
+    kwargs = dict(job.params.get("kwargs", {}))
+    kwargs.setdefault("start_method", settings.CORPUS_JOB_START_METHOD)
+    if job.kind in ("folder", "upload", "archive"):
+        return BookCorpusProcessor(**kwargs)
+    os.makedirs(kwargs["rootPath"], exist_ok=True)
+    return WebCorpusProcessor(**kwargs)
+
+
+def upload_of(job: CorpusJob) -> ChunkedUpload:
+    """Загрузка файлов задачи 'upload' (файлы загружаются в папку книг задачи)."""
+    return ChunkedUpload(job.params["kwargs"]["books_folder"], job.params["files"],
+                         idle_timeout=settings.CORPUS_UPLOAD_IDLE_TIMEOUT)
+
+
+def progress_of(job: CorpusJob, processor):
+    """
+    Число обработанных элементов задачи и их ожидаемое число (0 — неизвестно).
+
+    Для обхода сайта ожидаемое число — бюджет страниц, поэтому оценка
+    оставшегося времени в этом случае сверху.
+    """
+    if job.kind in ("folder", "upload", "archive"):
+        # Архив среди загружаемых файлов считается одним файлом, хотя книг в нем больше
+        return processor.files_done, max(processor.files_total, processor.files_done)
+    sources = job.params.get("sources", [])
+    total = sum(1 for source in sources if source["type"] == "web")
+    if any(source["type"] != "web" for source in sources):
+        total += processor.crawl_max_pages
+    return processor.processed_count, max(total, processor.processed_count)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Общая очередь процесса сервера; потоки запускаются при первом обращении."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(workers=settings.CORPUS_JOB_WORKERS,
+                              upload_workers=settings.CORPUS_UPLOAD_JOB_WORKERS,
+                              poll_interval=settings.CORPUS_JOB_POLL_INTERVAL,
+                              stale_after=settings.CORPUS_JOB_STALE_AFTER,
+                              max_attempts=settings.CORPUS_JOB_MAX_ATTEMPTS)
+        _queue.start()
+        return _queue
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from text_processor.models import CorpusJob
+
+
+@admin.register(CorpusJob)
+class CorpusJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'processed', 'total', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'heartbeat')
@@ -2,12 +2,14 @@ from django import forms
 
 PROCESS_TYPE_CHOICES = [
     ('folder', 'Обработать из папки'),
-   # ('archive', 'Обработать из архива'),
-    ('web', 'Обработать веб-страницы')
+    ('archive', 'Обработать из архива'),
+    ('web', 'Обработать веб-страницы'),
+    ('crawl', 'Обойти сайт по ссылкам')
 ]
 
 OUTPUT_FORMAT_CHOICES = [
     ('json', 'Json'),
+    ('jsonl', 'Json Lines'),
     ('txt', 'txt'),
     ('xml', 'xml'),
     ('rtf', 'rtf'),
@@ -29,6 +31,22 @@ class UniversalCorpusForm(forms.Form):
         initial=["https://en.wikipedia.org/wiki/Daniel_Noboa", "\n" "https://en.wikipedia.org/wiki/Kellogg_School_of_Management"]
     )
 
+    crawl_max_depth = forms.IntegerField(
+        label="Глубина обхода по ссылкам",
+        min_value=0,
+        initial=2,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    crawl_max_pages = forms.IntegerField(
+        label="Максимум страниц обхода",
+        min_value=1,
+        initial=1000,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
     type_outputcorpus = forms.ChoiceField(
         label="Формат выходного файла",
         choices=OUTPUT_FORMAT_CHOICES,
@@ -38,6 +56,53 @@ class UniversalCorpusForm(forms.Form):
 
     language = forms.ChoiceField(choices=[('en', 'English'), ('ru', 'Russian'), ('tg', 'Tajik')], label="Выберите язык", required=False)
 
+    sentence_per_line = forms.BooleanField(
+        label="Одно предложение в строке",
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+    dedup_threshold = forms.FloatField(
+        label="Порог сходства для удаления почти дубликатов (пусто — не удалять)",
+        min_value=0.5,
+        max_value=1.0,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.05', 'placeholder': '0.8'})
+    )
+
+    shard_size_mb = forms.IntegerField(
+        label="Размер шарда, МБ (пусто — один файл)",
+        min_value=1,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    shard_documents = forms.IntegerField(
+        label="Документов в шарде (пусто — без ограничения)",
+        min_value=1,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    include_patterns = forms.CharField(
+        label="Обрабатывать только файлы по шаблонам (по одному в строке, например *.pdf или fiction/*)",
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
+        required=False
+    )
+
+    exclude_patterns = forms.CharField(
+        label="Пропускать файлы и папки по шаблонам (по одному в строке)",
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
+        required=False
+    )
+
+    max_file_size_mb = forms.IntegerField(
+        label="Максимальный размер файла, МБ (пусто — без ограничения)",
+        min_value=1,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
     folder_path = forms.CharField(
         label="Относительный путь к корпусу",
         widget=forms.Textarea(attrs={
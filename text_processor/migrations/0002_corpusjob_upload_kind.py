@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_processor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='corpusjob',
+            name='kind',
+            field=models.CharField(choices=[('folder', 'Папка с книгами'), ('upload', 'Загружаемые книги'), ('web', 'Веб-страницы'), ('crawl', 'Обход сайта')], max_length=16),
+        ),
+    ]
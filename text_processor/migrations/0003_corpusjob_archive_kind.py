@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_processor', '0002_corpusjob_upload_kind'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='corpusjob',
+            name='kind',
+            field=models.CharField(choices=[('folder', 'Папка с книгами'), ('upload', 'Загружаемые книги'), ('archive', 'Архив с книгами'), ('web', 'Веб-страницы'), ('crawl', 'Обход сайта')], max_length=16),
+        ),
+    ]
@@ -0,0 +1,75 @@
+import uuid
+
+from django.db import models
+
+
+class CorpusJob(models.Model):
+    """
+    Фоновая задача построения корпуса (см. Services/Jobs/JobQueue.py).
+
+    Состояние хранится в базе, поэтому задачи переживают перезапуск сервера:
+    задачи в очереди и прерванные задачи (heartbeat давно не обновлялся)
+    снова берутся в работу.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    KIND_CHOICES = [
+        ('folder', 'Папка с книгами'),
+        ('upload', 'Загружаемые книги'),
+        ('archive', 'Архив с книгами'),
+        ('web', 'Веб-страницы'),
+        ('crawl', 'Обход сайта'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    # Параметры процессора: {"kwargs": {...}, "sources": [...]}; для загрузки — и "files": [...]
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    # Обработано элементов (книг или страниц) и их ожидаемое число (0 — неизвестно)
+    processed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    progress = models.FloatField(default=0.0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    result_path = models.CharField(max_length=1024, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Последнее обновление состояния выполняющейся задачи
+    heartbeat = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.id} ({self.status})"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.DONE, self.FAILED)
+
+    def throughput(self) -> float:
+        """Элементов в секунду с начала выполнения."""
+        if self.started_at is None or not self.processed:
+            return 0.0
+        end = self.finished_at or self.heartbeat or self.started_at
+        seconds = (end - self.started_at).total_seconds()
+        return self.processed / seconds if seconds > 0 else 0.0
+
+    def eta_seconds(self):
+        """Оценка оставшегося времени в секундах (None, если неизвестна)."""
+        rate = self.throughput()
+        if self.status != self.RUNNING or not rate or not self.total:
+            return None
+        return max(0.0, (self.total - self.processed) / rate)
@@ -1,3 +1,492 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+
+from benchmarks.bench_clean_text import legacy_book_clean, legacy_web_clean, make_text
+from text_processor.Services.Corpus.BookArchive import ArchiveMember
+from text_processor.Services.Corpus.BookCorpusProcessor import BookCorpusProcessor
+from text_processor.Services.Corpus.CorpusIndex import CorpusReader, index_path_for
+from text_processor.Services.Corpus.CorpusStats import CorpusStats
+from text_processor.Services.Corpus.ProcessPool import OrderedProcessPool
+from text_processor.Services.Corpus.SentenceSplitter import SentenceSplitter, get_sentence_splitter
+from text_processor.Services.Corpus.TextCleaner import get_book_cleaner, get_web_cleaner
+from text_processor.Services.Corpus.TokenExporter import document_text
+from text_processor.Services.Corpus.WebCorpusProcessor import WebCorpusProcessor
+from text_processor.Services.Corpus.WebFetcher import BodyTooLargeError, WebFetcher
+from text_processor.Services.Jobs.ChunkedUpload import ChunkedUpload, UploadError
+from text_processor.Services.Jobs.CorpusDownload import parse_range
+
+
+class BrokenStreamProcessor(BookCorpusProcessor):
+    """Процессор, чтение TXT которого обрывается ошибкой посреди файла."""
+
+    def stream_txt_text(self, file_path, chunk_size=1024 * 1024):
+        if "Broken" not in os.path.basename(file_path):
+            return super().stream_txt_text(file_path, chunk_size)
+        return self._broken_chunks()
+
+    @staticmethod
+    def _broken_chunks():
+        yield "Первая часть книги. "
+        raise OSError("read error")
+
+
+class BookTestCase(SimpleTestCase):
+    """Папка книг во временном каталоге."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+
+    def write(self, name: str, data):
+        path = os.path.join(self.folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def process(self, processor_class=BookCorpusProcessor, **kwargs):
+        options = dict(output_base="corpus", output_format="jsonl", language="ru",
+                       skip_pages=(0, 0), collect_stats=False)
+        options.update(kwargs)
+        processor = processor_class(self.folder, **options)
+        path = processor.process_all_books()
+        records = []
+        if path:
+            with open(path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+        return processor, records
+
+
+class FailedExtractionTests(BookTestCase):
+    """Книга, извлечение которой не удалось, не попадает ни в корпус, ни в кэш."""
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.write("Good_Author.txt", "Хорошая книга. " * 50)
+
+    def assert_only_good(self, processor, records):
+        self.assertEqual([record["title"] for record in records], ["Good"])
+        self.assertEqual(processor.processed_books, ["Good_Author.txt"])
+        if processor.cache is not None:
+            self.assertEqual(processor.cache.stats()["entries"], 1)
+
+    def test_reader_error_midway_skips_book(self):
+        self.write("Broken_Author.txt", "не используется")
+        for cache_dir in (None, self.cache_dir):
+            with self.subTest(cache=bool(cache_dir)):
+                self.assert_only_good(*self.process(BrokenStreamProcessor, cache_dir=cache_dir))
+
+    def test_undecodable_txt_is_skipped(self):
+        self.write("Bad_Author.txt", "Начало.\n".encode("utf-8") * 100 + b"\xff\xfe\n")
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                self.assert_only_good(*self.process(workers=workers, cache_dir=self.cache_dir))
+
+    def test_damaged_docx_is_skipped(self):
+        from docx import Document
+        source = os.path.join(self.cache_dir, "source.docx")
+        document = Document()
+        for i in range(200):
+            document.add_paragraph(f"Абзац {i}")
+        document.save(source)
+        with zipfile.ZipFile(source) as zin, \
+                zipfile.ZipFile(os.path.join(self.folder, "Damaged_Author.docx"), "w") as zout:
+            for info in zin.infolist():
+                data = zin.read(info)
+                if info.filename == "word/document.xml":
+                    # Документ обрывается посреди разбора, а не при открытии
+                    data = data[:len(data) // 2] + b"<<<" + data[len(data) // 2:]
+                zout.writestr(info, data)
+        os.remove(source)
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                self.assert_only_good(*self.process(workers=workers))
+
+
+def _double_or_crash(value):
+    """Задача пула: на значении 5 процесс аварийно завершается."""
+    if value == 5:
+        os._exit(1)
+    return value * 2
+
+
+class ProcessPoolTests(SimpleTestCase):
+
+    def test_crash_fails_only_crashed_task(self):
+        results = list(OrderedProcessPool(workers=4).imap(_double_or_crash, range(12)))
+        self.assertEqual([item for item, _, _ in results], list(range(12)))
+        for item, result, error in results:
+            if item == 5:
+                self.assertIsInstance(error, BrokenProcessPool)
+            else:
+                self.assertIsNone(error)
+                self.assertEqual(result, item * 2)
+
+
+class ArchiveMemberTests(SimpleTestCase):
+
+    def test_spooled_member_is_pickled_without_data(self):
+        data = b"%PDF" + b"\0" * 100000
+        member = ArchiveMember("books.tar.gz", "Big_Author.pdf", len(data), data=data)
+        self.assertGreater(len(pickle.dumps(member)), len(data))
+
+        path = member.spool()
+        self.addCleanup(member.release)
+        copy = pickle.loads(pickle.dumps(member))
+        self.assertFalse(copy.loaded)
+        self.assertEqual(copy.read(), data)
+        self.assertEqual(copy.digest(), member.digest())
+
+        member.release()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(member.read(), data)
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """
+    Локальный сайт для тестов загрузки: pages — путь -> (статус, тело);
+    статус 503 отдается один раз, затем страница отвечает 200.
+    """
+
+    pages = {}
+    hits = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.hits[self.path] = self.hits.get(self.path, 0) + 1
+            hits = self.hits[self.path]
+        if self.path not in self.pages:
+            self.send_error(404)
+            return
+        status, body = self.pages[self.path]
+        if status == 503 and hits > 1:
+            status = 200
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def html_page(title: str, links=()) -> str:
+    paragraph = f"Это страница «{title}» локального сайта. В ней достаточно текста, чтобы его извлечь. " * 10
+    anchors = "".join(f'<a href="{link}">{link}</a> ' for link in links)
+    return (f"<html><head><title>{title}</title></head><body><article><h1>{title}</h1>"
+            f"<p>{paragraph}</p><p>{anchors}</p></article></body></html>")
+
+
+class LocalSiteTestCase(SimpleTestCase):
+    """Сайт SiteHandler на свободном порту 127.0.0.1."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        SiteHandler.pages = {}
+        SiteHandler.hits = {}
+
+
+class WebFetcherTests(LocalSiteTestCase):
+
+    def test_fetch_with_retries_and_limits(self):
+        SiteHandler.pages = {
+            "/ok.html": (200, html_page("Ok")),
+            "/flaky.html": (503, "временно недоступна"),
+            "/big.html": (200, "x" * 5000),
+        }
+        urls = [self.base + path for path in ("/ok.html", "/flaky.html", "/big.html", "/missing.html")]
+        with WebFetcher(concurrency=4, per_host=2, retries=2, backoff=0.01, max_body_size=4096) as fetcher:
+            results = dict(fetcher.iter_fetch(urls))
+
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        ok, flaky, big, missing = (results[i] for i in range(4))
+        self.assertEqual((ok["status"], ok["error"]), (200, None))
+        self.assertIn("Ok", ok["text"])
+        self.assertEqual(flaky["status"], 200)
+        self.assertEqual(SiteHandler.hits["/flaky.html"], 2)
+        self.assertIsInstance(big["error"], BodyTooLargeError)
+        self.assertIsNone(big["text"])
+        self.assertEqual(missing["status"], 404)
+        # 404 не повторяется
+        self.assertEqual(SiteHandler.hits["/missing.html"], 1)
+
+
+class CrawlTests(LocalSiteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        SiteHandler.pages = {
+            "/index.html": (200, html_page("Index", ["/a.html", "/b.html"])),
+            "/a.html": (200, html_page("A", ["/c.html", "/index.html"])),
+            "/b.html": (200, html_page("B", ["http://example.invalid/x.html", "/file.pdf"])),
+            "/c.html": (200, html_page("C")),
+        }
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def crawl(self, **kwargs):
+        processor = WebCorpusProcessor(output_base="site", output_format="jsonl", rootPath=self.root,
+                                       crawl_state_dir=os.path.join(self.root, "state"),
+                                       fetch_concurrency=2, collect_stats=False, **kwargs)
+        path = processor.process_all_sources([{"type": "crawl", "url": self.base + "/index.html"}])
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line)["url"] for line in f]
+
+    def test_crawl_follows_site_links_to_max_depth(self):
+        urls = self.crawl(crawl_max_depth=1)
+        self.assertEqual(sorted(urls), [self.base + path for path in ("/a.html", "/b.html", "/index.html")])
+        self.assertNotIn("/c.html", SiteHandler.hits)
+        self.assertNotIn("/file.pdf", SiteHandler.hits)
+
+    def test_resumed_crawl_keeps_pages_of_interrupted_run(self):
+        first = self.crawl(crawl_max_depth=2, crawl_max_pages=2, crawl_batch_size=1)
+        self.assertEqual(len(first), 2)
+        urls = self.crawl(crawl_max_depth=2, crawl_max_pages=10, crawl_batch_size=1)
+        self.assertEqual(urls[:2], first)
+        self.assertEqual(sorted(urls), [self.base + path for path in
+                                        ("/a.html", "/b.html", "/c.html", "/index.html")])
+        # Страницы прерванного запуска не загружаются заново
+        self.assertEqual(set(SiteHandler.hits.values()), {1})
+
+
+class TextCleanerTests(SimpleTestCase):
+    """Скомпилированная очистка совпадает с исходными проходами re.sub."""
+
+    special_chars = r"[^\w\s\.,!?;:()«»“”'\"\\/-]"
+
+    def setUp(self):
+        self.text = make_text(200_000)
+
+    def test_book_cleaner_matches_legacy(self):
+        for footnotes, links in ((True, True), (False, False), (True, False)):
+            with self.subTest(footnotes=footnotes, links=links):
+                self.assertEqual(get_book_cleaner(footnotes, links).clean(self.text),
+                                 legacy_book_clean(self.text, footnotes, links))
+
+    def test_web_cleaner_matches_legacy(self):
+        self.assertEqual(get_web_cleaner(self.special_chars).clean(self.text),
+                         legacy_web_clean(self.text, self.special_chars))
+
+    def test_clean_chunks_matches_clean(self):
+        cleaner = get_book_cleaner(True, True)
+        rnd = random.Random(1)
+        chunks, start = [], 0
+        while start < len(self.text):
+            end = start + rnd.randint(1, 5000)
+            chunks.append(self.text[start:end])
+            start = end
+        self.assertEqual("".join(cleaner.clean_chunks(chunks, buffer_size=4096)), cleaner.clean(self.text))
+
+
+class CorpusWriterTests(SimpleTestCase):
+    """Документы, записанные потоком фрагментов, читаются CorpusReader без искажений."""
+
+    records = [
+        {"title": "Китоб", "author": "Муаллиф", "language": "tajik",
+         "text": "Матни «ҷ, ӣ, ҳ» с \"кавычками\",\nобратной \\ чертой и <тегом> & амперсандом."},
+        {"title": "Second", "author": "Author", "language": "english", "text": ""},
+        {"title": "Third", "author": "Author", "language": "russian", "text": "Короткий текст."},
+    ]
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        self.processor = BookCorpusProcessor(self.folder)
+
+    def write(self, output_format: str) -> str:
+        path = os.path.join(self.folder, f"corpus.{output_format}")
+        with open(path, "wb") as f:
+            writer = self.processor.create_writer(output_format, f)
+            writer.enable_index(self.processor.index_fields)
+            for i, record in enumerate(self.records):
+                text = record["text"]
+                if i == 0:
+                    # Первый документ пишется фрагментами по 7 символов
+                    text = iter([text[j:j + 7] for j in range(0, len(text), 7)])
+                writer.write({**record, "text": text})
+            writer.close()
+        writer.save_index(index_path_for(path))
+        return path
+
+    def test_round_trip(self):
+        for output_format in ("txt", "json", "jsonl", "xml"):
+            with self.subTest(output_format=output_format):
+                path = self.write(output_format)
+                with CorpusReader(path) as reader:
+                    self.assertEqual(len(reader), len(self.records))
+                    for doc_id, record in enumerate(self.records):
+                        text = document_text(reader[doc_id])
+                        if output_format == "txt":
+                            text = text[:-2]  # format_book завершает текст пустой строкой
+                        self.assertEqual(text, record["text"])
+                    self.assertEqual(len(reader.by_author("author")), 2)
+                    self.assertEqual(document_text(reader.by_title("Third")[0]).strip(), "Короткий текст.")
+
+    def test_files_match_standard_serializers(self):
+        with open(self.write("json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f), self.records)
+        root = ET.parse(self.write("xml")).getroot()
+        self.assertEqual([book.findtext("text") or "" for book in root], [r["text"] for r in self.records])
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        cases = {
+            None: None,
+            "": None,
+            "bytes=0-99": (0, 100),
+            "bytes=100-": (100, 1000),
+            "bytes=-100": (900, 1000),
+            "bytes=-5000": (0, 1000),
+            "bytes=990-5000": (990, 1000),
+            "bytes=0-1,5-9": None,
+            "items=0-10": None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 1000), expected)
+
+    def test_unsatisfiable(self):
+        for header in ("bytes=1000-", "bytes=5-4", "bytes=-0"):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    parse_range(header, 1000)
+
+
+class ChunkedUploadTests(SimpleTestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        self.data = os.urandom(10000)
+        self.files = ChunkedUpload.normalize_files(
+            [{"name": "Book_Author.txt", "size": len(self.data),
+              "sha256": hashlib.sha256(self.data).hexdigest()}])
+
+    def send(self, upload, offset, length, chunk_sha256=None):
+        return upload.write(0, offset, io.BytesIO(self.data[offset:offset + length]), length, chunk_sha256)
+
+    def test_resume_after_restart(self):
+        self.send(ChunkedUpload(self.folder, self.files), 0, 4000)
+
+        # Новый экземпляр (перезапуск сервера) продолжает с полученного размера
+        upload = ChunkedUpload(self.folder, self.files)
+        self.assertEqual(upload.status()[0]["received"], 4000)
+        with self.assertRaises(UploadError) as error:
+            self.send(upload, 0, 4000)
+        self.assertEqual((error.exception.status, error.exception.received), (409, 4000))
+
+        # Поврежденная часть отбрасывается целиком
+        with self.assertRaises(UploadError) as error:
+            self.send(upload, 4000, 3000, chunk_sha256="0" * 64)
+        self.assertEqual(error.exception.status, 422)
+        self.assertEqual(upload.received(0), 4000)
+
+        state = self.send(upload, 4000, 6000)
+        self.assertTrue(state["complete"])
+        # Повтор последней части (ответ не дошел до клиента) не считается ошибкой
+        self.assertTrue(self.send(upload, 4000, 6000)["complete"])
+        self.assertEqual(list(upload.iter_completed(poll_interval=0)), [upload.path(0)])
+        with open(upload.path(0), "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_checksum_mismatch_restarts_file(self):
+        files = [{**self.files[0], "sha256": "0" * 64}]
+        upload = ChunkedUpload(self.folder, files)
+        with self.assertRaises(UploadError) as error:
+            self.send(upload, 0, len(self.data))
+        self.assertEqual((error.exception.status, error.exception.received), (422, 0))
+        self.assertEqual(upload.received(0), 0)
+
+
+class CorpusStatsTests(SimpleTestCase):
+
+    text = ("Таджикский текст: ҷаҳон, по-русски и rock'n'roll — слова с дефисом "
+            "и апострофом (вне слов - и ' не соединяют). ") * 30
+
+    def report(self, text):
+        stats = CorpusStats(top_k=20, time_budget=1.0)
+        result = stats.observe(text, "tajik")
+        if not isinstance(result, str):
+            for _ in result:
+                pass
+        return stats.report()
+
+    def test_chunk_boundaries_do_not_change_counts(self):
+        expected = self.report(self.text)
+        for size in (1, 2, 3, 7, 64):
+            with self.subTest(chunk_size=size):
+                chunks = (self.text[i:i + size] for i in range(0, len(self.text), size))
+                report = self.report(chunks)
+                self.assertEqual(report["words"], expected["words"])
+                self.assertEqual(report["chars"], expected["chars"])
+                self.assertEqual(report["top_words"], expected["top_words"])
+                self.assertEqual(report["top_ngrams"], expected["top_ngrams"])
+
+
+class SentenceSplitterTests(SimpleTestCase):
+
+    text = ("Первое предложение. Второе, с сокращением т.е. и инициалами А. С. Пушкина! "
+            "Ҷумлаи сеюм? «Цитата в кавычках.» Последнее предложение без точки") * 20
+
+    def chunks(self, size):
+        return (self.text[i:i + size] for i in range(0, len(self.text), size))
+
+    def test_rule_split_chunks_matches_split(self):
+        splitter = get_sentence_splitter("tajik")
+        self.assertIsNone(splitter.punkt)
+        expected = splitter.split(self.text)
+        for size in (1, 5, 64):
+            with self.subTest(chunk_size=size):
+                batches = list(splitter.split_chunks(self.chunks(size), buffer_size=100))
+                self.assertGreater(len(batches), 1)
+                self.assertEqual([s for batch in batches for s in batch], expected)
+
+    def test_punkt_split_chunks_keeps_text(self):
+        splitter = SentenceSplitter("tajik")
+        splitter.punkt = PunktSentenceTokenizer()
+        sentences = [s for batch in splitter.split_chunks(self.chunks(50), buffer_size=200) for s in batch]
+        self.assertGreater(len(sentences), 20)
+        self.assertEqual(" ".join(sentences).split(), self.text.split())
+
+    def test_long_sentence_is_capped(self):
+        splitter = get_sentence_splitter("tajik")
+        text = "слово " * 1000
+        sentences = [s for batch in splitter.split_chunks([text], buffer_size=100, max_sentence_size=300)
+                     for s in batch]
+        self.assertTrue(all(len(s) <= 300 for s in sentences))
+        self.assertEqual(" ".join(sentences).split(), text.split())
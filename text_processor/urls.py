@@ -5,4 +5,9 @@ urlpatterns = [
     path('', views.home, name='home'),    
     path('universal-corpus/', views.universal_corpus, name='universal_corpus'),  
     path('upload-folder-corpus/', views.upload_folder_corpus, name='upload_folder_corpus'),
+    path('uploads/', views.create_upload, name='create_upload'),
+    path('uploads/<uuid:job_id>/', views.upload_status, name='upload_status'),
+    path('uploads/<uuid:job_id>/files/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('jobs/<uuid:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<uuid:job_id>/result/', views.job_result, name='job_result'),
 ]
\ No newline at end of file
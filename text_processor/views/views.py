@@ -4,13 +4,24 @@ import datetime
 import os
 import datetime
 from django.utils.text import get_valid_filename
-from django.http import JsonResponse
-from django.shortcuts import render
+import json
+import mimetypes
+import re
+import uuid
+from urllib.parse import urlencode
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.utils.http import content_disposition_header, http_date
 from django.views.decorators.csrf import csrf_exempt
 from text_easy_processor import settings
 from django.core.files.storage import FileSystemStorage
+from text_processor.models import CorpusJob
+from text_processor.Services.Corpus.BookArchive import ARCHIVE_EXTENSIONS, archive_format
 from text_processor.Services.Corpus.BookCorpusProcessor import BookCorpusProcessor
-from text_processor.Services.Corpus.WebCorpusProcessor import WebCorpusProcessor
+from text_processor.Services.Jobs import CorpusDownload
+from text_processor.Services.Jobs.ChunkedUpload import ChunkedUpload, UploadError
+from text_processor.Services.Jobs.JobQueue import get_job_queue, upload_of
 
 # Глобальная переменная для хранения экземпляра процессора
 processor_instance = None
@@ -22,9 +33,8 @@ def home(request):
     return render(request, 'home.html')
 
 def universal_corpus(request):
-    corpus_path = None  # Единая переменная для пути к корпусу
-    rootPath = settings.MEDIA_ROOT
-    
+    job = None
+
     if request.method == 'POST':
         form = UniversalCorpusForm(request.POST, request.FILES)
         if form.is_valid():
@@ -32,52 +42,80 @@ def universal_corpus(request):
             output_format = form.cleaned_data['type_outputcorpus']
             server_path = form.cleaned_data['server_path']     
             language = form.cleaned_data['language']
+            shard_max_bytes, shard_max_documents = _shard_limits(form)
+            job_id = uuid.uuid4()
+            params = None
             
-            try:
-                if process_type == 'folder':
-                    processor = BookCorpusProcessor(
-                        books_folder=server_path, 
-                        output_base='text_corpus', 
-                        output_format=output_format,
-                        skip_pages=(0, 0),
-                        ignore_footnotes=True,
-                        ignore_links=True,
-                        language=language
-                    )
-                    corpus_path = processor.process_all_books()
-                    form.instance.outputcorpus_path = corpus_path  # Сохраняем путь в форму
-                    # form.save()  # Если нужно записать в БД
-
-                elif process_type == 'web':
-                    web_urls = form.cleaned_data['web_urls']
-                    urls = [url.strip() for url in web_urls.split("\n") if url.strip()]
-                    
-                    if not urls:
-                        message = "Не указаны URL-адреса."
-                        form.add_error('web_urls', message)
+            if process_type == 'folder':
+                params = {"kwargs": _book_processor_kwargs(form, server_path)}
+
+            elif process_type == 'archive':
+                # Книги читаются прямо из архива; корпус сохраняется рядом с ним
+                if not os.path.isfile(server_path) or archive_format(server_path) is None:
+                    form.add_error('server_path', "Укажите путь к архиву zip, tar, tar.gz, tar.bz2, tar.xz или tar.zst.")
+                else:
+                    params = {"kwargs": _book_processor_kwargs(form, os.path.dirname(server_path)),
+                              "archive": server_path}
+
+            elif process_type in ('web', 'crawl'):
+                web_urls = form.cleaned_data['web_urls']
+                urls = [url.strip() for url in web_urls.split("\n") if url.strip()]
+                
+                if not urls:
+                    message = "Не указаны URL-адреса."
+                    form.add_error('web_urls', message)
+                else:
+                    if process_type == 'crawl':
+                        # Адреса .xml и .xml.gz — карты сайта, остальные — начальные страницы обхода
+                        sources = [{"type": "sitemap" if url.lower().endswith(('.xml', '.xml.gz')) else "crawl",
+                                    "url": url} for url in urls]
                     else:
                         sources = [{"type": "web", "url": url} for url in urls]
-                        processor = WebCorpusProcessor(
-                            output_base="my_corpus",
-                            output_format=output_format,
-                            language=language,
-                            encoding="utf-8",
-                            rootPath=rootPath
-                        )
-                        corpus_path = processor.process_all_sources(sources)
-                        form.instance.outputcorpus_path = corpus_path  # Сохраняем путь в форму
-                        # form.save()  # Если нужно записать в БД
-
-                form = UniversalCorpusForm(initial={
-                'outputcorpus_path ': corpus_path
-                })
-                
-            except Exception as e:
-                message = f"Произошла ошибка: {e}"
-                form.add_error(None, message)  # Добавляем ошибку в форму
+                    params = {"sources": sources, "kwargs": dict(
+                        output_base="my_corpus",
+                        output_format=output_format,
+                        language=language,
+                        encoding="utf-8",
+                        # У каждой задачи своя папка результатов
+                        rootPath=os.path.join(settings.CORPUS_JOB_DIR, str(job_id)),
+                        fetch_concurrency=settings.WEB_FETCH_CONCURRENCY,
+                        per_host_limit=settings.WEB_FETCH_PER_HOST,
+                        fetch_queue_size=settings.WEB_FETCH_QUEUE_SIZE,
+                        extract_workers=settings.WEB_EXTRACT_WORKERS,
+                        extract_timeout=settings.WEB_EXTRACT_TIMEOUT,
+                        cache_dir=settings.WEB_CACHE_DIR,
+                        cache_max_size=settings.WEB_CACHE_MAX_SIZE,
+                        cache_ttl=settings.WEB_CACHE_TTL,
+                        crawl_max_depth=(form.cleaned_data['crawl_max_depth']
+                                         if form.cleaned_data['crawl_max_depth'] is not None
+                                         else settings.WEB_CRAWL_MAX_DEPTH),
+                        crawl_max_pages=form.cleaned_data['crawl_max_pages'] or settings.WEB_CRAWL_MAX_PAGES,
+                        # Состояние обхода у каждой задачи свое: одновременные обходы не
+                        # сбрасывают очередь друг друга, а перезапущенная задача продолжает свой
+                        crawl_state_dir=os.path.join(settings.WEB_CRAWL_STATE_DIR, str(job_id)),
+                        crawl_seen_capacity=settings.WEB_CRAWL_SEEN_CAPACITY,
+                        dedup_threshold=form.cleaned_data['dedup_threshold'],
+                        dedup_index_path=settings.CORPUS_DEDUP_INDEX,
+                        shard_max_bytes=shard_max_bytes,
+                        shard_max_documents=shard_max_documents
+                    )}
 
-        else:
-            message = "Неверные данные формы. Ошибки: " + str(form.errors)
+            if params is not None:
+                # Корпус строится в фоне; клиент следит за задачей по адресу статуса
+                try:
+                    job = get_job_queue().submit(process_type, params, job_id=job_id)
+                except Exception as e:
+                    message = f"Произошла ошибка: {e}"
+                    form.add_error(None, message)  # Добавляем ошибку в форму
+                else:
+                    if _wants_json(request):
+                        return JsonResponse(_job_status(request, job), status=202)
+                    form = UniversalCorpusForm()
+            elif _wants_json(request):
+                return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+
+        elif _wants_json(request):
+            return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
 
     else:
         form = UniversalCorpusForm()
@@ -87,10 +125,157 @@ def universal_corpus(request):
         'universalcorpus/universal_corpus.html',
         {
             'form': form,
-            'corpus_path': corpus_path,       # Новый вариант
+            'job': job,
+            'job_status_url': reverse('job_status', args=[job.pk]) if job else None,
         }
     )
 
+
+def _shard_limits(form):
+    """Разбиение корпуса на шарды (None — один файл): (байт, документов) на шард."""
+    shard_size_mb = form.cleaned_data['shard_size_mb']
+    shard_max_bytes = shard_size_mb * 1024 * 1024 if shard_size_mb else None
+    return shard_max_bytes, form.cleaned_data['shard_documents']
+
+
+def _book_processor_kwargs(form, books_folder: str) -> dict:
+    """Параметры BookCorpusProcessor для задачи по данным формы."""
+    shard_max_bytes, shard_max_documents = _shard_limits(form)
+    return dict(
+        books_folder=books_folder, 
+        output_base='text_corpus', 
+        output_format=form.cleaned_data['type_outputcorpus'],
+        skip_pages=(0, 0),
+        ignore_footnotes=True,
+        ignore_links=True,
+        language=form.cleaned_data['language'],
+        workers=settings.CORPUS_WORKERS,
+        file_timeout=settings.CORPUS_FILE_TIMEOUT,
+        cache_dir=settings.CORPUS_CACHE_DIR,
+        cache_max_size=settings.CORPUS_CACHE_MAX_SIZE,
+        sentence_per_line=form.cleaned_data['sentence_per_line'],
+        dedup_threshold=form.cleaned_data['dedup_threshold'],
+        dedup_index_path=settings.CORPUS_DEDUP_INDEX,
+        shard_max_bytes=shard_max_bytes,
+        shard_max_documents=shard_max_documents,
+        include=_patterns(form.cleaned_data['include_patterns']),
+        exclude=_patterns(form.cleaned_data['exclude_patterns']),
+        max_file_size=(form.cleaned_data['max_file_size_mb'] * 1024 * 1024
+                       if form.cleaned_data['max_file_size_mb'] else None)
+    )
+
+
+def _patterns(text: str):
+    """Шаблоны файлов из поля формы (по одному в строке; None — не заданы)."""
+    patterns = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    return patterns or None
+
+
+def _wants_json(request) -> bool:
+    """Запрос от скрипта страницы или API-клиента, ожидающего JSON."""
+    return ('application/json' in request.headers.get('Accept', '')
+            or request.headers.get('X-Requested-With') == 'XMLHttpRequest')
+
+
+def _job_status(request, job: CorpusJob) -> dict:
+    eta = job.eta_seconds()
+    return {
+        'job_id': str(job.pk),
+        'kind': job.kind,
+        'status': job.status,
+        'progress': round(job.progress, 1),
+        'processed': job.processed,
+        'total': job.total,
+        'throughput': round(job.throughput(), 3),
+        'eta_seconds': round(eta) if eta is not None else None,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'error': job.error or None,
+        'status_url': reverse('job_status', args=[job.pk]),
+        'result_url': reverse('job_result', args=[job.pk]) if job.status == CorpusJob.DONE else None,
+        'parts': _result_parts(job),
+    }
+
+
+def _result_parts(job: CorpusJob) -> list:
+    """Шарды или файлы zip-архива готового корпуса с адресами для скачивания."""
+    if job.status != CorpusJob.DONE:
+        return []
+    parts = CorpusDownload.parts(job.result_path)
+    for part in parts:
+        key = 'shard' if 'shard' in part else 'member'
+        part['url'] = f"{reverse('job_result', args=[job.pk])}?{urlencode({key: part[key]})}"
+    return parts
+
+
+def job_status(request, job_id):
+    """Состояние фоновой задачи: ход выполнения, скорость и оценка оставшегося времени."""
+    # Очередь запускается и при опросе: после перезапуска сервера она подхватит незавершенные задачи
+    get_job_queue()
+    job = get_object_or_404(CorpusJob, pk=job_id)
+    return JsonResponse(_job_status(request, job))
+
+
+def job_result(request, job_id):
+    """
+    Готовый корпус задачи (для корпуса из шардов — его манифест).
+
+    Параметры: shard — имя или номер шарда, member — файл из zip-архива
+    (отдается из архива без распаковки на диск), compress — gzip или zstd
+    (сжатие потоком). Несжатый ответ поддерживает Range для продолжения
+    прерванной загрузки.
+    """
+    job = get_object_or_404(CorpusJob, pk=job_id)
+    if job.status != CorpusJob.DONE:
+        return JsonResponse({'status': job.status,
+                             'message': 'Корпус еще не готов' if not job.finished else job.error}, status=409)
+    try:
+        download = CorpusDownload.resolve(job.result_path, request.GET.get('shard'), request.GET.get('member'))
+    except FileNotFoundError as e:
+        raise Http404(str(e) or 'Файл корпуса не найден')
+
+    compress = request.GET.get('compress')
+    if compress:
+        if compress not in CorpusDownload.compression_methods():
+            return JsonResponse({'status': 'error', 'message': f'Неподдерживаемое сжатие: {compress}',
+                                 'available': CorpusDownload.compression_methods()}, status=400)
+        response = StreamingHttpResponse(download.iter_compressed(compress) if request.method != 'HEAD' else (),
+                                         content_type=f'application/{compress}')
+        response['Content-Disposition'] = content_disposition_header(
+            True, download.name + CorpusDownload.COMPRESSED_EXTENSIONS[compress])
+        response['Cache-Control'] = 'no-transform'
+        return response
+
+    if_range = request.headers.get('If-Range')
+    byte_range = None
+    if not if_range or if_range in (download.etag, http_date(download.mtime)):
+        try:
+            byte_range = CorpusDownload.parse_range(request.headers.get('Range'), download.size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{download.size}'
+            return response
+
+    if byte_range is None and download.whole_file:
+        # Файл целиком отдается средствами сервера (wsgi.file_wrapper)
+        response = FileResponse(open(download.path, 'rb'), as_attachment=True, filename=download.name)
+    else:
+        start, end = byte_range or (0, download.size)
+        response = StreamingHttpResponse(download.iter_bytes(start, end) if request.method != 'HEAD' else (),
+                                         status=206 if byte_range else 200,
+                                         content_type=mimetypes.guess_type(download.name)[0]
+                                         or 'application/octet-stream')
+        response['Content-Length'] = end - start
+        response['Content-Disposition'] = content_disposition_header(True, download.name)
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end - 1}/{download.size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = download.etag
+    response['Last-Modified'] = http_date(download.mtime)
+    return response
+
 @csrf_exempt
 def upload_folder_corpus(request):
     if request.method == 'POST':
@@ -138,4 +323,96 @@ def upload_folder_corpus(request):
     return JsonResponse({
         'status': 'error',
         'message': 'Недопустимый метод запроса'
-    }, status=400)
\ No newline at end of file
+    }, status=400)
+
+
+@csrf_exempt
+def create_upload(request):
+    """
+    Начинает возобновляемую загрузку книг частями.
+
+    Тело запроса — JSON {"files": [{"name", "size", "sha256"?}, ...], ...поля
+    формы корпуса} или те же поля формы (files — строка JSON). Задача
+    построения корпуса ставится в очередь сразу: каждый загруженный файл
+    обрабатывается, не дожидаясь остальных.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Недопустимый метод запроса'}, status=405)
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+        else:
+            data = request.POST.dict()
+        files = data.get('files')
+        if isinstance(files, str):
+            files = json.loads(files)
+        # Архивы с книгами обрабатываются без распаковки (см. BookArchive)
+        files = ChunkedUpload.normalize_files(files, BookCorpusProcessor.supported_formats + ARCHIVE_EXTENSIONS)
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    form = UniversalCorpusForm(dict(data, process_type='folder'))
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+
+    job_id = uuid.uuid4()
+    upload_dir = os.path.join(settings.CORPUS_UPLOAD_DIR, str(job_id))
+    os.makedirs(upload_dir, exist_ok=True)
+    job = get_job_queue().submit('upload', {"kwargs": _book_processor_kwargs(form, upload_dir), "files": files},
+                                 job_id=job_id)
+    return JsonResponse(_upload_status(request, job), status=201)
+
+
+def _upload_status(request, job: CorpusJob) -> dict:
+    upload = upload_of(job)
+    files = upload.status()
+    for item in files:
+        item['upload_url'] = reverse('upload_chunk', args=[job.pk, item['index']])
+    return dict(_job_status(request, job),
+                server_path=upload.directory,
+                upload_status_url=reverse('upload_status', args=[job.pk]),
+                received=sum(item['received'] for item in files),
+                size=sum(item['size'] for item in files),
+                files=files)
+
+
+def upload_status(request, job_id):
+    """Сколько байт каждого файла получено: с этих смещений клиент продолжает загрузку."""
+    get_job_queue()
+    job = get_object_or_404(CorpusJob, pk=job_id, kind='upload')
+    return JsonResponse(_upload_status(request, job))
+
+
+@csrf_exempt
+def upload_chunk(request, job_id, index):
+    """
+    Принимает часть файла (PUT или POST, тело — байты части).
+
+    Смещение берется из заголовка Content-Range ("bytes start-end/size") или
+    параметра offset; заголовок X-Chunk-SHA256 (необязательный) защищает
+    часть от повреждения. При несовпадении смещения ответ 409 содержит
+    received — смещение, с которого нужно продолжить.
+    """
+    if request.method not in ('PUT', 'POST'):
+        return JsonResponse({'status': 'error', 'message': 'Недопустимый метод запроса'}, status=405)
+    job = get_object_or_404(CorpusJob, pk=job_id, kind='upload')
+    if job.finished:
+        return JsonResponse({'status': 'error', 'message': 'Загрузка закрыта: задача уже завершена'}, status=410)
+
+    length = int(request.META.get('CONTENT_LENGTH') or 0)
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+|\*)', content_range.strip())
+        if not match or int(match.group(2)) - int(match.group(1)) + 1 != length:
+            return JsonResponse({'status': 'error', 'message': 'Неверный заголовок Content-Range'}, status=400)
+        offset = int(match.group(1))
+    elif request.GET.get('offset', '0').isdigit():
+        offset = int(request.GET.get('offset', '0'))
+    else:
+        return JsonResponse({'status': 'error', 'message': 'Неверное смещение части'}, status=400)
+
+    try:
+        state = upload_of(job).write(index, offset, request, length, request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return JsonResponse({'status': 'error', 'message': str(e), 'received': e.received}, status=e.status)
+    return JsonResponse(dict(state, status='success'))